@@ -0,0 +1,4 @@
+# Benchmarks for timologia on synthetic data: generate.py builds the
+# databases, run.py times the main scenarios and writes the results as
+# JSON, and the bench_*.py scripts compare single features against their
+# previous implementation. See the README.
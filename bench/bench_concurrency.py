@@ -0,0 +1,125 @@
+# Stress test for concurrent readers and writers on one timologia.db.
+# Starts the dashboard (uvicorn, its own process) on a synthetic database,
+# then for --seconds runs writer processes that insert invoices one at a
+# time through the repository, as the GUI does (including its periodic
+# WAL checkpoint, here every --checkpoint seconds), while reader processes
+# request dashboard endpoints as fast as they can. The response cache is
+# disabled, so every request reads the database.
+# Reports throughput, latency percentiles and errors ("database is
+# locked" on either side) and the size of the -wal file at the end.
+#
+# Run from the project root with
+# python bench/bench_concurrency.py                        (100k rows)
+# python bench/bench_concurrency.py 1000000 --readers 8 --writers 2 --seconds 30
+import argparse
+import multiprocessing
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from bench_load import PATHS, free_port, start_server
+from bench.generate import make_db
+import timologia_repo
+
+
+def writer(db, worker, seconds, checkpoint_every, out):
+    repo = timologia_repo.open_repository(db, migrate=False)
+    latencies, errors, n = [], 0, 0
+    checkpoints = []
+    deadline = time.monotonic() + seconds
+    next_checkpoint = time.monotonic() + checkpoint_every
+    while time.monotonic() < deadline:
+        t0 = time.perf_counter()
+        try:
+            repo.add(f"STRESS-{worker}-{n}", f"Stress {worker}", ["Flyers"], "12.50", "01-02-24")
+        except sqlite3.OperationalError:
+            errors += 1
+        latencies.append(time.perf_counter() - t0)
+        n += 1
+        if checkpoint_every and time.monotonic() >= next_checkpoint:
+            checkpoints.append(repo.checkpoint("RESTART"))
+            next_checkpoint += checkpoint_every
+    repo.close()
+    out.put(("write", latencies, errors, checkpoints))
+
+
+def reader(url, worker, seconds, out):
+    latencies, errors = [], 0
+    deadline = time.monotonic() + seconds
+    with httpx.Client(base_url=url, timeout=60) as http:
+        i = worker
+        while time.monotonic() < deadline:
+            t0 = time.perf_counter()
+            r = http.get(PATHS[i % len(PATHS)])
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+            i += 1
+    out.put(("read", latencies, errors, None))
+
+
+def report(kind, latencies, errors, seconds):
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+    print(f"{kind:<7} {len(latencies):>8} {len(latencies) / seconds:>8.0f} "
+          f"{pct(0.50):>9.1f} {pct(0.99):>9.1f} {errors:>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="?", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=4, help="reader processes")
+    parser.add_argument("--writers", type=int, default=1, help="writer processes")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--checkpoint", type=float, default=1.0,
+                        help="seconds between WAL checkpoints of each writer (0: only SQLite's own)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.db")
+        make_db(db, args.rows)
+        timologia_repo.open_repository(db).close()
+        proc, url = start_server(os.path.join(HERE, ".."), db, free_port())
+        try:
+            out = multiprocessing.Queue()
+            workers = ([multiprocessing.Process(target=writer, args=(db, i, args.seconds, args.checkpoint, out))
+                        for i in range(args.writers)]
+                       + [multiprocessing.Process(target=reader, args=(url, i, args.seconds, out))
+                          for i in range(args.readers)])
+            for w in workers:
+                w.start()
+            results = {"read": ([], 0), "write": ([], 0)}
+            checkpoints = []
+            for _ in workers:
+                kind, latencies, errors, done = out.get()
+                total, errs = results[kind]
+                results[kind] = (total + latencies, errs + errors)
+                checkpoints += done or []
+            for w in workers:
+                w.join()
+            wal_size = os.path.getsize(db + "-wal") if os.path.exists(db + "-wal") else 0
+        finally:
+            proc.terminate()
+            proc.wait()
+
+    print(f"{args.rows} rows, {args.readers} readers, {args.writers} writers, {args.seconds:.0f}s")
+    print(f"{'':<7} {'requests':>8} {'per s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+    for kind in ("read", "write"):
+        report(kind, *results[kind], args.seconds)
+    busy = sum(1 for c in checkpoints if c[0])
+    print(f"checkpoints: {len(checkpoints)} ({busy} busy); -wal file at the end: {wal_size / 1e6:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
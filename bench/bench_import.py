@@ -0,0 +1,85 @@
+# Benchmark for the CSV import (Ανέβασε το .csv).
+# Compares timologia_db.import_csv (streaming, chunked, one transaction,
+# triggers suspended) against the previous MainWindow.load_csv_replace_db
+# (whole file in memory, one executemany with the triggers firing per row).
+#
+# Run from the project root with
+# python bench/bench_import.py             (10k and 100k rows)
+# python bench/bench_import.py 1000000
+import csv
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, ".."))
+sys.path.insert(0, HERE)
+
+import timologia_db
+from bench.generate import make_db
+
+SIZES = [10_000, 100_000]
+
+
+def legacy_import(conn, csv_path):
+    # The previous load_csv_replace_db, minus the GUI
+    cursor = conn.cursor()
+    with open(csv_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    header_lower = [h.strip().lower() for h in rows[0]]
+    idx = [header_lower.index(c) for c in ("id", "name", "description", "amount", "date")]
+    cursor.execute("DELETE FROM timologia")
+    conn.commit()
+    to_insert = []
+    for r in rows[1:]:
+        _id, _name, _desc_raw, _amount, _date = (r[i].strip() for i in idx)
+        if _desc_raw == "":
+            desc_list = []
+        elif '|' in _desc_raw:
+            desc_list = [s.strip() for s in _desc_raw.split('|') if s.strip()]
+        elif ',' in _desc_raw:
+            desc_list = [s.strip() for s in _desc_raw.split(',') if s.strip()]
+        else:
+            desc_list = [_desc_raw]
+        to_insert.append((_id, _name, json.dumps(desc_list, ensure_ascii=False), _amount, _date))
+    cursor.executemany("INSERT INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, ?)",
+                       to_insert)
+    conn.commit()
+    return len(to_insert)
+
+
+def timed(fn, db_path, csv_path):
+    conn = sqlite3.connect(db_path)
+    timologia_db.migrate(conn)
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    n = fn(conn, csv_path)
+    dt = time.perf_counter() - t0
+    peak = tracemalloc.get_traced_memory()[1] / 2**20
+    tracemalloc.stop()
+    conn.close()
+    return n, dt, peak
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'legacy rows/s':>14} {'peak MB':>8} {'streaming rows/s':>17} {'peak MB':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            src = os.path.join(tmp, "src.db")
+            csv_path = os.path.join(tmp, "invoices.csv")
+            make_db(src, n)
+            conn = sqlite3.connect(src)
+            timologia_db.export_csv(conn, csv_path)
+            conn.close()
+            n_old, t_old, m_old = timed(legacy_import, os.path.join(tmp, "legacy.db"), csv_path)
+            n_new, t_new, m_new = timed(timologia_db.import_csv, os.path.join(tmp, "new.db"), csv_path)
+            assert n_old == n_new == n
+        print(f"{n:>10} {n / t_old:>14.0f} {m_old:>8.1f} {n / t_new:>17.0f} {m_new:>8.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
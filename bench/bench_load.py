@@ -0,0 +1,111 @@
+# Load test for the dashboard API.
+# Starts uvicorn on a synthetic database and hits a few endpoints with
+# many concurrent httpx clients, reporting requests/second and latency
+# percentiles. The response cache is disabled (DASHBOARD_CACHE_TTL=0) so
+# every request reaches SQLite.
+#
+# Run from the project root with
+# python bench/bench_load.py                       (100k rows)
+# python bench/bench_load.py 1000000 --concurrency 100
+# To compare with an older checkout, point --app-dir at it and put the
+# database where that checkout looks for it:
+# python bench/bench_load.py --app-dir ../old --db ../old/timologia.db
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, ".."))
+
+from bench.generate import make_db
+
+PATHS = ["/api/summary", "/dashboard", "/api/revenue/monthly", "/api/search?q=fly"]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(app_dir, db, port):
+    env = dict(os.environ, TIMOLOGIA_DB=db, DASHBOARD_CACHE_TTL="0")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "dashboard_api:app", "--app-dir", app_dir,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env)
+    url = f"http://127.0.0.1:{port}"
+    # the first request also migrates the database
+    deadline = time.monotonic() + 600
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(url + "/api/summary", timeout=600).status_code == 200:
+                return proc, url
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("server did not start")
+
+
+async def load(url, path, requests, concurrency):
+    latencies = []
+    errors = 0
+    todo = iter(range(requests))
+
+    async def client(http):
+        nonlocal errors
+        for _ in todo:
+            t0 = time.perf_counter()
+            r = await http.get(path)
+            latencies.append(time.perf_counter() - t0)
+            if r.status_code != 200:
+                errors += 1
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        t0 = time.perf_counter()
+        await asyncio.gather(*(client(http) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - t0
+    latencies.sort()
+
+    def pct(p):
+        return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000
+
+    return requests / elapsed, pct(0.50), pct(0.99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rows", nargs="?", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--app-dir", default=os.path.join(HERE, ".."))
+    parser.add_argument("--db", help="database to use (created if missing)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.abspath(args.db or os.path.join(tmp, "bench.db"))
+        if not os.path.exists(db):
+            make_db(db, args.rows)
+        proc, url = start_server(os.path.abspath(args.app_dir), db, free_port())
+        try:
+            print(f"{args.rows} rows, {args.concurrency} concurrent clients, {args.requests} requests each")
+            print(f"{'endpoint':<24} {'req/s':>8} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+            for path in PATHS:
+                rps, p50, p99, errors = asyncio.run(load(url, path, args.requests, args.concurrency))
+                print(f"{path:<24} {rps:>8.0f} {p50:>9.1f} {p99:>9.1f} {errors:>7}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+# Benchmark for dashboard_api.query_summary().
+# Compares query_summary() (typed amount_cents column and its indexes)
+# against the old four-query path on synthetic databases of 10k, 100k
+# and 1M invoices.
+#
+# Run from the project root with
+# python bench/bench_summary.py            (all sizes)
+# python bench/bench_summary.py 10000      (one size)
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import dashboard_api
+from bench.generate import make_db
+
+SIZES = [10_000, 100_000, 1_000_000]
+REPEAT = 3
+
+
+def best_of(fn):
+    best = None
+    for _ in range(REPEAT):
+        t0 = time.perf_counter()
+        res = fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best, res
+
+
+def main(sizes):
+    print(f"{'rows':>10} {'migrate (s)':>12} {'four-query (s)':>15} {'summary (s)':>12} {'speedup':>8}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            make_db(path, n)
+            dashboard_api.DB = path
+            # creating the pool migrates the schema; keep that out of the timings
+            t0 = time.perf_counter()
+            dashboard_api.get_pool()
+            t_migrate = time.perf_counter() - t0
+            t_old, old = best_of(dashboard_api.query_summary_multi)
+            t_new, new = best_of(dashboard_api.query_summary)
+            # the two paths must agree (up to float summation order)
+            assert abs(old["total_sales"] - new["total_sales"]) < 1e-6 * max(1.0, old["total_sales"])
+            assert old["most_expensive"]["amount"] == new["most_expensive"]["amount"]
+            assert [c["name"] for c in old["top_customers"]] == [c["name"] for c in new["top_customers"]]
+            print(f"{n:>10} {t_migrate:>12.2f} {t_old:>15.4f} {t_new:>12.4f} {t_old / t_new:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1,116 @@
+# Benchmark for the main invoice table of timologia-gui.py.
+# Measures time-to-first-paint of the lazy InvoiceTableModel/QTableView
+# against the old QTableWidget fill (one item per cell and
+# resizeRowToContents per row) on synthetic databases.
+#
+# Run from the project root with
+# python bench/bench_table.py              (10k and 50k rows)
+# python bench/bench_table.py 200000
+# Without a display use QT_QPA_PLATFORM=offscreen.
+# "max rss" is the process high-water mark, which is why the model is
+# measured before the QTableWidget for each size.
+import importlib.util
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, HERE)
+
+from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem
+from PyQt5.QtCore import Qt
+
+from bench.generate import make_db
+
+SIZES = [10_000, 50_000]
+
+
+def load_gui():
+    # timologia-gui.py is not importable by name (dash) and opens
+    # timologia.db in the current directory when imported
+    spec = importlib.util.spec_from_file_location("timologia_gui", os.path.join(ROOT, "timologia-gui.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def paint(app, widget):
+    widget.resize(1100, 700)
+    widget.show()
+    app.processEvents()
+    widget.repaint()
+
+
+def first_paint_model(app, gui):
+    t0 = time.perf_counter()
+    view = gui.QTableView()
+    model = gui.InvoiceTableModel(gui.repository)
+    view.setModel(model)
+    model.set_filter()
+    paint(app, view)
+    dt = time.perf_counter() - t0
+    view.close()
+    return dt
+
+
+def first_paint_widget(app, gui):
+    # The previous MainWindow.update_table, minus its debug prints
+    t0 = time.perf_counter()
+    table = QTableWidget()
+    table.setColumnCount(5)
+    rows = gui.db_connection.execute("SELECT id, name, description, amount, date FROM timologia").fetchall()
+    table.setRowCount(len(rows))
+    for row_idx, row in enumerate(rows):
+        for col_idx, value in enumerate(row):
+            if col_idx == 2:
+                try:
+                    descriptions = json.loads(value) if value else []
+                    if not isinstance(descriptions, list):
+                        descriptions = []
+                    descriptions_str = "\n".join(str(d) for d in descriptions)
+                    item = QTableWidgetItem(descriptions_str)
+                    item.setTextAlignment(Qt.AlignTop)
+                    item.setToolTip(descriptions_str)
+                    table.setItem(row_idx, col_idx, item)
+                    table.resizeRowToContents(row_idx)
+                except json.JSONDecodeError:
+                    table.setItem(row_idx, col_idx, QTableWidgetItem(value))
+            else:
+                table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
+    paint(app, table)
+    dt = time.perf_counter() - t0
+    table.close()
+    return dt
+
+
+def main(sizes):
+    app = QApplication(sys.argv[:1])
+    cwd = os.getcwd()
+    print(f"{'rows':>10} {'model (s)':>10} {'max rss (MB)':>13} {'QTableWidget (s)':>17} {'max rss (MB)':>13}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                make_db("timologia.db", n)
+                gui = load_gui()
+                t_model = first_paint_model(app, gui)
+                rss_model = max_rss_mb()
+                t_widget = first_paint_widget(app, gui)
+                rss_widget = max_rss_mb()
+                gui.db_connection.close()
+            finally:
+                os.chdir(cwd)
+        print(f"{n:>10} {t_model:>10.4f} {rss_model:>13.1f} {t_widget:>17.4f} {rss_widget:>13.1f}")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or SIZES)
@@ -0,0 +1,125 @@
+# Deterministic synthetic invoices for the benchmarks.
+# The same (n, seed) always gives the same rows (one random.Random with
+# an integer seed drives everything), so results from different commits
+# are measured on identical data.
+#
+# Customers are Greek and Latin full names (Greek surnames take the
+# feminine form for women, as on real invoices), drawn with a skewed
+# distribution: a few regulars have many invoices, most customers a
+# handful. Descriptions are JSON arrays of 1-4 catalogue items, amounts
+# are log-normal around 90 EUR with two decimals and dates are DD-MM-YY
+# (valid days only) from 2018 to 2025, busier in spring and autumn.
+# Rows are generated lazily, so 10M rows do not need 10M rows of memory.
+import calendar
+import csv
+import json
+import math
+import random
+import sqlite3
+
+GREEK_MEN = ["Γιώργος", "Νίκος", "Κώστας", "Δημήτρης", "Γιάννης", "Παναγιώτης", "Βασίλης",
+             "Χρήστος", "Αθανάσιος", "Μιχάλης", "Ευάγγελος", "Σπύρος", "Αντώνης", "Ηλίας"]
+GREEK_WOMEN = ["Μαρία", "Ελένη", "Αικατερίνη", "Βασιλική", "Σοφία", "Αγγελική", "Γεωργία",
+               "Δήμητρα", "Κωνσταντίνα", "Ευαγγελία", "Ειρήνη", "Χριστίνα", "Παρασκευή", "Ιωάννα"]
+# (masculine, feminine)
+GREEK_SURNAMES = [("Παπαδόπουλος", "Παπαδοπούλου"), ("Γεωργίου", "Γεωργίου"),
+                  ("Κωνσταντίνου", "Κωνσταντίνου"), ("Δημητρίου", "Δημητρίου"),
+                  ("Νικολάου", "Νικολάου"), ("Παπαδάκης", "Παπαδάκη"), ("Οικονόμου", "Οικονόμου"),
+                  ("Μακρής", "Μακρή"), ("Αλεξίου", "Αλεξίου"), ("Βλάχος", "Βλάχου"),
+                  ("Καραγιάννης", "Καραγιάννη"), ("Αντωνίου", "Αντωνίου"), ("Ιωάννου", "Ιωάννου"),
+                  ("Μαυρίδης", "Μαυρίδου"), ("Χατζηδάκης", "Χατζηδάκη"), ("Σπυρόπουλος", "Σπυροπούλου"),
+                  ("Ζαχαρίου", "Ζαχαρίου"), ("Πετρόπουλος", "Πετροπούλου"), ("Τσιρίγος", "Τσιρίγου"),
+                  ("Λαμπράκης", "Λαμπράκη")]
+LATIN_FIRST = ["John", "Jane", "Alice", "Bob", "Charlie", "Eve", "Frank", "Grace", "Anna",
+               "Peter", "Laura", "Marco", "Sofia", "Lukas", "Emma", "Oliver", "Chloe", "Hans"]
+LATIN_LAST = ["Smith", "Johnson", "Brown", "Davis", "White", "Lee", "Adams", "Doe", "Müller",
+              "Rossi", "Martin", "Schmidt", "García", "Dubois", "Novak", "Jensen", "O'Brien"]
+# Share of customers with a Greek name
+GREEK_SHARE = 0.7
+
+ITEMS = ["Business cards printing", "Flyer design", "Brochure folding", "Advertising flyers",
+         "Invoice book printing", "Event posters", "Banner setup", "Shop branding",
+         "Εκτύπωση επαγγελματικών καρτών", "Σχεδιασμός φυλλαδίου", "Αφίσες εκδήλωσης",
+         "Μπλοκ τιμολογίων", "Προσκλητήρια γάμου", "Προσκλητήρια βάπτισης", "Ημερολόγια τοίχου",
+         "Αυτοκόλλητα", "Φάκελοι με λογότυπο", "Επιγραφή καταστήματος", "Πλαστικοποίηση",
+         "Βιβλιοδεσία", "Μενού εστιατορίου", "Ετικέτες προϊόντων", "Roll-up banner",
+         "Μακέτα λογοτύπου"]
+# Relative weight of each month (Jan-Dec): busier before Easter and from
+# September to December
+MONTH_WEIGHTS = [6, 7, 10, 11, 9, 7, 5, 3, 9, 10, 10, 13]
+FIRST_YEAR, LAST_YEAR = 2018, 2025
+
+
+def customer_count(n):
+    # Distinct customers for n invoices: a corner shop has a few hundred,
+    # a large database some tens of thousands
+    return max(50, min(50_000, n // 40))
+
+
+def make_customers(rnd, count):
+    names = []
+    seen = set()
+    while len(names) < count:
+        if rnd.random() < GREEK_SHARE:
+            if rnd.random() < 0.5:
+                name = f"{rnd.choice(GREEK_MEN)} {rnd.choice(GREEK_SURNAMES)[0]}"
+            else:
+                name = f"{rnd.choice(GREEK_WOMEN)} {rnd.choice(GREEK_SURNAMES)[1]}"
+        else:
+            name = f"{rnd.choice(LATIN_FIRST)} {rnd.choice(LATIN_LAST)}"
+        # the name pool is far smaller than 50k: namesakes get a suffix,
+        # the way shops tell them apart
+        if name in seen:
+            name = f"{name} ({len(names)})"
+        seen.add(name)
+        names.append(name)
+    return names
+
+
+def invoices(n, seed=1):
+    # (id, name, description, amount, date) tuples, as stored in timologia
+    rnd = random.Random(seed)
+    customers = make_customers(rnd, customer_count(n))
+    # Zipf-like: customer k is chosen with weight 1 / (k + 1)^0.8
+    cum_weights, total = [], 0.0
+    for k in range(len(customers)):
+        total += (k + 1) ** -0.8
+        cum_weights.append(total)
+    month_cum, total = [], 0
+    for w in MONTH_WEIGHTS:
+        total += w
+        month_cum.append(total)
+    months = range(1, 13)
+    years = range(FIRST_YEAR, LAST_YEAR + 1)
+    for i in range(n):
+        name = rnd.choices(customers, cum_weights=cum_weights)[0]
+        desc = json.dumps(rnd.sample(ITEMS, rnd.choice((1, 1, 1, 2, 2, 3, 4))), ensure_ascii=False)
+        amount = min(5000.0, max(5.0, math.exp(rnd.gauss(4.5, 0.8))))
+        year = rnd.choice(years)
+        month = rnd.choices(months, cum_weights=month_cum)[0]
+        day = rnd.randint(1, calendar.monthrange(year, month)[1])
+        yield (f"INV-{i:07d}", name, desc, f"{amount:.2f}", f"{day:02d}-{month:02d}-{year % 100:02d}")
+
+
+def make_db(path, n, seed=1):
+    # A timologia table with n invoices in the GUI's original schema; the
+    # repository migrates it on first open
+    conn = sqlite3.connect(path)
+    conn.execute("""CREATE TABLE timologia (
+                        id TEXT PRIMARY KEY,
+                        name TEXT,
+                        description TEXT,
+                        amount TEXT,
+                        date TEXT
+                    )""")
+    conn.executemany("INSERT INTO timologia VALUES (?, ?, ?, ?, ?)", invoices(n, seed))
+    conn.commit()
+    conn.close()
+
+
+def make_csv(path, n, seed=1):
+    # The same invoices as make_db, in the export format of timologia_db
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["ID", "Name", "Description", "Amount", "Date"])
+        writer.writerows(invoices(n, seed))
@@ -0,0 +1,296 @@
+# Timed scenarios on synthetic databases (see generate.py), with the
+# results written as JSON so that runs on different commits can be
+# compared:
+#   migrate        open + migrate a freshly generated database
+#   summary        dashboard_api.query_summary(), all time and a date window
+#   search         full-text search, first page of hits and hit count
+#   table_*        what the GUI's invoice table does: count + first page,
+#                  and scrolling through every row page by page
+#   export_csv     timologia_db.export_csv of the whole table
+#   import_csv     timologia_db.import_csv of a CSV with the same rows
+#   crud_*         single-invoice add / get / update / delete, as the GUI
+#                  and the CLI do them (median and p99 per operation)
+# Fast scenarios are the best of REPEAT runs, the bulk ones run once.
+# "seconds" is the figure compared between runs.
+#
+# Run from the project root with
+# python bench/run.py                              (10k and 100k rows)
+# python bench/run.py 1000000 10000000 --keep /var/tmp/bench
+# python bench/run.py --only summary,search
+# python bench/run.py --compare bench/results/OLD.json bench/results/NEW.json
+# --keep reuses generated databases between runs (10M rows take minutes
+# to generate); the copy each run works on is still thrown away.
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.abspath(os.path.join(HERE, ".."))
+sys.path.insert(0, ROOT)
+
+# every query of a large database would go to the slow query log
+os.environ.setdefault("DASHBOARD_SLOW_QUERY_MS", "inf")
+
+import dashboard_api
+import timologia_repo
+from bench.generate import make_csv, make_db
+
+SIZES = [10_000, 100_000]
+REPEAT = 3
+SEED = 1
+CRUD_OPS = 200
+PAGE_SIZE = 200           # InvoiceTableModel's page size
+SEARCH_TERMS = ["flyer", "προσκλητήρια", "Παπαδοπούλου"]
+SUMMARY_WINDOW = ("2021-03-15", "2023-10-20")
+THRESHOLD = 0.10          # --compare flags changes larger than this
+
+
+def best_of(fn, repeat=REPEAT):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        dt = time.perf_counter() - t0
+        best = dt if best is None else min(best, dt)
+    return best
+
+
+def once(fn):
+    t0 = time.perf_counter()
+    result = fn()
+    return time.perf_counter() - t0, result
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+def source_db(n, keep):
+    # A generated database, from the --keep directory if it is there
+    if keep:
+        os.makedirs(keep, exist_ok=True)
+        path = os.path.join(keep, f"synthetic-{n}-{SEED}.db")
+        if os.path.exists(path):
+            return path, None
+    else:
+        path = os.path.join(tempfile.mkdtemp(), "synthetic.db")
+    if os.path.exists(path + ".part"):      # left over by an interrupted run
+        os.remove(path + ".part")
+    dt, _ = once(lambda: make_db(path + ".part", n, SEED))
+    os.replace(path + ".part", path)
+    return path, dt
+
+
+def scenario_summary(repo, db, tmp, n):
+    dashboard_api.DB = db
+    dashboard_api.get_pool()
+    groups = tuple(dashboard_api.SUMMARY_GROUPS)
+    return {
+        "summary": {"seconds": best_of(dashboard_api.query_summary)},
+        "summary_window": {"seconds": best_of(
+            lambda: dashboard_api.query_summary(date_from=SUMMARY_WINDOW[0], date_to=SUMMARY_WINDOW[1],
+                                                groups=groups))},
+    }
+
+
+def scenario_search(repo, db, tmp, n):
+    hits = {term: repo.search_count(term) for term in SEARCH_TERMS}
+    return {
+        "search": {"seconds": best_of(lambda: [repo.search(t, PAGE_SIZE) for t in SEARCH_TERMS]),
+                   "hits": hits},
+        "search_count": {"seconds": best_of(lambda: [repo.search_count(t) for t in SEARCH_TERMS])},
+    }
+
+
+def scenario_table(repo, db, tmp, n):
+    def scroll():
+        after, rows = 0, 0
+        while True:
+            page = repo.page(after, PAGE_SIZE)
+            if not page:
+                return rows
+            rows += len(page)
+            after = page[-1][0]
+
+    first = best_of(lambda: (repo.count(), repo.page(0, PAGE_SIZE)))
+    dt, rows = once(scroll)
+    return {
+        "table_first_page": {"seconds": first},
+        "table_scroll": {"seconds": dt, "rows": rows, "rows_per_s": rows / dt},
+    }
+
+
+def scenario_export(repo, db, tmp, n):
+    dt, rows = once(lambda: repo.export_csv(os.path.join(tmp, "export.csv")))
+    return {"export_csv": {"seconds": dt, "rows": rows, "rows_per_s": rows / dt,
+                           "mb": os.path.getsize(os.path.join(tmp, "export.csv")) / 2**20}}
+
+
+def scenario_import(repo, db, tmp, n):
+    csv_path = os.path.join(tmp, "import.csv")
+    make_csv(csv_path, n, SEED)
+    target = timologia_repo.open_repository(os.path.join(tmp, "import.db"))
+    try:
+        dt, rows = once(lambda: target.import_csv(csv_path))
+    finally:
+        target.close()
+    return {"import_csv": {"seconds": dt, "rows": rows, "rows_per_s": rows / dt}}
+
+
+def scenario_crud(repo, db, tmp, n):
+    ids = [f"BENCH-{i:06d}" for i in range(CRUD_OPS)]
+    ops = {
+        "add": lambda i: repo.add(i, "Μαρία Παπαδοπούλου", ["Αφίσες εκδήλωσης", "Flyer design"],
+                                  "123.45", "15-05-24"),
+        "get": lambda i: repo.get(i),
+        "update": lambda i: repo.update(i, "Maria Papadopoulou", ["Event posters"], "99.90", "16-05-24"),
+        "delete": lambda i: repo.delete(i),
+    }
+    out = {}
+    for op, fn in ops.items():
+        times = []
+        for invoice_id in ids:
+            t0 = time.perf_counter()
+            fn(invoice_id)
+            times.append(time.perf_counter() - t0)
+        out["crud_" + op] = {"seconds": percentile(times, 0.5), "p99_seconds": percentile(times, 0.99)}
+    return out
+
+
+SCENARIOS = {
+    "summary": scenario_summary,
+    "search": scenario_search,
+    "table": scenario_table,
+    "export": scenario_export,
+    "crud": scenario_crud,
+    "import": scenario_import,
+}
+
+
+def run_size(n, only, keep):
+    results = {}
+    src, generated = source_db(n, keep)
+    if generated is not None:
+        results["generate"] = {"seconds": generated}
+    with tempfile.TemporaryDirectory() as tmp:
+        db = os.path.join(tmp, "bench.db")
+        shutil.copyfile(src, db)
+        if not keep:
+            shutil.rmtree(os.path.dirname(src))
+        dt, repo = once(lambda: timologia_repo.open_repository(db))
+        results["migrate"] = {"seconds": dt}
+        try:
+            for name, scenario in SCENARIOS.items():
+                if only and name not in only:
+                    continue
+                print(f"  {name}", file=sys.stderr, flush=True)
+                results.update(scenario(repo, db, tmp, n))
+        finally:
+            repo.close()
+    return results
+
+
+def git(*args):
+    try:
+        return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    commit = git("rev-parse", "HEAD")
+    return {
+        "commit": commit,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")) if commit else None,
+        "subject": git("log", "-1", "--format=%s"),
+        "time": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "seed": SEED,
+    }
+
+
+def print_results(results):
+    for n, scenarios in results.items():
+        print(f"{n} rows")
+        for name, r in scenarios.items():
+            extra = f"  {r['rows_per_s']:>12,.0f} rows/s" if "rows_per_s" in r else ""
+            print(f"  {name:<18} {r['seconds'] * 1000:>12.3f} ms{extra}")
+
+
+def compare(old_path, new_path, threshold=THRESHOLD):
+    # Prints new / old "seconds" for every scenario both runs have;
+    # returns the number of regressions (slower by more than threshold)
+    with open(old_path, encoding="utf-8") as f:
+        old = json.load(f)
+    with open(new_path, encoding="utf-8") as f:
+        new = json.load(f)
+    print(f"old: {(old['env']['commit'] or '?')[:10]} {old['env']['subject'] or ''}")
+    print(f"new: {(new['env']['commit'] or '?')[:10]} {new['env']['subject'] or ''}")
+    regressions = 0
+    for n, scenarios in new["results"].items():
+        before = old["results"].get(n)
+        if before is None:
+            continue
+        print(f"{n} rows")
+        for name, r in scenarios.items():
+            if name not in before or name == "generate":
+                continue
+            ratio = r["seconds"] / before[name]["seconds"] if before[name]["seconds"] else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "slower"
+                regressions += 1
+            elif ratio < 1 - threshold:
+                flag = "faster"
+            print(f"  {name:<18} {before[name]['seconds'] * 1000:>12.3f} {r['seconds'] * 1000:>12.3f} ms"
+                  f" {ratio:>7.2f}x {flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=SIZES)
+    parser.add_argument("--only", help="comma-separated scenarios: " + ",".join(SCENARIOS))
+    parser.add_argument("--keep", metavar="DIR", help="keep generated databases in DIR and reuse them")
+    parser.add_argument("--out", help="JSON file (default bench/results/<commit>-<time>.json)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files")
+    parser.add_argument("--threshold", type=float, default=THRESHOLD)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.threshold) else 0)
+    only = set(args.only.split(",")) if args.only else None
+    if only and not only <= set(SCENARIOS):
+        parser.error(f"unknown scenario: {', '.join(sorted(only - set(SCENARIOS)))}")
+
+    env = environment()
+    results = {}
+    for n in args.sizes:
+        print(f"{n} rows", file=sys.stderr, flush=True)
+        results[str(n)] = run_size(n, only, args.keep)
+    out = args.out
+    if out is None:
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        out = os.path.join(HERE, "results", f"{(env['commit'] or 'nogit')[:10]}-{stamp}.json")
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump({"env": env, "results": results}, f, ensure_ascii=False, indent=1)
+    print_results(results)
+    print(f"written to {out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,25 +1,529 @@
 # dashboard_api.py
+import asyncio
+import base64
 import sqlite3
+import gzip
 import json
+import logging
 import os
-from fastapi import FastAPI
-from fastapi.responses import HTMLResponse, JSONResponse
+import re
+import string
+import threading
+import hashlib
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import HTMLResponse, JSONResponse, Response, StreamingResponse
 
-DB = os.path.join(os.path.dirname(__file__), "timologia.db")
+import dashboard_metrics
+import timologia_db
+import timologia_repo
+from dashboard_metrics import Counter, Gauge, Histogram
+from timologia_repo import Repository
+
+try:
+    import brotli
+except ImportError:     # optional: without it responses are only gzip-compressed
+    brotli = None
+
+DB = os.environ.get("TIMOLOGIA_DB") or os.path.join(os.path.dirname(__file__), "timologia.db")
 app = FastAPI(title="Printing Shop Dashboard")
 
 
+# Connection pool
+# Queries run on the worker threads of db_executor (see below), so
+# connections are opened with check_same_thread=False and handed to one
+# worker at a time.
+# Connections are read-only (the dashboard never writes), have the read
+# PRAGMAs applied once when created, and are recycled after POOL_MAX_AGE
+# seconds or POOL_MAX_USES checkouts.
+POOL_SIZE = int(os.environ.get("DASHBOARD_POOL_SIZE", "4"))
+POOL_TIMEOUT = 10.0        # seconds to wait for a free connection
+POOL_MAX_AGE = 300.0       # seconds before a connection is recycled
+POOL_MAX_USES = 1000       # checkouts before a connection is recycled
+POOL_PING_AFTER = 30.0     # idle seconds after which a connection is health-checked
+POOL_RETRY_AFTER = 1       # seconds a client is asked to wait when the pool is exhausted
+READ_PRAGMAS = (
+    "PRAGMA mmap_size = 268435456",   # 256 MB
+    "PRAGMA cache_size = -65536",     # 64 MB
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Every connection stayed busy for POOL_TIMEOUT: the dashboard is
+# overloaded, not broken, so ask the client to come back
+@app.exception_handler(PoolTimeout)
+async def pool_timeout_handler(request, exc):
+    return JSONResponse({"detail": str(exc)}, status_code=503,
+                        headers={"Retry-After": str(POOL_RETRY_AFTER)})
+
+
+class _PooledConnection:
+    def __init__(self, conn):
+        self.conn = conn
+        self.created = time.monotonic()
+        self.last_used = self.created
+        self.uses = 0
+
+
+class ConnectionPool:
+    repository = Repository
+
+    def __init__(self, path, size=POOL_SIZE, timeout=POOL_TIMEOUT,
+                 max_age=POOL_MAX_AGE, max_uses=POOL_MAX_USES):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_uses = max_uses
+        self._idle = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self._in_use = 0
+        self._closed = False
+        self.stats_counters = {
+            "created": 0, "reused": 0, "recycled": 0, "failed_checks": 0,
+            "timeouts": 0, "checkouts": 0, "wait_seconds": 0.0,
+        }
+        self._prepare_database()
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+
+    def _prepare_database(self):
+        # journal_mode is persistent in the file but can only be changed
+        # by a writable connection (timologia_repo.connect switches to
+        # WAL); read-only connections then pick it up. The same connection
+        # brings the schema up to date in case the GUI has not done so yet.
+        conn = timologia_repo.connect(self.path, timeout=self.timeout)
+        try:
+            timologia_db.migrate(conn)
+        finally:
+            conn.close()
+
+    def _open(self):
+        conn = timologia_repo.connect(self.path, readonly=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        for pragma in READ_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def _connect(self):
+        conn = self._open()
+        with self._lock:
+            self.stats_counters["created"] += 1
+        return _PooledConnection(conn)
+
+    def data_version(self):
+        # PRAGMA data_version changes whenever another connection (the GUI,
+        # an import, another process) commits. It is only comparable on the
+        # same connection, so one dedicated connection answers for the pool.
+        with self._version_lock:
+            if self._version_conn is None:
+                self._version_conn = self._open()
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _healthy(self, pc):
+        now = time.monotonic()
+        if now - pc.created > self.max_age or pc.uses >= self.max_uses:
+            with self._lock:
+                self.stats_counters["recycled"] += 1
+            return False
+        if now - pc.last_used > POOL_PING_AFTER:
+            try:
+                pc.conn.execute("SELECT 1").fetchone()
+            except sqlite3.Error:
+                with self._lock:
+                    self.stats_counters["failed_checks"] += 1
+                return False
+        return True
+
+    def acquire(self):
+        t0 = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.stats_counters["timeouts"] += 1
+            raise PoolTimeout(f"no free database connection after {self.timeout}s")
+        waited = time.perf_counter() - t0
+        try:
+            pc = None
+            while True:
+                with self._lock:
+                    candidate = self._idle.pop() if self._idle else None
+                if candidate is None:
+                    pc = self._connect()
+                    break
+                if self._healthy(candidate):
+                    pc = candidate
+                    with self._lock:
+                        self.stats_counters["reused"] += 1
+                    break
+                candidate.conn.close()
+        except Exception:
+            self._slots.release()
+            raise
+        pc.uses += 1
+        with self._lock:
+            self._in_use += 1
+            self.stats_counters["checkouts"] += 1
+            self.stats_counters["wait_seconds"] += waited
+        POOL_WAIT.observe(waited)
+        return pc
+
+    def release(self, pc, broken=False):
+        pc.last_used = time.monotonic()
+        with self._lock:
+            self._in_use -= 1
+            keep = not broken and not self._closed
+            if keep:
+                self._idle.append(pc)
+        if not keep:
+            pc.conn.close()
+        self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        pc = self.acquire()
+        broken = False
+        try:
+            yield pc.conn
+        except sqlite3.DatabaseError:
+            # do not hand a connection in an unknown state to the next request
+            broken = True
+            raise
+        finally:
+            self.release(pc, broken=broken)
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.stats_counters)
+            out.update({"size": self.size, "in_use": self._in_use, "idle": len(self._idle)})
+        out["wait_seconds"] = round(out["wait_seconds"], 6)
+        return out
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle, self._idle = self._idle, []
+        for pc in idle:
+            pc.conn.close()
+        with self._version_lock:
+            if self._version_conn is not None:
+                self._version_conn.close()
+                self._version_conn = None
+
+
+# With TIMOLOGIA_DB=postgresql://... the pool is a psycopg_pool pool of
+# read-only connections with the same interface (see timologia_pg.py).
+class PostgresPool:
+    def __init__(self, url, size=POOL_SIZE, timeout=POOL_TIMEOUT, max_age=POOL_MAX_AGE):
+        import timologia_pg
+        self.path = url
+        self.repository = timologia_pg.PgRepository
+        self._wrap = timologia_pg.PgConnection
+        # the schema is created by a writable connection, as for SQLite
+        repo = timologia_pg.open_repository(url)
+        try:
+            repo.migrate()
+        finally:
+            repo.close()
+        self._pool = timologia_pg.create_pool(url, max_size=size, timeout=timeout, max_lifetime=max_age)
+        self._timeout_error = timologia_pg.psycopg_pool.PoolTimeout
+
+    @contextmanager
+    def connection(self):
+        t0 = time.perf_counter()
+        try:
+            with self._pool.connection() as raw:
+                POOL_WAIT.observe(time.perf_counter() - t0)
+                yield self._wrap(raw)
+        except self._timeout_error as e:
+            raise PoolTimeout(str(e)) from e
+
+    def data_version(self):
+        with self.connection() as conn:
+            return self.repository(conn).data_version()
+
+    def stats(self):
+        return self._pool.get_stats()
+
+    def close(self):
+        self._pool.close()
+
+
+# Metrics
+# Every repository call of the endpoints is timed under its method name
+# (query label) with the rows it returned; raw SQL through rows() counts
+# as "sql". Calls slower than DASHBOARD_SLOW_QUERY_MS go to the slow
+# query log with their SQL and EXPLAIN QUERY PLAN (see
+# dashboard_metrics.py). Request latency is recorded per route by
+# record_request, and the pool and cache counters are read from their
+# stats() when /metrics is scraped.
+SLOW_QUERY_MS = float(os.environ.get("DASHBOARD_SLOW_QUERY_MS", "200"))
+
+metrics = dashboard_metrics.Registry()
+REQUEST_SECONDS = metrics.add(Histogram(
+    "dashboard_request_duration_seconds", "Time to answer a request, by route (until the response starts)",
+    ["method", "route", "status"]))
+QUERY_SECONDS = metrics.add(Histogram(
+    "dashboard_query_duration_seconds", "Time of a database query, by repository method", ["query"]))
+QUERY_ROWS = metrics.add(Histogram(
+    "dashboard_query_rows", "Rows returned by a database query", ["query"], dashboard_metrics.ROW_BUCKETS))
+QUERY_ERRORS = metrics.add(Counter(
+    "dashboard_query_errors_total", "Database queries that raised an error", ["query"]))
+SLOW_QUERIES = metrics.add(Counter(
+    "dashboard_slow_queries_total", "Database queries over the slow query threshold", ["query"]))
+POOL_WAIT = metrics.add(Histogram(
+    "dashboard_pool_wait_seconds", "Time waiting for a pooled database connection"))
+slow_queries = dashboard_metrics.SlowQueryLog(SLOW_QUERY_MS / 1000.0)
+
+
+def _pool_stats():
+    stats = _pool.stats() if _pool is not None else {}
+    return {(k,): v for k, v in stats.items() if isinstance(v, (int, float))}
+
+
+def _cache_counts():
+    stats = response_cache.stats()
+    return {(k,): stats[k] for k in ("hits", "misses", "not_modified", "expired", "evictions")}
+
+
+metrics.add(Gauge("dashboard_pool", "Connection pool statistics (see /api/pool)", _pool_stats, ["stat"]))
+metrics.add(Gauge("dashboard_cache_lookups_total", "Response cache lookups and outcomes", _cache_counts,
+                  ["result"], kind="counter"))
+metrics.add(Gauge("dashboard_cache_hit_ratio", "Response cache hits / lookups",
+                  lambda: {(): response_cache.stats()["hit_ratio"]}))
+metrics.add(Gauge("dashboard_cache_entries", "Responses in the cache",
+                  lambda: {(): response_cache.stats()["entries"]}))
+
+
+def repository(pool, conn):
+    # The pool's repository on a pooled connection, instrumented
+    tracing = dashboard_metrics.TracingConnection(conn)
+    return dashboard_metrics.InstrumentedRepository(
+        pool.repository(tracing), tracing, QUERY_SECONDS, QUERY_ROWS, QUERY_ERRORS, slow_queries, SLOW_QUERIES)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    # (Re)create the pool lazily, also when DB is pointed at another file
+    global _pool
+    with _pool_lock:
+        if _pool is None or _pool.path != DB:
+            if _pool is not None:
+                _pool.close()
+            _pool = PostgresPool(DB) if timologia_repo.is_database_url(DB) else ConnectionPool(DB)
+            response_cache.clear()
+        return _pool
+
+
 def rows(query, params=()):
-    conn = sqlite3.connect(DB)
-    conn.row_factory = sqlite3.Row
-    cur = conn.cursor()
-    cur.execute(query, params)
-    res = cur.fetchall()
-    conn.close()
-    return res
+    pool = get_pool()
+    with pool.connection() as conn:
+        repo = repository(pool, conn)
+        return repo.run("sql", lambda: repo.conn.execute(query, params).fetchall())
+
+
+def with_repo(method, *args, **kw):
+    # A repository method on a pooled connection, e.g. with_repo("revenue", 7)
+    pool = get_pool()
+    with pool.connection() as conn:
+        return getattr(repository(pool, conn), method)(*args, **kw)
+
+
+# Async endpoints
+# The endpoints are async and hand every SQLite call to db_executor, a
+# thread pool used only for the database, so the event loop never waits
+# on a query and a slow query cannot starve FastAPI's own threadpool.
+# At most DB_CONCURRENCY queries are in flight; the rest wait on the
+# semaphore instead of queueing for a pooled connection.
+DB_WORKERS = int(os.environ.get("DASHBOARD_DB_WORKERS", str(POOL_SIZE)))
+DB_CONCURRENCY = int(os.environ.get("DASHBOARD_DB_CONCURRENCY", str(POOL_SIZE)))
+
+_executor = None
+_executor_lock = threading.Lock()
+_limit = None
+_limit_loop = None
+
+
+def db_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=DB_WORKERS, thread_name_prefix="dashboard-db")
+        return _executor
+
+
+def _db_limit():
+    # A semaphore belongs to one event loop; make a new one if the app is
+    # served from another loop (e.g. a second TestClient)
+    global _limit, _limit_loop
+    loop = asyncio.get_running_loop()
+    if _limit_loop is not loop:
+        _limit, _limit_loop = asyncio.Semaphore(DB_CONCURRENCY), loop
+    return _limit
+
+
+async def run_db(fn, *args):
+    async with _db_limit():
+        return await asyncio.get_running_loop().run_in_executor(db_executor(), fn, *args)
+
+
+async def arows(query, params=()):
+    return await run_db(rows, query, params)
+
+
+async def arepo(method, *args, **kw):
+    return await run_db(lambda: with_repo(method, *args, **kw))
+
+
+# Response cache
+# Rendered bodies are cached per (endpoint, parameters, data_version), so a
+# repeated request on unchanged data skips SQL and rendering entirely. The
+# ETag is a hash of the body: browsers revalidating with If-None-Match get
+# a 304 without a body, and an ETag stays valid across dashboard restarts.
+# The TTL bounds how long an entry lives even if data_version misses a
+# change (e.g. timologia.db replaced on disk).
+CACHE_TTL = float(os.environ.get("DASHBOARD_CACHE_TTL", "60"))   # seconds
+CACHE_MAX_ENTRIES = 128
+
+
+COMPRESS_MIN_SIZE = 1024  # bytes; smaller bodies are sent as they are
+
+
+class _CacheEntry:
+    def __init__(self, body, media_type):
+        self.body = body
+        self.media_type = media_type
+        self.etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        self.created = time.monotonic()
+        self._encoded = {}
+
+    def encoded(self, encoding):
+        # Compressed once per entry, by the first request that accepts it
+        body = self._encoded.get(encoding)
+        if body is None:
+            if encoding == "br":
+                body = brotli.compress(self.body)
+            else:
+                body = gzip.compress(self.body, compresslevel=6, mtime=0)
+            self._encoded[encoding] = body
+        return body
+
+
+class ResponseCache:
+    def __init__(self, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats_counters = {"hits": 0, "misses": 0, "not_modified": 0,
+                               "expired": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry.created > self.ttl:
+                del self._entries[key]
+                self.stats_counters["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats_counters["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return entry
+
+    def put(self, key, body, media_type):
+        entry = _CacheEntry(body, media_type)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats_counters["evictions"] += 1
+        return entry
+
+    def count_not_modified(self):
+        with self._lock:
+            self.stats_counters["not_modified"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            out = dict(self.stats_counters)
+            out.update({"entries": len(self._entries), "max_entries": self.max_entries,
+                        "ttl": self.ttl})
+        lookups = out["hits"] + out["misses"]
+        out["hit_ratio"] = round(out["hits"] / lookups, 4) if lookups else 0.0
+        return out
+
+
+response_cache = ResponseCache()
+
+
+def json_body(content):
+    # Same encoding as JSONResponse
+    return json.dumps(content, ensure_ascii=False, allow_nan=False,
+                      separators=(",", ":")).encode("utf-8")
+
+
+def _accepted_encoding(request, entry):
+    if len(entry.body) < COMPRESS_MIN_SIZE:
+        return None
+    accept = request.headers.get("accept-encoding", "")
+    offered = {t.split(";")[0].strip() for t in accept.split(",")}
+    if brotli is not None and "br" in offered:
+        return "br"
+    if "gzip" in offered:
+        return "gzip"
+    return None
 
 
-def query_summary():
+def entry_response(request, entry, cache_control):
+    # 304 if the client's copy is current, else the body, compressed if accepted
+    headers = {"ETag": entry.etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(",")]
+        if "*" in tags or entry.etag in tags or "W/" + entry.etag in tags:
+            return Response(status_code=304, headers=headers)
+    encoding = _accepted_encoding(request, entry)
+    if encoding is None:
+        return Response(content=entry.body, media_type=entry.media_type, headers=headers)
+    headers["Content-Encoding"] = encoding
+    return Response(content=entry.encoded(encoding), media_type=entry.media_type, headers=headers)
+
+
+async def cached_response(request, key, build, media_type="application/json"):
+    # await build() returns the body bytes and only runs on a cache miss
+    pool = get_pool()
+    cache_key = (key, await run_db(pool.data_version))
+    entry = response_cache.get(cache_key)
+    if entry is None:
+        entry = response_cache.put(cache_key, await build(), media_type)
+    response = entry_response(request, entry, "no-cache")
+    if response.status_code == 304:
+        response_cache.count_not_modified()
+    return response
+
+
+def query_summary_multi():
+    # Reference implementation: four separate full-table scans.
+    # Kept for benchmarking and for cross-checking query_summary().
     # total sales
     r = rows("SELECT SUM(CAST(amount AS REAL)) as total FROM timologia")
     total = float(r[0]["total"] or 0.0) if r else 0.0
@@ -47,63 +551,395 @@ def query_summary():
     }
 
 
+# Summary from the materialized summary tables (see timologia_repo.py).
+# Products are the description items; their revenue is the line amount
+# or an equal share of the invoice (see timologia_db.py, version 6).
+# top_n is the length of each ranking; a date window (date_from/date_to,
+# YYYY-MM-DD, inclusive) sums the invoices of the window instead, from
+# the (date_iso, customer_id, amount_cents) index. groups are the
+# rankings to include (SUMMARY_GROUPS): the dashboard shows customers and
+# products.
+SUMMARY_TOP = 8
+SUMMARY_TOP_MAX = 1000
+SUMMARY_GROUPS = {"customer": "top_customers", "product": "top_products", "month": "top_months"}
+DEFAULT_SUMMARY_GROUPS = ("customer", "product")
+
+
+def query_summary(top_n=SUMMARY_TOP, date_from=None, date_to=None, groups=DEFAULT_SUMMARY_GROUPS):
+    pool = get_pool()
+    with pool.connection() as conn:
+        repo = repository(pool, conn)
+        rankings = {g: getattr(repo, SUMMARY_GROUPS[g])(top_n, date_from, date_to) for g in groups}
+        return _summary(repo.total_cents(date_from, date_to), repo.most_expensive(date_from, date_to),
+                        rankings)
+
+
+async def query_summary_async(top_n=SUMMARY_TOP, date_from=None, date_to=None,
+                              groups=DEFAULT_SUMMARY_GROUPS):
+    # The queries are independent, so they run concurrently on separate
+    # pooled connections
+    total, most, *ranked = await asyncio.gather(
+        arepo("total_cents", date_from, date_to), arepo("most_expensive", date_from, date_to),
+        *(arepo(SUMMARY_GROUPS[g], top_n, date_from, date_to) for g in groups))
+    return _summary(total, most, dict(zip(groups, ranked)))
+
+
+def _summary(total, most, rankings):
+    out = {"total_sales": total / 100.0, "most_expensive": dict(most) if most else None}
+    if "customer" in rankings:
+        top_customers = [{"name": r["name"], "total": r["total_cents"] / 100.0} for r in rankings["customer"]]
+        if top_customers:
+            out["top_customer"] = dict(top_customers[0])
+        else:
+            out["top_customer"] = {"name": None, "total": 0.0}
+        out["top_customers"] = top_customers
+    if "product" in rankings:
+        out["top_products"] = [{"product": r["product"], "total": r["total_cents"] / 100.0, "lines": r["lines"]}
+                               for r in rankings["product"]]
+    if "month" in rankings:
+        out["top_months"] = [{"month": r["month"], "total": r["total_cents"] / 100.0, "invoices": r["invoices"]}
+                             for r in rankings["month"]]
+    return out
+
+
+# top: length of the rankings (1 to SUMMARY_TOP_MAX); from/to: date
+# window; group: only that ranking (customer, product or month)
 @app.get("/api/summary", response_class=JSONResponse)
-def api_summary():
-    return JSONResponse(content=query_summary())
+async def api_summary(request: Request, top: int = Query(SUMMARY_TOP, ge=1, le=SUMMARY_TOP_MAX),
+                      date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"),
+                      group: str = Query(None, pattern="^(customer|product|month)$")):
+    check_date(date_from)
+    check_date(date_to)
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(status_code=400, detail="'from' must not be after 'to'")
+    groups = (group,) if group else DEFAULT_SUMMARY_GROUPS
+
+    async def build():
+        return json_body(await query_summary_async(top, date_from, date_to, groups))
+    return await cached_response(request, ("summary", top, date_from, date_to, groups), build)
+
+
+# Revenue per month / year from the (date_iso, customer_id, amount_cents)
+# index. from/to are ISO dates (YYYY-MM-DD), both inclusive.
+# Dates are compared as text with date_iso, so they must be zero-padded
+# ("2023-1-1" would sort after "2023-09-30").
+def check_date(value):
+    if value is not None:
+        try:
+            if not re.fullmatch(r"\d{4}-\d{2}-\d{2}", value):
+                raise ValueError(value)
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid date '{value}', expected YYYY-MM-DD")
+
+
+def query_revenue(period_len, date_from=None, date_to=None):
+    check_date(date_from)
+    check_date(date_to)
+    res = with_repo("revenue", period_len, date_from, date_to)
+    return [{"period": r["period"], "total": (r["tot"] or 0) / 100.0, "invoices": r["n"]} for r in res]
+
+
+@app.get("/api/revenue/monthly", response_class=JSONResponse)
+async def api_revenue_monthly(request: Request, date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to")):
+    return await cached_response(request, ("monthly", date_from, date_to),
+                                 lambda: run_db(lambda: json_body(query_revenue(7, date_from, date_to))))
+
+
+@app.get("/api/revenue/yearly", response_class=JSONResponse)
+async def api_revenue_yearly(request: Request, date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to")):
+    return await cached_response(request, ("yearly", date_from, date_to),
+                                 lambda: run_db(lambda: json_body(query_revenue(4, date_from, date_to))))
+
+
+# One customer: lifetime total, invoice count, average ticket, first and
+# last purchase and the monthly history, from the covering (name,
+# date_iso, amount_cents) index (see timologia_db.py, version 8), so the
+# cost depends on the customer's invoices, not the table size. name is
+# the exact name; 404 if it has no invoices.
+def query_customer(name):
+    pool = get_pool()
+    with pool.connection() as conn:
+        repo = repository(pool, conn)
+        stats = repo.customer(name)
+        monthly = repo.customer_monthly(name) if stats["n"] else []
+    if not stats["n"]:
+        raise HTTPException(status_code=404, detail=f"No invoices for customer '{name}'")
+    total = stats["tot"] or 0
+    return {
+        "name": name,
+        "total": total / 100.0,
+        "invoices": stats["n"],
+        "average": round(total / stats["n"]) / 100.0,
+        "first_purchase": stats["first"],
+        "last_purchase": stats["last"],
+        "monthly": [{"month": r["month"], "total": (r["tot"] or 0) / 100.0, "invoices": r["n"]}
+                    for r in monthly],
+    }
+
+
+@app.get("/api/customers/{name:path}", response_class=JSONResponse)
+async def api_customer(request: Request, name: str):
+    return await cached_response(request, ("customer", name),
+                                 lambda: run_db(lambda: json_body(query_customer(name))))
+
+
+# Full-text search over id, name and description items (see timologia_db.py).
+# Every word matches as a prefix; best matches first, page is 1-based.
+def query_search(q, page, per_page):
+    pool = get_pool()
+    with pool.connection() as conn:
+        repo = repository(pool, conn)
+        total = repo.search_count(q)
+        hits = repo.search(q, per_page, (page - 1) * per_page)
+    results = [{"id": r["id"], "name": r["name"], "description": r["description"],
+                "amount": r["amount"], "date": r["date"], "score": round(-r["score"], 4)}
+               for r in hits]
+    return {"query": q, "page": page, "per_page": per_page, "total": total, "results": results}
+
+
+@app.get("/api/search", response_class=JSONResponse)
+async def api_search(request: Request, q: str = "", page: int = Query(1, ge=1),
+                     per_page: int = Query(20, ge=1, le=100)):
+    return await cached_response(request, ("search", q, page, per_page),
+                                 lambda: run_db(lambda: json_body(query_search(q, page, per_page))))
+
+
+# Invoice listing with keyset pagination (Repository.list_invoices).
+# A page continues after the sort key of the previous page's last row
+# instead of using OFFSET, so a deep page costs the same as the first:
+# sort=id seeks the primary key, sort=date the (date_iso, id) index,
+# customer= the (name, id) index.
+# Filters: customer (exact name), from/to (YYYY-MM-DD, inclusive),
+# min_amount/max_amount (inclusive). sort=date only lists invoices with
+# a valid date. format=ndjson streams every matching row (or the first
+# `limit`), one JSON object per line.
+INVOICE_FIELDS = timologia_repo.COLUMNS
+INVOICE_SORT_KEYS = timologia_repo.SORT_KEYS
+INVOICE_PAGE_SIZE = 100
+INVOICE_PAGE_MAX = 1000
+NDJSON_BATCH = 1000
+
+
+def parse_fields(fields):
+    if not fields:
+        return INVOICE_FIELDS
+    out = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    unknown = [f for f in out if f not in INVOICE_FIELDS]
+    if unknown or not out:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown field(s) {', '.join(unknown)}; expected {', '.join(INVOICE_FIELDS)}")
+    return out
+
+
+def amount_to_cents(value):
+    # Same rounding as timologia_db.AMOUNT_CENTS_SQL, i.e. SQLite's
+    # ROUND(x * 100): half away from zero on the same double (Python's
+    # round() goes half to even, so 0.125 would give 12, not 13)
+    if value is None:
+        return None
+    cents = value * 100
+    return int(cents + (0.5 if cents >= 0 else -0.5))
+
+
+def encode_cursor(row, sort):
+    keys = [row[k] for k in INVOICE_SORT_KEYS[sort]]
+    return base64.urlsafe_b64encode(json_body(keys)).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor, sort):
+    if not cursor:
+        return None
+    try:
+        keys = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        keys = None
+    if (not isinstance(keys, list) or len(keys) != len(INVOICE_SORT_KEYS[sort])
+            or not all(isinstance(k, str) for k in keys)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return keys
+
+
+def invoice_page(fields, sort, filters, after, limit):
+    # One row more than asked tells whether there is a next page
+    res = with_repo("list_invoices", fields, sort, after=after, limit=limit + 1, **filters)
+    page = res[:limit]
+    return {
+        "items": [{f: r[f] for f in fields} for r in page],
+        "next": encode_cursor(page[-1], sort) if len(res) > limit else None,
+    }
+
+
+async def invoice_lines(fields, sort, filters, after, limit):
+    # Each batch checks out a pooled connection only while it runs, so a
+    # slow client never holds one; the keyset cursor carries the position
+    left = limit
+    while left is None or left > 0:
+        n = NDJSON_BATCH if left is None else min(NDJSON_BATCH, left)
+        batch = await arepo("list_invoices", fields, sort, after=after, limit=n, **filters)
+        if batch:
+            yield b"".join(json_body({f: r[f] for f in fields}) + b"\n" for r in batch)
+        if len(batch) < n:
+            break
+        after = [batch[-1][k] for k in INVOICE_SORT_KEYS[sort]]
+        if left is not None:
+            left -= n
+
+
+@app.get("/api/invoices")
+async def api_invoices(request: Request, customer: str = None,
+                       date_from: str = Query(None, alias="from"), date_to: str = Query(None, alias="to"),
+                       min_amount: float = Query(None, allow_inf_nan=False),
+                       max_amount: float = Query(None, allow_inf_nan=False),
+                       sort: str = Query("id", pattern="^(id|date)$"), fields: str = None,
+                       after: str = None, limit: int = Query(None, ge=1),
+                       format: str = Query("json", pattern="^(json|ndjson)$")):
+    check_date(date_from)
+    check_date(date_to)
+    columns = parse_fields(fields)
+    cursor = decode_cursor(after, sort)
+    filters = {"customer": customer, "date_from": date_from, "date_to": date_to,
+               "min_cents": amount_to_cents(min_amount), "max_cents": amount_to_cents(max_amount)}
+    if format == "ndjson":
+        return StreamingResponse(invoice_lines(columns, sort, filters, cursor, limit),
+                                 media_type="application/x-ndjson")
+    if limit is None:
+        limit = INVOICE_PAGE_SIZE
+    elif limit > INVOICE_PAGE_MAX:
+        raise HTTPException(status_code=400, detail=f"limit must be at most {INVOICE_PAGE_MAX}")
+    key = ("invoices", columns, sort, tuple(filters.values()), after, limit)
+    return await cached_response(request, key, lambda: run_db(
+        lambda: json_body(invoice_page(columns, sort, filters, cursor, limit))))
+
+
+@app.get("/api/pool", response_class=JSONResponse)
+def api_pool():
+    return JSONResponse(content=get_pool().stats())
+
+
+@app.get("/api/cache", response_class=JSONResponse)
+def api_cache():
+    return JSONResponse(content=response_cache.stats())
+
+
+@app.get("/api/slow-queries", response_class=JSONResponse)
+def api_slow_queries():
+    return JSONResponse(content={"threshold_ms": SLOW_QUERY_MS, "queries": slow_queries.entries()})
+
+
+@app.get("/metrics")
+def api_metrics():
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.middleware("http")
+async def record_request(request: Request, call_next):
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    REQUEST_SECONDS.observe(time.perf_counter() - t0, request.method,
+                            route.path if route is not None else "unmatched", str(response.status_code))
+    return response
+
+
+@app.on_event("shutdown")
+def close_pool():
+    global _executor
+    if _pool is not None:
+        _pool.close()
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False)
+            _executor = None
+
+
+# Dashboard pages and static assets
+# The pages are fixed shells (templates/dashboard.html, customer.html)
+# filled by their script from the API (dashboard.js from /api/summary,
+# customer.js from /api/customers/{name}), so they do not depend on the
+# data and are rendered once per process. Assets in static/ are read once, served
+# under content-hashed URLs with a one-year immutable Cache-Control, and
+# compressed once per encoding. Chart.js is served from
+# static/chart.umd.min.js when bundled, otherwise from the CDN.
+HERE = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(HERE, "static")
+TEMPLATE_DIR = os.path.join(HERE, "templates")
+CHART_JS_CDN = "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js"
+STATIC_TYPES = {".js": "text/javascript; charset=utf-8", ".css": "text/css; charset=utf-8"}
+CHART_JS_FILE = "chart.umd.min.js"
+STATIC_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PAGE_CACHE_CONTROL = "max-age=3600"
+
+_static = {}
+_pages = {}
+
+
+def static_asset(name):
+    entry = _static.get(name)
+    if entry is None:
+        media_type = STATIC_TYPES.get(os.path.splitext(name)[1])
+        path = os.path.join(STATIC_DIR, name)
+        if media_type is None or os.path.basename(name) != name or not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            entry = _static[name] = _CacheEntry(f.read(), media_type)
+    return entry
+
+
+def static_url(name):
+    entry = static_asset(name)
+    if entry is None:
+        return None
+    version = entry.etag.strip('"')[:12]
+    return f"/static/{name}?v={version}"
+
+
+def render_page(name):
+    with open(os.path.join(TEMPLATE_DIR, name), encoding="utf-8") as f:
+        template = string.Template(f.read())
+    return template.substitute(
+        chart_js=static_url(CHART_JS_FILE) or CHART_JS_CDN,
+        dashboard_js=static_url("dashboard.js"),
+        customer_js=static_url("customer.js"),
+        dashboard_css=static_url("dashboard.css"),
+    )
+
+
+def html_page(name):
+    entry = _pages.get(name)
+    if entry is None:
+        entry = _pages[name] = _CacheEntry(render_page(name).encode("utf-8"), "text/html; charset=utf-8")
+    return entry
+
+
+@app.on_event("startup")
+def check_chart_js():
+    # The dashboard is meant to work without internet at the counter,
+    # which needs Chart.js bundled in static/ (see the README)
+    if static_asset(CHART_JS_FILE) is None:
+        logging.getLogger("dashboard_api").warning(
+            "static/%s not found: the charts load Chart.js from %s and need internet access. "
+            "Bundle it with: curl -o static/%s %s", CHART_JS_FILE, CHART_JS_CDN, CHART_JS_FILE, CHART_JS_CDN)
+
+
+@app.get("/static/{name}")
+def static_file(request: Request, name: str):
+    entry = static_asset(name)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return entry_response(request, entry, STATIC_CACHE_CONTROL)
 
 
 @app.get("/", response_class=HTMLResponse)
 @app.get("/dashboard", response_class=HTMLResponse)
-def dashboard():
-    s = query_summary()
-    labels = [tc["name"] or "Unknown" for tc in s["top_customers"]]
-    values = [tc["total"] for tc in s["top_customers"]]
-    labels_js = json.dumps(labels)
-    values_js = json.dumps(values)
-    total_html = f"{s['total_sales']:.2f}"
-    top_name = s["top_customer"]["name"] or "N/A"
-    top_total = f"{s['top_customer']['total']:.2f}"
-    most = s["most_expensive"] or {}
-    most_html = "<em>None</em>"
-    if most:
-        desc = most.get("description") or ""
-        issue = most.get("id") or ""
-        most_html = f"<div><strong>Issue:</strong> {issue}</div><div><strong>Customer:</strong> {most.get('name','')}</div><div><strong>Amount:</strong> {most.get('amount','')}</div><div><strong>Date:</strong> {most.get('date','')}</div><div><strong>Description:</strong> {desc}</div>"
-
-    html = f"""
-<!doctype html>
-<html>
-<head>
-  <meta charset="utf-8"/>
-  <title>Printing Shop Dashboard</title>
-  <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-  <style>
-    body{{font-family:Arial;margin:20px}} .panel{{display:inline-block;width:30%;padding:12px;margin:6px;border:1px solid #ddd;border-radius:6px}}
-  </style>
-</head>
-<body>
-  <h1>Printing Shop Dashboard</h1>
-  <div class="panel"><h3>Total sales</h3><div style="font-size:22px">€ {total_html}</div></div>
-  <div class="panel"><h3>Top customer</h3><div>{top_name}</div><div>€ {top_total}</div></div>
-  <div class="panel"><h3>Most expensive</h3>{most_html}</div>
-  <div style="width:70%;margin-top:18px"><canvas id="bar"></canvas></div>
-<script>
-const labels = {labels_js};
-const data = {{
-  labels: labels,
-  datasets: [{{
-    label: 'Top customers (€)',
-    data: {values_js},
-    backgroundColor: 'rgba(54,162,235,0.6)'
-  }}]
-}};
-new Chart(document.getElementById('bar').getContext('2d'), {{type:'bar', data}});
-</script>
-<p><small>JSON summary: <a href="/api/summary">/api/summary</a></small></p>
-</body>
-</html>
-"""
-    return HTMLResponse(content=html)
+def dashboard(request: Request):
+    return entry_response(request, html_page("dashboard.html"), PAGE_CACHE_CONTROL)
+
+
+# The same page for every customer; customer.js reads the name from the URL
+@app.get("/customers/{name:path}", response_class=HTMLResponse)
+def customer_page(request: Request, name: str):
+    return entry_response(request, html_page("customer.html"), PAGE_CACHE_CONTROL)
 
 
 # to run manually: python -m uvicorn dashboard_api:app --host 127.0.0.1 --port 8000
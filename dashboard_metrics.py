@@ -0,0 +1,220 @@
+# dashboard_metrics.py
+# Instrumentation for the dashboard (dashboard_api.py): counters, gauges
+# and histograms rendered in the Prometheus text format (served on
+# /metrics), and a log of slow queries with their SQL and query plan.
+# Written out here rather than with prometheus_client, so the dashboard
+# needs no extra package; the metric objects are thread-safe, as queries
+# run on the db_executor threads.
+import logging
+import threading
+import time
+from collections import deque
+
+# Seconds; from sub-millisecond index seeks to multi-second scans
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+SLOW_QUERY_LOG_SIZE = 50
+MAX_EXPLAINED = 10        # statements of one call whose plan is logged
+
+log = logging.getLogger("dashboard_api.slow_queries")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + list(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(x):
+    if x == float("inf"):
+        return "+Inf"
+    return repr(float(x)) if isinstance(x, float) else str(x)
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def header(self):
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in values]
+
+
+class Gauge(Metric):
+    # Read when rendered: fn() returns {label values tuple: value}. Also
+    # for counters kept elsewhere (kind="counter"), e.g. the cache's.
+    def __init__(self, name, help_text, fn, labels=(), kind="gauge"):
+        super().__init__(name, help_text, labels)
+        self.fn = fn
+        self.kind = kind
+
+    def render(self):
+        values = sorted(self.fn().items())
+        return self.header() + [f"{self.name}{_labels(self.label_names, k)} {_number(v)}" for k, v in values]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, *labels):
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [[0] * len(self.buckets), 0, 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            state[1] += 1
+            state[2] += value
+
+    def render(self):
+        with self._lock:
+            values = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._values.items())
+        lines = self.header()
+        for k, (counts, count, total) in values:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts + [count - sum(counts)]):
+                cumulative += n
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, k, [le])} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, k)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, k)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines += metric.render()
+        return "\n".join(lines) + "\n"
+
+
+def row_count(result):
+    # Rows returned by a repository method: a list of rows, one row or
+    # value, or None
+    if result is None:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+# Slow queries
+# A repository call that takes longer than the threshold is logged
+# (WARNING on the "dashboard_api.slow_queries" logger) with each SQL
+# statement it ran, its parameters and the query plan, and the last
+# SLOW_QUERY_LOG_SIZE are kept for /api/slow-queries. The plan is taken
+# after the call on the same connection, so it is what the query used.
+class TracingConnection:
+    # Records the statements executed through it; everything else is
+    # passed to the connection
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements = []
+
+    def execute(self, sql, params=()):
+        self.statements.append((sql, params))
+        return self._conn.execute(sql, params)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class SlowQueryLog:
+    def __init__(self, threshold, size=SLOW_QUERY_LOG_SIZE):
+        self.threshold = threshold      # seconds
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, query, seconds, repo, statements):
+        explained = []
+        for sql, params in statements[:MAX_EXPLAINED]:
+            try:
+                plan = repo.explain(sql, params)
+            except Exception as e:     # a plan is best effort; never fail the request
+                plan = [f"(no plan: {e})"]
+            explained.append({"sql": " ".join(sql.split()), "params": [str(p) for p in params], "plan": plan})
+        entry = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "query": query,
+                 "ms": round(seconds * 1000, 1), "statements": explained}
+        with self._lock:
+            self._entries.append(entry)
+        log.warning("slow query %s: %.1f ms\n%s", query, seconds * 1000, "\n".join(
+            f"  {s['sql']}  {s['params']}\n" + "\n".join("    " + line for line in s["plan"])
+            for s in explained))
+
+    def entries(self):
+        with self._lock:
+            return list(self._entries)
+
+
+class InstrumentedRepository:
+    # Times every method call of a repository (a query) under the method's
+    # name: latency and rows returned go to the histograms, errors to a
+    # counter, calls over the slow query threshold to the slow query log.
+    def __init__(self, repo, tracing, duration, rows, errors, slow_log, slow_counter):
+        self._repo = repo
+        self._tracing = tracing
+        self._duration = duration
+        self._rows = rows
+        self._errors = errors
+        self._slow_log = slow_log
+        self._slow_counter = slow_counter
+
+    def __getattr__(self, name):
+        attr = getattr(self._repo, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        return lambda *args, **kw: self.run(name, attr, *args, **kw)
+
+    def run(self, name, fn, *args, **kw):
+        # fn(*args, **kw) timed as the query name; its statements are
+        # those executed on the repository's connection
+        self._tracing.statements = []
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kw)
+        except Exception:
+            self._errors.inc(name)
+            raise
+        elapsed = time.perf_counter() - t0
+        self._duration.observe(elapsed, name)
+        self._rows.observe(row_count(result), name)
+        if elapsed >= self._slow_log.threshold:
+            self._slow_counter.inc(name)
+            self._slow_log.record(name, elapsed, self._repo, self._tracing.statements)
+        return result
@@ -0,0 +1,23 @@
+// Fills the per-customer page (/customers/<name>) from
+// /api/customers/<name>; the helpers are in dashboard.js.
+const customerName = decodeURIComponent(window.location.pathname.slice('/customers/'.length));
+const customerApi = '/api/customers/' + encodeURIComponent(customerName);
+
+setText('name', customerName || 'Unknown');
+document.title = (customerName || 'Unknown') + ' – Printing Shop Dashboard';
+const jsonLink = document.getElementById('json');
+jsonLink.href = customerApi;
+jsonLink.textContent = customerApi;
+
+fetch(customerApi, {cache: 'no-cache'})
+  .then(r => r.ok ? r.json() : Promise.reject(r.status === 404 ? 'No invoices for this customer' : r.statusText))
+  .then(c => {
+    setText('total', money(c.total));
+    setText('invoices', c.invoices);
+    setText('average', money(c.average));
+    setText('first', c.first_purchase || 'N/A');
+    setText('last', c.last_purchase || 'N/A');
+    showChart('monthly', 'Monthly purchases (€)', c.monthly.map(m => m.month),
+              c.monthly.map(m => m.total), 'rgba(54,162,235,0.6)');
+  })
+  .catch(message => setText('name', (customerName || 'Unknown') + ': ' + message));
@@ -0,0 +1,75 @@
+// Fills the dashboard from /api/summary. The page itself holds no data,
+// so the browser keeps it cached and a reload is one (usually 304) request.
+// The helpers are shared with customer.js (the per-customer page).
+function money(x) {
+  return Number(x || 0).toFixed(2);
+}
+
+function setText(id, text) {
+  document.getElementById(id).textContent = text;
+}
+
+function showMostExpensive(most) {
+  const box = document.getElementById('most');
+  box.textContent = '';
+  if (!most) {
+    box.innerHTML = '<em>None</em>';
+    return;
+  }
+  const fields = [['Issue', most.id], ['Customer', most.name], ['Amount', most.amount],
+                  ['Date', most.date], ['Description', most.description]];
+  for (const [label, value] of fields) {
+    const row = document.createElement('div');
+    const strong = document.createElement('strong');
+    strong.textContent = label + ':';
+    row.append(strong, ' ' + (value || ''));
+    box.append(row);
+  }
+}
+
+function customerUrl(name) {
+  return '/customers/' + encodeURIComponent(name);
+}
+
+// onClick(index) is called with the index of a clicked bar
+function showChart(id, label, labels, totals, color, onClick) {
+  if (typeof Chart === 'undefined') {
+    return;  // Chart.js not bundled and the CDN is unreachable
+  }
+  const options = {};
+  if (onClick) {
+    options.onClick = (event, bars) => {
+      if (bars.length) {
+        onClick(bars[0].index);
+      }
+    };
+    options.onHover = (event, bars) => {
+      event.native.target.style.cursor = bars.length ? 'pointer' : 'default';
+    };
+  }
+  new Chart(document.getElementById(id).getContext('2d'), {
+    type: 'bar',
+    data: {
+      labels: labels,
+      datasets: [{label: label, data: totals, backgroundColor: color}]
+    },
+    options: options
+  });
+}
+
+if (document.getElementById('bar')) {
+  fetch('/api/summary', {cache: 'no-cache'})
+    .then(r => r.json())
+    .then(s => {
+      setText('total', money(s.total_sales));
+      setText('top-name', s.top_customer.name || 'N/A');
+      setText('top-total', money(s.top_customer.total));
+      showMostExpensive(s.most_expensive);
+      // a bar opens the customer's page
+      showChart('bar', 'Top customers (€)', s.top_customers.map(tc => tc.name || 'Unknown'),
+                s.top_customers.map(tc => tc.total), 'rgba(54,162,235,0.6)',
+                i => { window.location = customerUrl(s.top_customers[i].name || ''); });
+      showChart('products', 'Top products (€)', s.top_products.map(tp => tp.product),
+                s.top_products.map(tp => tp.total), 'rgba(255,159,64,0.6)');
+    });
+}
@@ -7,39 +7,22 @@ import json
 from  PyQt5.QtWidgets import (QApplication, QMainWindow, QVBoxLayout, QLabel, QToolBar, QAction, QStatusBar, QLineEdit, QPushButton, QWidget, QFormLayout, QDialog, QDialogButtonBox, QTableWidget, QTableWidgetItem, QMessageBox, QHBoxLayout, QInputDialog)
 from PyQt5.QtCore import Qt
 
+import timologia_repo
+
 # SQLite database setup
 
 #BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 #db_path = os.path.join(BASE_DIR, "timologia.db")
-db_connection = sqlite3.connect("timologia.db")
 #db_connection = sqlite3.connect(db_path)
-db_cursor = db_connection.cursor()
+# All queries go through the shared repository (timologia_repo.py);
+# TIMOLOGIA_DB may also be a postgresql:// URL (see timologia_pg.py)
+repository = timologia_repo.open_repository(os.environ.get("TIMOLOGIA_DB", "timologia.db"), migrate=False)
+db_connection = repository.conn
 
-# Check if the 'timologia' table needs to be migrated
+# Create the table if missing and bring it to the current schema
+# (see timologia_db.py)
 def ensure_table_schema():
-    # Ensure the table exists
-    db_cursor.execute("PRAGMA table_info(timologia)")
-    columns = [column[1] for column in db_cursor.fetchall()]
-    if "date" not in columns:
-        # If the 'date' column doesn't exist, migrate the table
-        db_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS timologia (
-            id TEXT PRIMARY KEY,
-            name TEXT,
-            description TEXT,
-            amount TEXT,
-            date TEXT
-        )
-        ''')
-        # Copy data from the old table to the new table
-        db_cursor.execute('''
-        INSERT INTO timologia(id, name, description, amount)
-        SELECT id, name, description, amount FROM timologia
-        ''')
-        # Drop the old table and rename the new table
-        db_cursor.execute("DROP TABLE timologia")
-        db_cursor.execute("ALTER TABLE timologia RENAME TO timologia_new")
-        db_connection.commit()
+    repository.migrate()
 
 # Ensure the table schema is correct
 ensure_table_schema()
@@ -190,10 +173,9 @@ class MainWindow(QMainWindow):
         # Update the table widget with current data
          # Update the table widget with current data from the database
          # handles the deserialized JSON data and sisplays it in the table
-        db_cursor.execute("SELECT * FROM timologia")
         #fetch the descriptions, deserialize them, 
         # convert them to string and display them in the table
-        rows = db_cursor.fetchall()
+        rows = list(repository.iter_all())
         
         # Set row count based on fetched rows
         self.table.setRowCount(len(rows))
@@ -258,11 +240,7 @@ class MainWindow(QMainWindow):
                 # print(descriptions,descriptions_json)
                 
                 # Insert into the database
-                db_cursor.execute(
-                    "INSERT INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, ?)",
-                    (data["ID"], data["Name"], descriptions_json, data["Amount"], data["Date"])
-                )
-                db_connection.commit()
+                repository.add(data["ID"], data["Name"], descriptions_json, data["Amount"], data["Date"])
                 self.label.setText(f"Added entry: {data}")
                 self.update_table()
             except sqlite3.IntegrityError:
@@ -275,14 +253,9 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
             entry_id = data.pop("ID (to edit)")
-            db_cursor.execute("SELECT * FROM timologia WHERE id = ?", (entry_id,))
-            if db_cursor.fetchone():
-                descriptions_json = json.dumps(data.get("Descriptions", []))  # Use the "Descriptions" key
-                db_cursor.execute(
-                     "UPDATE timologia SET name = ?, description = ?, amount = ?, date = ? WHERE id = ?",
-                     (data["Name"], descriptions_json, data["Amount"], data["Date"], entry_id)
-                )
-                db_connection.commit()
+            descriptions_json = json.dumps(data.get("Descriptions", []))  # Use the "Descriptions" key
+            # update() returns None if the ID does not exist
+            if repository.update(entry_id, data["Name"], descriptions_json, data["Amount"], data["Date"]):
                 self.label.setText(f"Edited entry with ID: {entry_id}")
                 self.update_table()
             else:
@@ -300,10 +273,7 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
             entry_id = data["ID"]
-            db_cursor.execute("SELECT * FROM timologia WHERE id = ?", (entry_id,))
-            if db_cursor.fetchone():
-                db_cursor.execute("DELETE FROM timologia WHERE id = ?", (entry_id,))
-                db_connection.commit()
+            if repository.delete(entry_id):
                 self.label.setText(f"Deleted entry with ID: {entry_id}")
                 self.update_table()
             else:
@@ -319,8 +289,8 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
             name = data["Name"]
-            db_cursor.execute("SELECT * FROM timologia WHERE name LIKE ?", (f"%{name}%",))
-            rows = db_cursor.fetchall()
+            # full-text search, best matches first (id, name, description, amount, date)
+            rows = [row[1:6] for row in repository.search(name)]
             if rows:
                 self.table.setRowCount(len(rows))
                 for row_idx, row in enumerate(rows):
@@ -370,16 +340,9 @@ class MainWindow(QMainWindow):
 
     
     def action6_handler(self):
-        # Export database to CSV
-        db_cursor.execute("SELECT * FROM timologia")
-        rows = db_cursor.fetchall()
-        if rows:
-            with open("timologia_export.csv", "w", encoding="utf-8") as file:
-                file.write("ID,Name,Description,Amount\n")
-                for row in rows:
-                    # Replace None values with empty strings to prevent TypeError
-                    row = [str(item) if item is not None else "" for item in row]
-                    file.write(",".join(row) + "\n")
+        # Export database to CSV (properly quoted, see timologia_db.export_csv)
+        if repository.has_invoices():
+            repository.export_csv("timologia_export.csv")
             self.label.setText("Exported database to 'timologia_export.csv'")
         else:
             self.label.setText("No entries to export.")
@@ -1,8 +1,12 @@
 import sys
 import sqlite3
+import threading
 from datetime import datetime
 import json  
-import csv
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from functools import lru_cache
 import os
 import subprocess
 import time
@@ -14,52 +18,131 @@ from urllib.error import URLError
 from  PyQt5.QtWidgets import (
     QApplication, QMainWindow, QVBoxLayout, QLabel, QToolBar, QAction,
     QStatusBar, QLineEdit, QPushButton, QWidget, QFormLayout, QDialog, 
-    QDialogButtonBox, QTableWidget, QTableWidgetItem, QMessageBox,
-    QHBoxLayout, QInputDialog, QFileDialog
+    QDialogButtonBox, QTableView, QHeaderView, QMessageBox,
+    QHBoxLayout, QInputDialog, QFileDialog, QProgressBar,
+    QTableWidget, QTableWidgetItem, QStyledItemDelegate
+)
+from PyQt5.QtGui import QBrush, QColor
+from PyQt5.QtCore import (
+    Qt, QAbstractTableModel, QModelIndex, QObject, QRunnable, QThreadPool, QStringListModel,
+    QTimer, pyqtSignal
 )
-from PyQt5.QtCore import Qt
 from PyQt5.QtWidgets import QCompleter
 
+import timologia_db
+import timologia_repo
+
 
 # SQLite database setup
 #BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 #db_path = os.path.join(BASE_DIR, "timologia.db")
-db_connection = sqlite3.connect("timologia.db")
-db_cursor = db_connection.cursor()
-
-# Check if the 'timologia' table needs to be migrated and has the schema
+# TIMOLOGIA_DB may also be a postgresql:// URL (see timologia_pg.py)
+DB_PATH = os.environ.get("TIMOLOGIA_DB", "timologia.db")
+# The database is in WAL mode, so the dashboard can read while the GUI
+# writes; the WAL is checkpointed every CHECKPOINT_INTERVAL ms (see
+# timologia_repo.Repository.checkpoint)
+CHECKPOINT_INTERVAL = 60_000
+# All queries go through the shared repository (timologia_repo.py)
+repository = timologia_repo.open_repository(DB_PATH, migrate=False)
+db_connection = repository.conn
+
+# Create the table if missing and apply the versioned migrations
+# (date column of old databases, typed amount column, indexes,
+# triggers), see timologia_db.py
 def ensure_table_schema():
-    db_cursor.execute("PRAGMA table_info(timologia)")
-    columns = [column[1] for column in db_cursor.fetchall()]
-    if "date" not in columns:
-        # If the 'date' column doesn't exist, migrate the table
-        db_cursor.execute('''
-        CREATE TABLE IF NOT EXISTS timologia_new (
-            id TEXT PRIMARY KEY,
-            name TEXT,
-            description TEXT,
-            amount TEXT,
-            date TEXT
-        )
-        ''')
-        # Copy data from the old table to the new table
-        db_cursor.execute('''
-        INSERT INTO timologia_new (id, name, description, amount)
-        SELECT id, name, description, amount FROM timologia
-        ''')
-        # Drop the old table and rename the new table
-        db_cursor.execute("DROP TABLE timologia")
-        db_cursor.execute("ALTER TABLE timologia_new RENAME TO timologia")
-        db_connection.commit()
-
-
-### Autocomplete function
-#  to get existing all existing names from the database
-#  for the QCompleter and fetch all existing names from database.
-def get_existing_names():
-    db_cursor.execute("SELECT DISTINCT name FROM timologia")
-    results = db_cursor.fetchall()
-    return [row[0] for row in results if row[0]]  # Avoid None values
+    repository.migrate()
+
+
+### Autocomplete index
+#  Distinct customer names and description items for the QCompleters.
+#  Read from the database once, then updated from the rows every insert,
+#  edit and delete writes or removes, so opening a dialog runs no query.
+#  Each list is kept sorted case-insensitively in a QStringListModel that
+#  all completers share; with CaseInsensitivelySortedModel a prefix lookup
+#  is a binary search. Values are reference counted, so an item disappears
+#  when the last invoice using it is edited or deleted.
+#  (str.casefold stands in for Qt's case folding; they agree on Greek and
+#  Latin text.)
+class CompletionList:
+    def __init__(self):
+        self.model = QStringListModel()
+        self._values = []   # sorted by key, same order as the model rows
+        self._keys = []
+        self._counts = {}
+
+    def reset(self, counts):
+        self._counts = dict(counts)
+        self._values = sorted(self._counts, key=str.casefold)
+        self._keys = [v.casefold() for v in self._values]
+        self.model.setStringList(self._values)
+
+    def add(self, value):
+        count = self._counts.get(value, 0)
+        self._counts[value] = count + 1
+        if count == 0:
+            key = value.casefold()
+            row = bisect_right(self._keys, key)
+            self._keys.insert(row, key)
+            self._values.insert(row, value)
+            self.model.insertRows(row, 1)
+            self.model.setData(self.model.index(row), value)
+
+    def remove(self, value):
+        count = self._counts.get(value, 0)
+        if count > 1:
+            self._counts[value] = count - 1
+        elif count == 1:
+            del self._counts[value]
+            # several values can share a key ("Anna" and "ANNA")
+            row = bisect_left(self._keys, value.casefold())
+            while self._values[row] != value:
+                row += 1
+            del self._keys[row]
+            del self._values[row]
+            self.model.removeRows(row, 1)
+
+    def complete(self, prefix, limit=20):
+        key = prefix.casefold()
+        row = bisect_left(self._keys, key)
+        out = []
+        while row < len(self._keys) and len(out) < limit and self._keys[row].startswith(key):
+            out.append(self._values[row])
+            row += 1
+        return out
+
+    def completer(self, parent=None):
+        completer = QCompleter(self.model, parent)
+        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer.setModelSorting(QCompleter.CaseInsensitivelySortedModel)
+        return completer
+
+
+class AutocompleteIndex:
+    def __init__(self):
+        self.names = CompletionList()
+        self.items = CompletionList()
+
+    @staticmethod
+    def read_counts(repo, **kw):
+        # Runs on a worker thread; the result goes to load()
+        return repo.completion_counts()
+
+    def load(self, counts):
+        names, items = counts
+        self.names.reset(names)
+        self.items.reset(items)
+
+    def add_row(self, name, description):
+        if name:
+            self.names.add(name)
+        for item in timologia_repo.description_items(description):
+            self.items.add(item)
+
+    def remove_row(self, name, description):
+        if name:
+            self.names.remove(name)
+        for item in timologia_repo.description_items(description):
+            self.items.remove(item)
 
 
 # Ensure the table schema is correct
@@ -70,15 +153,14 @@ timologia = {}
 
 # Class for using QLineEdit for autocompleting descriptions
 class DescriptionInputDialog(QDialog):
-    def __init__(self, descriptions, parent=None):
+    def __init__(self, completions=None, parent=None):
         super().__init__(parent)
         self.setWindowTitle("Add Description")
         layout = QVBoxLayout(self)
 
         self.line_edit = QLineEdit(self)
-        completer = QCompleter(descriptions)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
-        self.line_edit.setCompleter(completer)
+        if completions is not None:
+            self.line_edit.setCompleter(completions.completer(self))
 
         layout.addWidget(QLabel("Enter description:"))
         layout.addWidget(self.line_edit)
@@ -94,10 +176,11 @@ class DescriptionInputDialog(QDialog):
 # Define a class for a separate dialog to handle data inputs
 class DataEntryDialog(QDialog):
     # Create the form fields
-    def __init__(self, title, fields, parent=None):
+    def __init__(self, title, fields, parent=None, autocomplete=None):
         super().__init__(parent)
         self.setWindowTitle(title)
         self.layout = QFormLayout()
+        self.autocomplete = autocomplete  # AutocompleteIndex, or None for no completion
         self.entries = {}
         self.date_field = None  # To keep track of the date field for validation
         self.descriptions = []  # Store user-enterd descriptions in a list
@@ -114,7 +197,7 @@ class DataEntryDialog(QDialog):
             
             ### Autocomplete:<-----
             #  for Name adn description which is serialised JSON field
-            if field == "Name":
+            if field == "Name" and autocomplete is not None:
                self.setup_name_autocomplete(entry)
             ### Autocomplete ends
 
@@ -143,13 +226,9 @@ class DataEntryDialog(QDialog):
         #        # Append the description to the list and update the UI
         #        self.descriptions.append(description)
         #        self.update_description_list()
-        # fetch existing descriptions
-        global db_cursor
-        db_cursor.execute("SELECT DISTINCT description FROM timologia WHERE description IS NOT NULL")
-        descriptions = [row[0] for row in db_cursor.fetchall()]
-
-        # use our custom dialog
-        dialog = DescriptionInputDialog(descriptions, self)
+        # use our custom dialog, completing from the existing description items
+        completions = self.autocomplete.items if self.autocomplete is not None else None
+        dialog = DescriptionInputDialog(completions, self)
         if dialog.exec_() == QDialog.Accepted:
             description = dialog.get_description()
             if description:
@@ -189,15 +268,429 @@ class DataEntryDialog(QDialog):
         return data
     
     # Autocomplete method for name field:
-    # Function to get existing names from the database for autocomplete
+    # completes from the existing customer names (see AutocompleteIndex)
     def setup_name_autocomplete(self, line_edit):
-        names = get_existing_names()
-        completer = QCompleter(names)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
+        completer = self.autocomplete.names.completer(self)
         line_edit.setCompleter(completer)
         completer.activated.connect(lambda text: line_edit.setText(text))
 
 
+# Batch entry: many invoices keyed into a grid, one row per invoice, and
+# written together by Repository.add_batch (one executemany, one commit)
+# on the writer thread. Rows that cannot be written (empty ID, bad amount
+# or date, an ID that exists or is repeated) stay in the grid with the
+# reason in the last column; the rest are written and removed, and the
+# dialog closes once every row is written. Description items are
+# separated with "|", as in the CSV import.
+class CompletingDelegate(QStyledItemDelegate):
+    # Cell editor with a completer, for the Name column
+    def __init__(self, completions, parent=None):
+        super().__init__(parent)
+        self.completions = completions
+
+    def createEditor(self, parent, option, index):
+        editor = QLineEdit(parent)
+        editor.setCompleter(self.completions.completer(editor))
+        return editor
+
+
+class BatchEntryDialog(QDialog):
+    COLUMNS = ["ID", "Name", "Descriptions", "Amount", "Date", "Σφάλμα"]
+    ERROR_COLUMN = 5
+    EMPTY_ROWS = 10
+    ERROR_BRUSH = QBrush(QColor(255, 220, 220))
+
+    # written(invoices) after a batch, with the (id, name, descriptions,
+    # amount, date) tuples that went into the table
+    written = pyqtSignal(list)
+
+    def __init__(self, data_access, autocomplete=None, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Πολλαπλή Πρόσθεση Τιμολογίων")
+        self.resize(900, 450)
+        self.data_access = data_access
+        self.writing = False
+        layout = QVBoxLayout(self)
+
+        self.grid = QTableWidget(0, len(self.COLUMNS), self)
+        self.grid.setHorizontalHeaderLabels(self.COLUMNS)
+        self.grid.horizontalHeader().setSectionResizeMode(2, QHeaderView.Stretch)
+        self.grid.horizontalHeader().setSectionResizeMode(self.ERROR_COLUMN, QHeaderView.Stretch)
+        if autocomplete is not None:
+            self.grid.setItemDelegateForColumn(1, CompletingDelegate(autocomplete.names, self))
+        self.grid.itemChanged.connect(self.on_item_changed)
+        self.add_rows()
+        layout.addWidget(self.grid)
+
+        self.status = QLabel("Συμπληρώστε μία γραμμή ανά τιμολόγιο (ημερομηνία DD-MM-YY, περιγραφές με |).")
+        layout.addWidget(self.status)
+
+        buttons = QDialogButtonBox(QDialogButtonBox.Save | QDialogButtonBox.Cancel, self)
+        more = buttons.addButton("Περισσότερες γραμμές", QDialogButtonBox.ActionRole)
+        more.clicked.connect(self.add_rows)
+        buttons.accepted.connect(self.save)
+        buttons.rejected.connect(self.reject)
+        self.save_button = buttons.button(QDialogButtonBox.Save)
+        layout.addWidget(buttons)
+
+    def add_rows(self, count=EMPTY_ROWS):
+        self.grid.blockSignals(True)
+        start = self.grid.rowCount()
+        self.grid.setRowCount(start + count)
+        for row in range(start, start + count):
+            error = QTableWidgetItem()
+            error.setFlags(Qt.ItemIsEnabled)
+            self.grid.setItem(row, self.ERROR_COLUMN, error)
+        self.grid.blockSignals(False)
+
+    def on_item_changed(self, item):
+        # Typing into the last row adds more, so the grid never runs out
+        if item.column() != self.ERROR_COLUMN and item.row() == self.grid.rowCount() - 1:
+            self.add_rows()
+
+    def cell(self, row, column):
+        item = self.grid.item(row, column)
+        return item.text().strip() if item is not None else ""
+
+    def rows(self):
+        # [(grid row, (id, name, descriptions, amount, date))] of the
+        # rows with anything in them
+        out = []
+        for row in range(self.grid.rowCount()):
+            values = [self.cell(row, column) for column in range(self.ERROR_COLUMN)]
+            if any(values):
+                invoice_id, name, descriptions, amount, date = values
+                items = [d.strip() for d in descriptions.split("|") if d.strip()]
+                out.append((row, (invoice_id, name, items, amount, date)))
+        return out
+
+    def set_error(self, row, message):
+        self.grid.blockSignals(True)
+        self.grid.item(row, self.ERROR_COLUMN).setText(message)
+        brush = self.ERROR_BRUSH if message else QBrush()
+        for column in range(self.ERROR_COLUMN + 1):
+            item = self.grid.item(row, column)
+            if item is None:
+                item = QTableWidgetItem()
+                self.grid.setItem(row, column, item)
+            item.setBackground(brush)
+        self.grid.blockSignals(False)
+
+    def save(self):
+        if self.writing:
+            return
+        rows = self.rows()
+        if not rows:
+            self.reject()
+            return
+        invoices = [invoice for _, invoice in rows]
+        self.writing = True
+        self.save_button.setEnabled(False)
+        self.status.setText(f"Καταχώρηση {len(invoices)} τιμολογίων...")
+        self.data_access.submit(lambda repo, **kw: repo.add_batch(invoices),
+                                on_result=lambda result: self.saved(rows, result),
+                                on_error=self.failed, write=True)
+
+    def saved(self, rows, result):
+        written, errors = result
+        self.writing = False
+        self.save_button.setEnabled(True)
+        done = []
+        for k, (row, invoice) in enumerate(rows):
+            self.set_error(row, errors.get(k, ""))
+            if k not in errors:
+                done.append((row, invoice))
+        for row, _ in reversed(done):
+            self.grid.removeRow(row)
+        if self.grid.rowCount() < self.EMPTY_ROWS:
+            self.add_rows(self.EMPTY_ROWS - self.grid.rowCount())
+        self.written.emit([invoice for _, invoice in done])
+        if errors:
+            self.status.setText(f"Καταχωρήθηκαν {written} τιμολόγια. {len(errors)} γραμμές έχουν σφάλμα: "
+                                "διορθώστε τες και πατήστε ξανά Save.")
+        else:
+            self.accept()
+
+    def failed(self, error):
+        # Nothing was written (the batch is one transaction)
+        self.writing = False
+        self.save_button.setEnabled(True)
+        QMessageBox.critical(self, "Database Error", str(error))
+
+    def reject(self):
+        # Do not close while the batch is being written: its result
+        # updates this grid
+        if not self.writing:
+            super().reject()
+
+
+# Decode a description JSON array into the multi-line text shown in the table.
+# Many invoices share the same descriptions, so decoded values are cached.
+@lru_cache(maxsize=4096)
+def description_text(value):
+    if not value:
+        return ""
+    try:
+        descriptions = json.loads(value)
+    except json.JSONDecodeError:
+        # Not valid JSON, just show the raw value
+        return value
+    # Ensure descriptions is a list of strings before joining
+    if not isinstance(descriptions, list):
+        return ""
+    return "\n".join(str(d) for d in descriptions if d is not None)
+
+
+# Lazy table model for the main invoice table.
+# Rows are read from SQLite one page at a time as the view scrolls
+# (canFetchMore/fetchMore), using the rowid as a keyset so every page is an
+# index seek. Only the rowids of loaded rows (8 bytes each) are kept for
+# the lifetime of the model; the row data itself lives in a small LRU of
+# pages that are re-read on demand, so memory stays flat for any table size.
+# Search results are shown the same way from a ranked list of rowids
+# (set_rowids), in the order given.
+# With a DataAccess the next page is read on a worker thread and inserted
+# when it arrives; results of a page requested before the last reset are
+# dropped. Re-reading an evicted page is a small seek on the UI thread.
+class InvoiceTableModel(QAbstractTableModel):
+    HEADERS = ["Αριθμός Τιμολογίου", "Ονοματεπώνυμο", "Περιγραφή", "Ποσό", "Ημερομηνία"]
+    DESCRIPTION_COLUMN = 2
+    load_failed = pyqtSignal(object)    # the exception of a page that could not be read
+    def __init__(self, repository, data_access=None, page_size=200, max_pages=20, parent=None):
+        super().__init__(parent)
+        self.repository = repository
+        self.data_access = data_access
+        self.page_size = page_size
+        self.max_pages = max_pages
+        self.where = ""
+        self.params = ()
+        self._ranked = None
+        self._rowids = array("q")
+        self._pages = OrderedDict()
+        self._exhausted = False
+        self._fetching = False
+        self._generation = 0
+
+    def set_filter(self, where="", params=()):
+        # where is an SQL condition (e.g. "name LIKE ?"); "" shows everything
+        self._reset(where, params, None)
+
+    def set_rowids(self, rowids):
+        # Show exactly these rows, in this order (e.g. ranked search hits)
+        self._reset("", (), array("q", rowids))
+
+    def _reset(self, where, params, ranked):
+        self.beginResetModel()
+        self.where = where
+        self.params = tuple(params)
+        self._ranked = ranked
+        self._rowids = array("q")
+        self._pages.clear()
+        self._exhausted = False
+        self._fetching = False
+        self._generation += 1
+        self.endResetModel()
+        # Load the first page right away so the first paint has rows
+        self.fetchMore()
+
+    def refresh(self):
+        self._reset(self.where, self.params, self._ranked)
+
+    def count(self):
+        # Number of rows matching the current filter
+        if self._ranked is not None:
+            return len(self._ranked)
+        return self.repository.count(self.where, self.params)
+
+    def _cache_page(self, page_no, page):
+        self._pages[page_no] = page
+        self._pages.move_to_end(page_no)
+        while len(self._pages) > self.max_pages:
+            self._pages.popitem(last=False)
+
+    def _page(self, page_no):
+        page = self._pages.get(page_no)
+        if page is None:
+            first = page_no * self.page_size
+            last = min(first + self.page_size, len(self._rowids)) - 1
+            # by the cached rowids, so rows keep their place: a row deleted
+            # in the meantime shows up empty until the next refresh
+            page = self.repository.by_rowids(self._rowids[first:last + 1])
+            self._cache_page(page_no, page)
+        else:
+            self._pages.move_to_end(page_no)
+        return page
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rowids)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self._exhausted and not self._fetching
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self._exhausted or self._fetching:
+            return
+        # Everything the page query needs, so it can run on another thread
+        start = len(self._rowids)
+        where, params = self.where, self.params
+        ranked = self._ranked[start:start + self.page_size] if self._ranked is not None else None
+        ranked_left = len(self._ranked) - start if self._ranked is not None else 0
+        last_rowid = self._rowids[-1] if self._rowids else -1
+
+        def next_page(repo, **kw):
+            if ranked is not None:
+                return list(ranked), repo.by_rowids(ranked), len(ranked) >= ranked_left
+            page = repo.page(last_rowid, self.page_size, where, params)
+            return [row[0] for row in page], page, len(page) < self.page_size
+
+        if self.data_access is None:
+            self._add_page(self._generation, start, next_page(self.repository))
+            return
+        self._fetching = True
+        generation = self._generation
+        self.data_access.submit(next_page,
+                                on_result=lambda result: self._add_page(generation, start, result),
+                                on_error=lambda error: self._fetch_failed(generation, error))
+
+    def _add_page(self, generation, start, result):
+        if generation != self._generation:
+            return    # the model was reset while this page was read
+        self._fetching = False
+        rowids, page, exhausted = result
+        self._exhausted = exhausted
+        if not page:
+            return
+        self.beginInsertRows(QModelIndex(), start, start + len(page) - 1)
+        self._rowids.extend(rowids)
+        self._cache_page(start // self.page_size, page)
+        self.endInsertRows()
+
+    def _fetch_failed(self, generation, error):
+        if generation == self._generation:
+            self._fetching = False
+            self._exhausted = True
+            self.load_failed.emit(error)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = index.row()
+        page = self._page(row // self.page_size)
+        # +1 skips the rowid at the start of each row
+        value = page[row % self.page_size][index.column() + 1]
+        if index.column() == self.DESCRIPTION_COLUMN:
+            if role in (Qt.DisplayRole, Qt.ToolTipRole):
+                return description_text(value)
+            if role == Qt.TextAlignmentRole:
+                return int(Qt.AlignTop | Qt.AlignLeft)
+            return None
+        if role == Qt.DisplayRole:
+            return "" if value is None else str(value)
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+
+# Data-access layer: every database operation of the window runs as a
+# DbJob on a QThreadPool, so the window keeps repainting while queries,
+# imports and exports run. SQLite connections belong to the thread that
+# made them, so each worker thread opens its own repository (kept for the
+# thread's lifetime, with its prepared statements). Writes go through a
+# single-thread pool so they are applied in the order they were
+# submitted; reads use a second pool.
+# A job is fn(repository, progress=..., cancelled=...); its result, error
+# and progress come back to the UI thread as signals.
+_worker_db = threading.local()
+
+
+def worker_repository(db_path):
+    repo = getattr(_worker_db, "repo", None)
+    if repo is None:
+        repo = timologia_repo.open_repository(db_path, migrate=False)
+        _worker_db.repo = repo
+    return repo
+
+
+class DbJobSignals(QObject):
+    result = pyqtSignal(object)
+    error = pyqtSignal(object)          # the exception
+    progress = pyqtSignal(int, int)     # done, total
+    finished = pyqtSignal()
+
+
+class DbJob(QRunnable):
+    def __init__(self, db_path, fn):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.db_path = db_path
+        self.fn = fn
+        self.signals = DbJobSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        # A job that has not started yet is skipped; a running one sees
+        # cancelled() -> True and decides itself how to stop
+        self._cancelled.set()
+
+    def run(self):
+        try:
+            if self._cancelled.is_set():
+                return
+            repo = worker_repository(self.db_path)
+            try:
+                result = self.fn(repo, progress=self.signals.progress.emit,
+                                 cancelled=self._cancelled.is_set)
+            except Exception as e:
+                repo.conn.rollback()
+                self.signals.error.emit(e)
+            else:
+                self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class DataAccess(QObject):
+    def __init__(self, db_path, parent=None):
+        super().__init__(parent)
+        self.db_path = db_path
+        self.reads = QThreadPool(self)
+        self.reads.setMaxThreadCount(2)
+        self.reads.setExpiryTimeout(-1)
+        self.writes = QThreadPool(self)
+        self.writes.setMaxThreadCount(1)
+        self.writes.setExpiryTimeout(-1)
+        self.jobs = set()
+
+    def submit(self, fn, on_result=None, on_error=None, on_progress=None, on_finished=None, write=False):
+        job = DbJob(self.db_path, fn)
+        if on_result:
+            job.signals.result.connect(on_result)
+        if on_error:
+            job.signals.error.connect(on_error)
+        if on_progress:
+            job.signals.progress.connect(on_progress)
+        # connected before start(): a quick job may finish right away
+        if on_finished:
+            job.signals.finished.connect(on_finished)
+        job.signals.finished.connect(lambda: self.jobs.discard(job))
+        self.jobs.add(job)
+        (self.writes if write else self.reads).start(job)
+        return job
+
+    def shutdown(self):
+        # Cancel everything and wait for the running jobs to stop
+        for job in list(self.jobs):
+            job.cancel()
+        self.reads.waitForDone()
+        self.writes.waitForDone()
+
+
 # Main Window class that contains the actions and the uses the widgets of PyQt5
 #  to create the GUI for the application.
 #  The class inherits from QMainWindow and sets up the layout, toolbar, and actions.
@@ -222,11 +715,26 @@ class MainWindow(QMainWindow):
         self.label.setAlignment(Qt.AlignCenter)
         self.layout.addWidget(self.label)
 
-        # Table widget to display entries
+        # Table view to display entries
         # of 5 columns: ID, Name, Description, Amount, Date
-        self.table = QTableWidget()
-        self.table.setColumnCount(5)
-        self.table.setHorizontalHeaderLabels(["Αριθμός Τιμολογίου", "Ονοματεπώνυμο", "Περιγραφή", "Ποσό", "Ημερομηνία"])
+        # backed by a lazy model, so only the visible rows are read and drawn
+        # Database operations run off the UI thread (see DataAccess)
+        self.data = DataAccess(DB_PATH, self)
+        # Names and description items for the completers, read once; on the
+        # writer thread so it is ordered with the edits that update it
+        self.autocomplete = AutocompleteIndex()
+        self.data.submit(AutocompleteIndex.read_counts, on_result=self.autocomplete.load, write=True)
+        self.model = InvoiceTableModel(repository, self.data, parent=self)
+        self.model.load_failed.connect(lambda e: self.label.setText(f"Failed to load invoices: {e}"))
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setWordWrap(True)
+        # Fixed row height with room for three description lines instead of
+        # measuring every row (resizeRowToContents) on each refresh
+        line_height = self.table.fontMetrics().lineSpacing()
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(3 * line_height + 6)
+        self.table.horizontalHeader().setSectionResizeMode(self.model.DESCRIPTION_COLUMN, QHeaderView.Stretch)
         self.layout.addWidget(self.table)
 
         # Toolbar setup
@@ -238,6 +746,10 @@ class MainWindow(QMainWindow):
         action1.triggered.connect(self.action1_handler)
         toolbar.addAction(action1)
 
+        action_batch = QAction("Πολλαπλή Πρόσθεση", self)
+        action_batch.triggered.connect(self.batch_add_handler)
+        toolbar.addAction(action_batch)
+
         action2 = QAction("Επεξεργασία Τιμολογίου", self)
         action2.triggered.connect(self.action2_handler)
         toolbar.addAction(action2)
@@ -269,113 +781,100 @@ class MainWindow(QMainWindow):
 
 
         self.setStatusBar(QStatusBar(self))
+        # Progress of long running operations (CSV export/import)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setVisible(False)
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.search_job = None
+        self.cancel_button = QPushButton("Ακύρωση")
+        self.cancel_button.setVisible(False)
+        self.cancel_button.clicked.connect(self.cancel_long_job)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+        self.csv_actions = [action6, action7]
+        self.long_job = None
+        self.checkpoint_timer = QTimer(self)
+        self.checkpoint_timer.timeout.connect(self.checkpoint)
+        self.checkpoint_timer.start(CHECKPOINT_INTERVAL)
         # Call the update_table method to display the initial data in the table
         self.update_table()
         
-    # Adding function to update the table for PyQT format        
+    # Adding function to update the table for PyQT format
     def update_table(self):
-        # Update the table widget with current data
-         # Update the table widget with current data from the database
-         # handles the deserialized JSON data and sisplays it in the table
-        db_cursor.execute("SELECT * FROM timologia")
-        #fetch the descriptions, deserialize them, 
-        # convert them to string and display them in the table
-        rows = db_cursor.fetchall()
-        
-        # Set row count based on fetched rows
-        self.table.setRowCount(len(rows))
-        
-        for row_idx, row in enumerate(rows):
-            # Deserialize JSON descriptions (column 3 is "description")
-            for col_idx, value in enumerate(row):
-                # Check for the Decsription column (index 2 in this case)    
-                if col_idx == 2:  # "Description" column
-                    #print(f"Raw description value: {value}")  # Log the raw value
-                    try:
-                       # If the description is stored as a JSON string, deserialize it
-                       # decode the JSON string stored in the descrition column into a list
-                       descriptions = json.loads(value) if value else []
-                       print(f"Deserialized descriptions: {descriptions}")  # Log the deserialized value
-                       
-                        # Ensure descriptions is a list before trying to join to avoid
-                        # TypeError: sequence item 0: expected str instance, NoneType found
-                       if not isinstance(descriptions, list):
-                          descriptions = []
-                       
-                       # Join the descriptions into a string with line breaks or commas (adjust as needed)
-                       descriptions_str = "\n".join(descriptions) #if descriptions else "No descriptions" # You can change "\n" to ", " if needed
-                       
-                       # Create the QTableWidgetItem and set word wrapping
-                       # so that the descriptions are displayed in multiple lines
-                       item = QTableWidgetItem(descriptions_str)
-                       item.setTextAlignment(Qt.AlignTop)  # Align text to the top of the cell
-                       item.setToolTip(descriptions_str)  # Optionally add a tooltip for full description
-                       # In case the description column is not valid JSON, just show the raw value
-                       self.table.setItem(row_idx, col_idx, item)
-                       #self.table.setItem(row_idx, col_idx, QTableWidgetItem(descriptions_str))
-                       # Adjust the row height to fit the descriptions
-                       self.table.resizeRowToContents(row_idx)
-                    
-                    except json.JSONDecodeError:
-                        # In case the description column is not valid JSON, just show the raw value
-                       self.table.setItem(row_idx, col_idx, QTableWidgetItem(value))
-                else:
-                   # For other columns, just display the value
-                   self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
+        # Show all entries; the model reads pages from the database as
+        # the table is scrolled and decodes the JSON descriptions itself.
+        # A search still running is superseded.
+        if self.search_job is not None:
+            self.search_job.cancel()
+            self.search_job = None
+        self.model.set_filter()
 
     def action1_handler(self):
         # Add a new entry to the "timologia" database
         fields = ["ID", "Name",  "Amount", "Date"]
-        dialog = DataEntryDialog("Πρόσθεση Τιμολογίου", fields, self)
+        dialog = DataEntryDialog("Πρόσθεση Τιμολογίου", fields, self, self.autocomplete)
         
         if dialog.exec():
             data = dialog.get_data()
 
-            try:
-                # Convert the list of descriptions to JSON string format
-                # Check if descriptions in the key exist, retrieve them
-                # and then to be serialized to JSON before inserted in the db - data dict.
-                descriptions = data.get("Descriptions", [])
-                #print(f"Descriptions before saving: {descriptions}")  # Log the descriptions
-                # Check if descriptions is a list and exists before trying to convert to JSON
-                if descriptions:# If descriptions exist, convert them to JSON string
-                    descriptions_json = json.dumps(descriptions)
-                else:
-                    descriptions_json = "[]" # If no descriptions, use an empty JSON array
-                # check the descriptions are not empty []
-                # otherwise problem of updating-deserialising the JSOn
-                # print(descriptions,descriptions_json)
-                
-                # Insert into the database
-                db_cursor.execute(
-                    "INSERT INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, ?)",
-                    (data["ID"], data["Name"], descriptions_json, data["Amount"], data["Date"])
-                )
-                db_connection.commit()
+            # Convert the list of descriptions to JSON string format
+            # Check if descriptions in the key exist, retrieve them
+            # and then to be serialized to JSON before inserted in the db - data dict.
+            descriptions = data.get("Descriptions", [])
+            # Check if descriptions is a list and exists before trying to convert to JSON
+            if descriptions:# If descriptions exist, convert them to JSON string
+                descriptions_json = json.dumps(descriptions)
+            else:
+                descriptions_json = "[]" # If no descriptions, use an empty JSON array
+
+            # Insert into the database (on the writer thread)
+            def insert(repo, **kw):
+                repo.add(data["ID"], data["Name"], descriptions_json, data["Amount"], data["Date"])
+
+            def inserted(_):
                 self.label.setText(f"Added entry: {data}")
+                self.autocomplete.add_row(data["Name"], descriptions_json)
                 self.update_table()
-            except sqlite3.IntegrityError:
-                self.label.setText("Error: ID already exists.")
+
+            self.data.submit(insert, on_result=inserted, on_error=self.on_write_error, write=True)
+
+    def batch_add_handler(self):
+        # Many invoices at once, one transaction per Save (see BatchEntryDialog)
+        dialog = BatchEntryDialog(self.data, self.autocomplete, self)
+        dialog.written.connect(self.on_batch_written)
+        dialog.exec()
+
+    def on_batch_written(self, invoices):
+        if not invoices:
+            return
+        for _, name, descriptions, _, _ in invoices:
+            self.autocomplete.add_row(name, timologia_repo.description_json(descriptions))
+        self.label.setText(f"Added {len(invoices)} entries")
+        self.update_table()
 
     def action2_handler(self):
          # Edit an existing entry by ID
         fields = ["ID (to edit)", "Name", "Amount", "Date"]
-        dialog = DataEntryDialog("Επεξεργασία Τιμολογίου", fields, self)
+        dialog = DataEntryDialog("Επεξεργασία Τιμολογίου", fields, self, self.autocomplete)
         if dialog.exec():
             data = dialog.get_data()
             entry_id = data.pop("ID (to edit)")
-            db_cursor.execute("SELECT * FROM timologia WHERE id = ?", (entry_id,))
-            if db_cursor.fetchone():
-                descriptions_json = json.dumps(data.get("Descriptions", []))  # Use the "Descriptions" key
-                db_cursor.execute(
-                     "UPDATE timologia SET name = ?, description = ?, amount = ?, date = ? WHERE id = ?",
-                     (data["Name"], descriptions_json, data["Amount"], data["Date"], entry_id)
-                )
-                db_connection.commit()
-                self.label.setText(f"Edited entry with ID: {entry_id}")
-                self.update_table()
-            else:
-                self.label.setText(f"Entry ID {entry_id} not found.")
+            descriptions_json = json.dumps(data.get("Descriptions", []))  # Use the "Descriptions" key
+
+            def update(repo, **kw):
+                # the old name and description, for the autocomplete index;
+                # None if the ID does not exist
+                return repo.update(entry_id, data["Name"], descriptions_json, data["Amount"], data["Date"])
+
+            def updated(old):
+                if old:
+                    self.label.setText(f"Edited entry with ID: {entry_id}")
+                    self.autocomplete.remove_row(*old)
+                    self.autocomplete.add_row(data["Name"], descriptions_json)
+                    self.update_table()
+                else:
+                    self.label.setText(f"Entry ID {entry_id} not found.")
+
+            self.data.submit(update, on_result=updated, on_error=self.on_write_error, write=True)
 
     def action3_handler(self):
         # Delete an entry by ID
@@ -389,62 +888,64 @@ class MainWindow(QMainWindow):
         if dialog.exec():
             data = dialog.get_data()
             entry_id = data["ID"]
-            db_cursor.execute("SELECT * FROM timologia WHERE id = ?", (entry_id,))
-            if db_cursor.fetchone():
-                db_cursor.execute("DELETE FROM timologia WHERE id = ?", (entry_id,))
-                db_connection.commit()
-                self.label.setText(f"Deleted entry with ID: {entry_id}")
-                self.update_table()
-            else:
-                self.label.setText(f"Entry ID {entry_id} not found.")
+
+            def delete(repo, **kw):
+                return repo.delete(entry_id)
+
+            def deleted(old):
+                if old:
+                    self.label.setText(f"Deleted entry with ID: {entry_id}")
+                    self.autocomplete.remove_row(*old)
+                    self.update_table()
+                else:
+                    self.label.setText(f"Entry ID {entry_id} not found.")
+
+            self.data.submit(delete, on_result=deleted, on_error=self.on_write_error, write=True)
+
+    def on_write_error(self, error):
+        if isinstance(error, sqlite3.IntegrityError):
+            self.label.setText("Error: ID already exists.")
+        else:
+            QMessageBox.critical(self, "Database Error", str(error))
 
     def action4_handler(self):
-        # Search for an entry by Name and display it in the table
+        # Search invoices by ID, name or description words through the
+        # full-text index and display the best matches first.
+        # Every word matches as a prefix, e.g. "gra fly".
         fields = ["Name"]
-        dialog = DataEntryDialog("Αναζήτηση Τιμολογίου", fields, self)
+        dialog = DataEntryDialog("Αναζήτηση Τιμολογίου", fields, self, self.autocomplete)
         
         # Remove the description button from the dialog since we don't need it in delete action
         dialog.description_button.setVisible(False)
         if dialog.exec():
             data = dialog.get_data()
             name = data["Name"]
-            db_cursor.execute("SELECT * FROM timologia WHERE name LIKE ?", (f"%{name}%",))
-            rows = db_cursor.fetchall()
-            if rows:
-                self.table.setRowCount(len(rows))
-                for row_idx, row in enumerate(rows):
-                    for col_idx, value in enumerate(row):
-                        #self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))
-                        if col_idx == 2:  # "Description" column
-                            try:
-                                # If the description is stored as a JSON string, deserialize it
-                                descriptions = json.loads(value) if value else []
-                                
-                                # Ensure descriptions is a list before trying to join
-                                if not isinstance(descriptions, list):
-                                    descriptions = []
-                                
-                                # Join the descriptions into a string with line breaks
-                                descriptions_str = "\n".join(descriptions)  # Each description on a new line
-                                
-                                # Create the QTableWidgetItem and set word wrapping
-                                item = QTableWidgetItem(descriptions_str)
-                                item.setTextAlignment(Qt.AlignTop)  # Align text to the top of the cell
-                                item.setToolTip(descriptions_str)  # Optionally add a tooltip for full description
-                                self.table.setItem(row_idx, col_idx, item)
-                                
-                                # Adjust the row height to fit the descriptions
-                                self.table.resizeRowToContents(row_idx)
-                                
-                            except json.JSONDecodeError:
-                                self.table.setItem(row_idx, col_idx, QTableWidgetItem(value))
-                        else:
-                            # For other columns, just display the value
-                            self.table.setItem(row_idx, col_idx, QTableWidgetItem(str(value)))                
-                
-                self.label.setText(f"Found {len(rows)} entries matching name '{name}'")    
-            else:
-                self.label.setText(f"No entries found for name '{name}'")
+            if timologia_db.fts_query(name) is None:
+                self.update_table()
+                return
+            # cancel a search still waiting for an earlier query; one that
+            # is already running finishes, and its results are dropped
+            if self.search_job is not None:
+                self.search_job.cancel()
+
+            def found(rowids):
+                if job is not self.search_job:
+                    return
+                self.search_job = None
+                self.model.set_rowids(rowids)
+                if rowids:
+                    self.label.setText(f"Found {len(rowids)} entries matching name '{name}'")
+                else:
+                    self.label.setText(f"No entries found for name '{name}'")
+
+            def failed(error):
+                if job is self.search_job:
+                    self.search_job = None
+                    self.label.setText(f"Search failed: {error}")
+
+            self.label.setText(f"Searching for '{name}'...")
+            job = self.search_job = self.data.submit(
+                lambda repo, **kw: repo.search_rowids(name), on_result=found, on_error=failed)
 
 
     def action5_handler(self):
@@ -459,22 +960,79 @@ class MainWindow(QMainWindow):
 
     
     def action6_handler(self):
-        # Export database to CSV
-        db_cursor.execute("SELECT * FROM timologia")
-        rows = db_cursor.fetchall()
-        if rows:
-            with open("timologia_export.csv", "w", encoding="utf-8") as file:
-                file.write("ID,Name,Description,Amount,Date\n")
-                for row in rows:
-                    # Replace None values with empty strings to prevent TypeError
-                    row = [str(item) if item is not None else "" for item in row]
-                    file.write(",".join(row) + "\n")
-            self.label.setText("Exported database to 'timologia_export.csv'")
-        else:
+        # Export database to CSV (or gzip-compressed CSV) in the background
+        if self.long_job is not None:
+            return
+        if not repository.has_invoices():
             self.label.setText("No entries to export.")
+            return
+        compressed_filter = "Compressed CSV (*.csv.gz)"
+        path, selected = QFileDialog.getSaveFileName(self, "Export to CSV", "timologia_export.csv",
+                                                     "CSV files (*.csv);;" + compressed_filter)
+        if not path:
+            return
+        # export_csv compresses by the file name, so the chosen filter
+        # decides the extension
+        if selected == compressed_filter and not path.endswith(".gz"):
+            path = (path[:-4] if path.endswith(".csv") else path) + ".csv.gz"
+        self.label.setText(f"Exporting to '{os.path.basename(path)}'...")
+        self.run_long_job(
+            lambda repo, **kw: repo.export_csv(path, **kw),
+            lambda rows: self.label.setText(f"Exported {rows} entries to '{os.path.basename(path)}'"),
+            "CSV Export Error")
+
+    def run_long_job(self, fn, on_done, error_title, write=False):
+        # Run fn on the data-access pool with the progress bar and the
+        # cancel button shown and the CSV actions disabled until it finishes
+        for action in self.csv_actions:
+            action.setEnabled(False)
+        self.progress_bar.setRange(0, 0)    # busy until the first progress report
+        self.progress_bar.setVisible(True)
+        self.cancel_button.setVisible(True)
+        self.long_job = self.data.submit(
+            fn, on_result=on_done,
+            on_error=lambda e: self.on_long_job_error(error_title, e),
+            on_progress=self.on_long_job_progress, on_finished=self.on_long_job_finished, write=write)
+
+    def cancel_long_job(self):
+        if self.long_job is not None:
+            self.long_job.cancel()
+            self.label.setText("Cancelling...")
+
+    def on_long_job_error(self, title, error):
+        if isinstance(error, InterruptedError):
+            self.label.setText("Cancelled.")
+        else:
+            QMessageBox.critical(self, title, str(error))
+
+    def on_long_job_progress(self, done, total):
+        # QProgressBar works with int, scale byte counts of large files
+        scale = max(1, total // 1000000)
+        self.progress_bar.setRange(0, max(total // scale, 1))
+        self.progress_bar.setValue(done // scale)
+
+    def on_long_job_finished(self):
+        self.progress_bar.setVisible(False)
+        self.cancel_button.setVisible(False)
+        for action in self.csv_actions:
+            action.setEnabled(True)
+        self.long_job = None
+
+    def checkpoint(self):
+        # On the writer thread, between edits; skipped while an import runs
+        if self.long_job is None:
+            self.data.submit(lambda repo, **kw: repo.checkpoint("RESTART"), write=True)
+
+    def closeEvent(self, event):
+        # Stop running jobs before the window goes away
+        # (an interrupted import is rolled back)
+        self.data.shutdown()
+        super().closeEvent(event)
 
     def action7_handler(self):
         # Choose a CSV file, then replace the timologia table
+        if self.long_job is not None:
+            return
         # Let user pick a CSV file
         path, _ = QFileDialog.getOpenFileName(self, "Open CSV to replace database", "", "CSV files (*.csv);;All files (*)")
         if not path:
@@ -488,102 +1046,20 @@ class MainWindow(QMainWindow):
         )
         if reply != QMessageBox.Yes:
             return
-        try:    
-            self.load_csv_replace_db(path)
-            self.label.setText(f"Loaded and replaced DB from: {os.path.basename(path)}")
-            self.update_table()
-        except Exception as e:
-            QMessageBox.critical(self, "CSV Load Error", f"Failed to load CSV: {e}")
-    
-    def load_csv_replace_db(self, csv_path):
-        # Read CSV file and replace contents of the timologia table.
+        # Streaming, chunked import in one transaction (see timologia_db.import_csv):
+        # a failed or cancelled import leaves the old data in place.
         # Expected columns (case-insensitive): ID, Name, Description, Amount, Date
-        # Description may contain multiple items separated by '|' or newline; store as JSON list.
-        #
-        global db_connection, db_cursor
-
-        # read csv with python's csv so we don't depend on pandas here
-        with open(csv_path, newline='', encoding='utf-8') as f:
-            reader = csv.reader(f)
-            rows = list(reader)
-
-        if not rows:
-            raise ValueError("CSV file is empty")
-
-        header = [h.strip() for h in rows[0]]
-        # Map header names to lower-case keys
-        header_lower = [h.lower() for h in header]
-
-        # Expected column names (flexible)
-        def find_col(*names):
-            for n in names:
-                if n in header_lower:
-                    return header_lower.index(n)
-            return None
-
-        id_idx = find_col('id', 'issue number', 'issue_number', 'issue-number')
-        name_idx = find_col('name')
-        desc_idx = find_col('description', 'descrip', 'details')
-        amount_idx = find_col('amount', 'qty', 'euro', 'price')
-        date_idx = find_col('date')
-
-        if id_idx is None or name_idx is None:
-            raise ValueError("CSV must contain at least 'ID' and 'Name' columns")
-
-        data_rows = rows[1:]
-
-        # Recreate table to ensure schema matches and clear old data
-        db_cursor.execute("""CREATE TABLE IF NOT EXISTS timologia (
-                                id TEXT PRIMARY KEY,
-                                name TEXT,
-                                description TEXT,
-                                amount TEXT,
-                                date TEXT
-                             )""")
-        db_connection.commit()
-
-        # Clear existing data
-        db_cursor.execute("DELETE FROM timologia")
-        db_connection.commit()
-
-        insert_stmt = "INSERT INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, ?)"
-        to_insert = []
-
-        for r in data_rows:
-            # be robust to short rows
-            # pad row to header length
-            if len(r) < len(header):
-                r = r + [''] * (len(header) - len(r))
-
-            _id = r[id_idx].strip() if id_idx is not None else ""
-            _name = r[name_idx].strip() if name_idx is not None else ""
-            _desc_raw = r[desc_idx].strip() if desc_idx is not None else ""
-            _amount = r[amount_idx].strip() if amount_idx is not None else ""
-            _date = r[date_idx].strip() if date_idx is not None else ""
-
-            # normalize description into a JSON list
-            # handle common separators: pipe '|' or newline; if none, single item list
-            if _desc_raw == "":
-                desc_list = []
-            elif '|' in _desc_raw:
-                desc_list = [s.strip() for s in _desc_raw.split('|') if s.strip()]
-            elif '\n' in _desc_raw:
-                desc_list = [s.strip() for s in _desc_raw.splitlines() if s.strip()]
-            else:
-                # also try comma separation if it looks like multiple
-                if ',' in _desc_raw and len(_desc_raw.split(',')) > 1:
-                    desc_list = [s.strip() for s in _desc_raw.split(',') if s.strip()]
-                else:
-                    desc_list = [_desc_raw]
-
-            desc_json = json.dumps(desc_list, ensure_ascii=False)
-
-            # Build tuple for insertion; allow empty strings for missing columns
-            to_insert.append((_id, _name, desc_json, _amount, _date))
-
-        # Bulk insert
-        db_cursor.executemany(insert_stmt, to_insert)
-        db_connection.commit()
+        self.label.setText(f"Loading {os.path.basename(path)}...")
+        self.run_long_job(
+            lambda repo, **kw: repo.import_csv(path, **kw),
+            lambda rows: self.on_import_done(path, rows),
+            "CSV Load Error", write=True)
+
+    def on_import_done(self, path, rows):
+        self.label.setText(f"Loaded and replaced DB from: {os.path.basename(path)} ({rows} entries)")
+        self.update_table()
+        # the whole table changed, read the completions again
+        self.data.submit(AutocompleteIndex.read_counts, on_result=self.autocomplete.load, write=True)
 
     # FastAPI and dashboard handling
     # This function tries to start the FastAPI server with uvicorn if not already running,
@@ -3,13 +3,19 @@
 # python3 timologia.py
 # Pre-requisites-miniconda, python3, csv and sqlite3, pyqt5 libs
 # 
+# Uses the same timologia.db as the GUI and the dashboard, through the
+# shared repository (timologia_repo.py).
+import os
 import sqlite3
-import csv 
+from datetime import datetime
+
+import timologia_db
+import timologia_repo
 
 
 usage_message = '''
 # Καλοσωρήσατε στο σύστημα τιμολογίων! 
-# Τι θα θέλατε να κάνετε? (Επιλέξτε από το 1-6, 0)
+# Τι θα θέλατε να κάνετε? (Επιλέξτε από το 1-7, 0)
 # Για όλες τις επιλογές εισάγετε '' στα Linux.
  1 - Τοποθέτηση αριθμού τιμολογίου.
  2 - Ανανέωση αριθμού τιμολογίου.
@@ -17,167 +23,137 @@ usage_message = '''
  4 - Αναζήτηση τιμολογίου.
  5 - Θέαση λίστας τιμολογίων.
  6 - Αποθήκευση λίστας τιμολογίων σε csv. 
+ 7 - Τοποθέτηση πολλών τιμολογίων μαζί.
  0 - Έξοδος προγράμματος.
 '''
 
 
 def create_database():
-    #try:
-    # Creates or opens a file called timolgia 
-    # with a SQLite3 DB
-    db = sqlite3.connect('timologia')
-    
-    # Get a cursor object
-    cursor = db.cursor()
-
-    #Remove every trace of the table during testing
-    #cursor.execute('''
-    #               DROP TABLE IF EXISTS timologia
-    #               ''')
-    
-
-    #rows = cursor.fetchall()
-    #print("Initial data before adding any:")
-    #for row in rows:
-    #    print(row)
-    
+    # Opens (or creates) timologia.db, or the postgresql:// URL in
+    # TIMOLOGIA_DB, with the current schema
+    path = os.environ.get("TIMOLOGIA_DB", timologia_db.DB_FILE)
+    repo = timologia_repo.open_repository(path)
+    if not timologia_repo.is_database_url(path) and os.path.exists(timologia_db.LEGACY_CLI_DB):
+        print(f"Βρέθηκε το παλιό αρχείο '{timologia_db.LEGACY_CLI_DB}'. Μεταφορά των τιμολογίων του με:\n"
+              f"python timologia_db.py legacy {path} {timologia_db.LEGACY_CLI_DB}")
+    return repo
+
+
+# Read the fields of an invoice; amount and date are checked like in the GUI
+def read_invoice(prefix=''):
+    title = input(f'Τοποθετείστε {prefix}προιόν και λεπτομέρειες:\n').strip()
+    name = input(f'Τοποθετείστε {prefix}όνομα πελάτη:\n').strip()
+    while True:
+        amount = input(f'Τοποθετείστε {prefix}ποσό τιμολογίου (ευρώ):\n').strip()
+        try:
+            float(amount)
+            break
+        except ValueError:
+            print("Μη έγκυρο ποσό.")
+    while True:
+        date = input('Ημερομηνία DD-MM-YY (κενό για σήμερα):\n').strip()
+        if not date:
+            date = datetime.now().strftime("%d-%m-%y")
+        try:
+            datetime.strptime(date, "%d-%m-%y")
+            break
+        except ValueError:
+            print("Παραχώρησε την ημερομηνία με το σωστό τύπο π.χ. DD-MM-YY.")
+    return name, [title] if title else [], amount, date
 
-     # Check if table users does not exist and create it
-    cursor.execute('''CREATE TABLE IF NOT EXISTS timologia (
-      ID INTEGER PRIMARY KEY,
-      TITLE varchar(100),
-      Author varchar(100),
-      Qty int
-      )''')
-    # Commit the change
-    db.commit()
-        
-    #cursor = db.cursor()
-
-    #timologia_= [(
-    #     3001, 'A Tale of Two Cities', 'Charles Dickens', 30),
-    #    (3002, "Harry Potter and the Philosopher's Stone", 'J.K. Rowling', 40),
-    #    (3003, 'The Lion, the Witch and the Warddrobe', 'C. S. Lewis', 25),
-    #    (3004, 'The Lord of the Rings', 'J.R.R. Tolkien', 37),
-    #    (3005, 'Alice in Wonderland', 'Lewis Carroll', 12)
-    #]
-    #cursor.executemany('''
-    #    INSERT INTO timologia (ID, 
-    #                         Title, 
-    #                         Author, 
-    #                         Qty)	
-    #     VALUES(?,?,?,?)''', books_)
-
-    #db.commit()
-       # Catch the exception
-    #except Exception as e:
-    #    # Roll back any change if something goes wrong
-    #    db.rollback()
-    #    raise e
-    #finally:
-    #    # Close the db connection
-    #    db.close()
-
-    return db
 
 # Add timologia in the db
-def add_book(cursor):
-    id= int(input('Τοποθετείστε αριθμό τιμολογίου:\n'))
-    title = input('Τοποθετείστε προιόν και λεπτομέρειες:\n')
-    author = input('Τοποθετείστε όνομα πελάτη:\n')
-    qty = int(input('Τοποθετείστε ποσό τιμολογίου (ευρώ):\n'))
-    cursor.execute('''INSERT INTO timologia(id, title, author,qty)
-                   VALUES(?,?,?,?)''', (id, title, author,qty)
-                  )
-    
+def add_book(repo):
+    id = input('Τοποθετείστε αριθμό τιμολογίου:\n').strip()
+    name, descriptions, amount, date = read_invoice()
+    try:
+        repo.add(id, name, descriptions, amount, date)
+    except sqlite3.IntegrityError:
+        print(f"Ο αριθμός τιμολογίου {id} υπάρχει ήδη.")
+
+# Add many timologia at once: they are written together, in one
+# transaction (one commit), when the list ends with an empty number.
+# An invoice that cannot be added (e.g. its number exists) is reported
+# and the others are still written.
+def add_books(repo):
+    invoices = []
+    while True:
+        id = input('Τοποθετείστε αριθμό τιμολογίου (κενό για τέλος):\n').strip()
+        if not id:
+            break
+        invoices.append((id, *read_invoice()))
+    written, errors = repo.add_batch(invoices)
+    for k, error in sorted(errors.items()):
+        print(f"{invoices[k][0]}: {error}")
+    print(f"Καταχωρήθηκαν {written} από {len(invoices)} τιμολόγια.")
+
 # Update the existing timimologia in the db
-def update_book(cursor):
-    id= int(input('Τοποθετείστε αριθμό τιμολογίου για ανανέωση αριθμού :\n'))
-    title = input('Τοποθετείστε νέο προιόν και λεπτομέρειες:\n')
-    author = input('Τοποθετείστε νέο όνομα πελάτη:\n')
-    qty = int(input('Τοποθετείστε νέο ποσό τιμολογίου (ευρώ):\n'))
-    cursor.execute('''UPDATE timologia SET Title = ?, Author = ?, Qty = ? 
-                   WHERE ID = ?''', (title, author, qty, id)
-                  )
+def update_book(repo):
+    id = input('Τοποθετείστε αριθμό τιμολογίου για ανανέωση αριθμού :\n').strip()
+    name, descriptions, amount, date = read_invoice('νέο ')
+    if repo.update(id, name, descriptions, amount, date) is None:
+        print(f"Δεν βρέθηκε το τιμολόγιο {id}.")
+
 # Remove any timologia
-def delete_book(cursor):
-    id= int(input('Τοποθετείστε αριθμό τιμολογίου για διαγραφή:\n'))
-    cursor.execute('''DELETE FROM timologia
-                    WHERE ID = ?''', (id,)
-                  )
+def delete_book(repo):
+    id = input('Τοποθετείστε αριθμό τιμολογίου για διαγραφή:\n').strip()
+    if repo.delete(id) is None:
+        print(f"Δεν βρέθηκε το τιμολόγιο {id}.")
 
 #retrieve data from sql db
-def search_book(cursor):
-    search_term = input("Αναζήτηση: ")
-    cursor.execute('''SELECT * FROM timologia 
-                   WHERE 
-                   Title LIKE ? 
-                   OR Author LIKE ?
-                   OR ID LIKE ?''',
-                    ('%' + search_term + '%', 
-                     '%' + search_term + '%',
-                     '%' + search_term + '%'))
-    rows = cursor.fetchall()
+# Exact invoice number first, then full-text matches on invoice number,
+# customer and description items (every word as a prefix), best first
+def search_book(repo):
+    search_term = input("Αναζήτηση: ").strip()
+    rows = []
+    exact = repo.get(search_term)
+    if exact is not None:
+        rows.append(tuple(exact))
+    for row in repo.search(search_term):
+        row = tuple(row[1:6])    # skip the rowid and the score
+        if row not in rows:
+            rows.append(row)
     for row in rows:
         print(row)
 
 # view timologia entires in the db 
-def view_bookdb(cursor):
-    # Verify the deletion
-    cursor.execute('SELECT * FROM timologia')
-    rows = cursor.fetchall()
-    print("Δεδομένα μετά την διαγραφή:")
-    for row in rows:
+def view_bookdb(repo):
+    for row in repo.iter_all():
         print(row)
 
 # save the entries of the db to .csv
-def savedb_csv(cursor,db):
-   # SQL query to retrieve data
-   cursor.execute('''SELECT * FROM timologia''')
-   rows = cursor.fetchall()
-
-   with open('timologia.csv', 'w') as file:
-      writer = csv.writer(file)
-      writer.writerow(['Αρ. Τιμ.', 'Περιγραφή', 'Πελάτης', 'Euro'])
-      writer.writerows(rows)       
-   print("Η λίστα τιμολογίων έχει αποθηκευτεί στο τιμολόγια.csv")
+def savedb_csv(repo):
+   n = repo.export_csv('timologia.csv')
+   print(f"Η λίστα τιμολογίων ({n}) έχει αποθηκευτεί στο timologia.csv")
 
 
 
 # Main program
 def main():
-    #Call fun to create the book database-i.e. connection with sqlite
-    db = create_database()
-    #create the cursor object
-    cursor = db.cursor() 
+    # Open the shared invoice database through the repository
+    repo = create_database()
     
     while True:
       user_choice = int(input(usage_message))
-      # Options of actions
+      # Options of actions (every change is committed by the repository;
+      # 7 commits the whole list once)
       if user_choice == 1:
-        add_book(cursor)
-        db.commit()
+        add_book(repo)
       elif user_choice == 2:
-        update_book(cursor)
-        db.commit()
+        update_book(repo)
       elif user_choice == 3:
-        delete_book(cursor)
-        db.commit()
+        delete_book(repo)
       elif user_choice == 4:
-        search_book(cursor)
+        search_book(repo)
       elif user_choice == 5:
-        view_bookdb(cursor)
+        view_bookdb(repo)
       elif user_choice == 6:
-        savedb_csv(cursor,db)
+        savedb_csv(repo)
+      elif user_choice == 7:
+        add_books(repo)
       elif user_choice==0:
           print("Εξοδος!")
-     
-          # SQL code that will delete all the data in the table, but not the table
-          # Delete all data inside the Student table
-          #cursor.execute('DELETE FROM timologia')
-          #db.commit()
-          
-          db.close()
+          repo.close()
           break
       else:
             print("Μη αναγνωρίσημη επιλογή. Παρακαλώ δοκιμάστε ξανά.")
@@ -185,6 +161,3 @@ def main():
 # Call the main program         
 if __name__ == "__main__":
     main()
-
-
-
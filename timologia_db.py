@@ -0,0 +1,1103 @@
+# timologia_db.py
+# Schema versioning and migrations for the timologia SQLite database,
+# and the CSV import/export. Run on start-up by every front end (through
+# timologia_repo.py), so whichever opens the database first brings it to
+# the current schema.
+#
+# The schema version is kept in PRAGMA user_version.
+# Run by hand with
+# python timologia_db.py migrate [path/to/timologia.db]
+import csv
+import gzip
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from itertools import islice
+
+DB_FILE = "timologia.db"
+BATCH_SIZE = 5000
+
+# Amounts are entered as text ("400.38"); the typed column holds integer cents
+AMOUNT_CENTS_SQL = "CAST(ROUND(CAST({0} AS REAL) * 100) AS INTEGER)"
+
+
+# Dates are entered as DD-MM-YY (strptime "%d-%m-%y", which also accepts
+# 1-2-23). The sortable ISO column uses the same century rule as Python's
+# %y: 69-99 -> 19xx, 00-68 -> 20xx. Anything unparseable becomes NULL.
+def iso_date_sql(col):
+    rest = f"substr({col}, instr({col}, '-') + 1)"
+    d = f"CAST(substr({col}, 1, instr({col}, '-') - 1) AS INTEGER)"
+    m = f"CAST(substr({rest}, 1, instr({rest}, '-') - 1) AS INTEGER)"
+    y = f"CAST(substr({rest}, instr({rest}, '-') + 1) AS INTEGER)"
+    return f"""CASE WHEN {col} GLOB '[0-9]*-[0-9]*-[0-9]*' AND NOT {col} GLOB '*[^0-9-]*'
+                    AND {m} BETWEEN 1 AND 12 AND {d} BETWEEN 1 AND 31
+               THEN printf('%04d-%02d-%02d',
+                           CASE WHEN {y} >= 100 THEN {y} WHEN {y} >= 69 THEN 1900 + {y} ELSE 2000 + {y} END,
+                           {m}, {d})
+               END"""
+
+
+def create_table(cursor):
+    # Base table as created by the GUI and the CSV import
+    cursor.execute("""CREATE TABLE IF NOT EXISTS timologia (
+                        id TEXT PRIMARY KEY,
+                        name TEXT,
+                        description TEXT,
+                        amount TEXT,
+                        date TEXT
+                     )""")
+    # Databases from the first versions of the GUI have no date column
+    if "date" not in columns(cursor):
+        cursor.execute("ALTER TABLE timologia ADD COLUMN date TEXT")
+
+
+def columns(cursor, table="timologia"):
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def batched(conn, sql, batch_size=BATCH_SIZE, progress=None):
+    # Run sql (with "rowid > ? AND rowid <= ?" placeholders) over timologia
+    # in rowid ranges, committing after every batch, so the GUI and the
+    # dashboard can keep reading and writing in between.
+    max_rowid = conn.execute("SELECT MAX(rowid) FROM timologia").fetchone()[0] or 0
+    done = 0
+    while done < max_rowid:
+        conn.execute(sql, (done, done + batch_size))
+        conn.commit()
+        done += batch_size
+        if progress:
+            progress(min(done, max_rowid), max_rowid)
+
+
+def backfill(conn, set_sql, batch_size=BATCH_SIZE, progress=None):
+    # Fill a derived column of timologia in batches
+    batched(conn, f"UPDATE timologia SET {set_sql} WHERE rowid > ? AND rowid <= ?",
+            batch_size, progress)
+
+
+# Version 1: amount_cents INTEGER next to the text amount.
+# Triggers keep it in sync on every INSERT/UPDATE, whoever writes
+# (GUI, CSV import, older builds of the app), and the indexes let
+# top-N, "most expensive" and per-customer sums read the index only.
+def _migrate_amount_cents(conn, batch_size, progress):
+    cur = conn.cursor()
+    if "amount_cents" not in columns(cur):
+        cur.execute("ALTER TABLE timologia ADD COLUMN amount_cents INTEGER")
+    cents = AMOUNT_CENTS_SQL.format("NEW.amount")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_amount_cents_ai
+                    AFTER INSERT ON timologia
+                    BEGIN
+                        UPDATE timologia SET amount_cents = {cents} WHERE rowid = NEW.rowid;
+                    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_amount_cents_au
+                    AFTER UPDATE OF amount ON timologia
+                    BEGIN
+                        UPDATE timologia SET amount_cents = {cents} WHERE rowid = NEW.rowid;
+                    END""")
+    conn.commit()
+    backfill(conn, "amount_cents = " + AMOUNT_CENTS_SQL.format("amount"), batch_size, progress)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_amount_cents ON timologia(amount_cents)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_name_amount ON timologia(name, amount_cents)")
+    conn.commit()
+
+
+# Version 2: date_iso TEXT (YYYY-MM-DD) next to the DD-MM-YY date,
+# so date ranges, months and years are index range scans.
+# The index also carries amount_cents, so revenue per period never
+# touches the table rows.
+def _migrate_date_iso(conn, batch_size, progress):
+    cur = conn.cursor()
+    if "date_iso" not in columns(cur):
+        cur.execute("ALTER TABLE timologia ADD COLUMN date_iso TEXT")
+    iso = iso_date_sql("NEW.date")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_date_iso_ai
+                    AFTER INSERT ON timologia
+                    BEGIN
+                        UPDATE timologia SET date_iso = {iso} WHERE rowid = NEW.rowid;
+                    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_date_iso_au
+                    AFTER UPDATE OF date ON timologia
+                    BEGIN
+                        UPDATE timologia SET date_iso = {iso} WHERE rowid = NEW.rowid;
+                    END""")
+    conn.commit()
+    backfill(conn, "date_iso = " + iso_date_sql("date"), batch_size, progress)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_date_iso ON timologia(date_iso, amount_cents)")
+    conn.commit()
+
+
+# Version 3: materialized per-customer and per-month totals.
+# Triggers on timologia keep them current on every INSERT, UPDATE and
+# DELETE (GUI actions, CSV import, any other writer), so the dashboard
+# reads top customers and totals in O(customers) instead of O(invoices).
+# The triggers compute cents and month from NEW/OLD.amount and .date
+# themselves, because SQLite does not guarantee that the amount_cents and
+# date_iso triggers have already run.
+# Invoices without a name are counted under ''; invoices whose date
+# cannot be parsed have no month.
+SUMMARY_TABLES = ["customer_totals", "monthly_totals", "product_totals", "customer_monthly", "product_monthly"]
+
+
+def _summary_trigger_sql(sign, row):
+    cents = f"IFNULL({AMOUNT_CENTS_SQL.format(row + '.amount')}, 0)"
+    return f"""
+        INSERT INTO customer_totals (name, total_cents, invoices)
+        VALUES (IFNULL({row}.name, ''), {sign}{cents}, {sign}1)
+        ON CONFLICT(name) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                        invoices = invoices + excluded.invoices;
+        {_monthly_totals_trigger_sql(sign, row)}
+    """
+
+
+def _monthly_totals_trigger_sql(sign, row):
+    cents = f"IFNULL({AMOUNT_CENTS_SQL.format(row + '.amount')}, 0)"
+    month = f"substr({iso_date_sql(row + '.date')}, 1, 7)"
+    return f"""
+        INSERT INTO monthly_totals (month, total_cents, invoices)
+        SELECT m, {sign}{cents}, {sign}1 FROM (SELECT {month} AS m) WHERE m IS NOT NULL
+        ON CONFLICT(month) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                         invoices = invoices + excluded.invoices;
+    """
+
+
+def _prune_sql(row, customer):
+    # Drop the customer and month of row once their count is 0, by key
+    # (customer is the customer_totals key expression)
+    return f"""
+        DELETE FROM customer_totals WHERE {customer} AND invoices <= 0;
+        DELETE FROM monthly_totals WHERE month = {_month_sql(row)} AND invoices <= 0;
+    """
+
+
+def _fill_summaries(conn):
+    conn.execute("DELETE FROM customer_totals")
+    conn.execute("DELETE FROM monthly_totals")
+    if "customer_id" in columns(conn.cursor(), "customer_totals"):
+        _fill_customer_totals(conn)
+    else:
+        conn.execute("""INSERT INTO customer_totals (name, total_cents, invoices)
+                        SELECT IFNULL(name, ''), IFNULL(SUM(amount_cents), 0), COUNT(*)
+                        FROM timologia GROUP BY IFNULL(name, '')""")
+    conn.execute("""INSERT INTO monthly_totals (month, total_cents, invoices)
+                    SELECT substr(date_iso, 1, 7) AS m, IFNULL(SUM(amount_cents), 0), COUNT(*)
+                    FROM timologia WHERE date_iso IS NOT NULL GROUP BY m""")
+
+
+def rebuild_summaries(conn):
+    # Recompute the summary tables from scratch in one transaction
+    with conn:
+        _fill_summaries(conn)
+        if schema_version(conn) >= 6:
+            _fill_product_totals(conn)
+        if schema_version(conn) >= 9:
+            _fill_monthly_rollups(conn)
+
+
+def check_summaries(conn):
+    # Compare the summary tables with the invoices; returns a list of
+    # (table, key, stored (total_cents, invoices), actual (total_cents, invoices))
+    expected = {
+        "customer_totals": """SELECT IFNULL(name, ''), IFNULL(SUM(amount_cents), 0), COUNT(*)
+                              FROM timologia GROUP BY IFNULL(name, '')""",
+        "monthly_totals": """SELECT substr(date_iso, 1, 7) AS m, IFNULL(SUM(amount_cents), 0), COUNT(*)
+                             FROM timologia WHERE date_iso IS NOT NULL GROUP BY m""",
+    }
+    if schema_version(conn) >= 6:
+        expected["product_totals"] = """SELECT description, SUM(share_cents), COUNT(*)
+                                        FROM invoice_items GROUP BY description"""
+    if schema_version(conn) >= 7:
+        expected["customer_totals"] = """SELECT c.id, IFNULL(SUM(t.amount_cents), 0), COUNT(*)
+                                         FROM timologia t JOIN customers c ON c.name = IFNULL(t.name, '')
+                                         GROUP BY c.id"""
+    if schema_version(conn) >= 9:
+        expected["customer_monthly"] = """SELECT substr(t.date_iso, 1, 7) AS m, c.id,
+                                                 IFNULL(SUM(t.amount_cents), 0), COUNT(*)
+                                          FROM timologia t JOIN customers c ON c.name = IFNULL(t.name, '')
+                                          WHERE t.date_iso IS NOT NULL GROUP BY m, c.id"""
+        expected["product_monthly"] = """SELECT substr(t.date_iso, 1, 7) AS m, i.description,
+                                                SUM(i.share_cents), COUNT(*)
+                                         FROM invoice_items i JOIN timologia t ON t.id = i.invoice_id
+                                         WHERE t.date_iso IS NOT NULL GROUP BY m, i.description"""
+
+    def by_key(rows):
+        # the last two columns are the totals, the others the key
+        return {(r[0] if len(r) == 3 else tuple(r[:-2])): tuple(r[-2:]) for r in rows}
+
+    problems = []
+    for table, sql in expected.items():
+        actual = by_key(conn.execute(sql))
+        stored = by_key(conn.execute(f"SELECT * FROM {table}"))
+        for key in sorted(set(actual) | set(stored)):
+            if actual.get(key) != stored.get(key):
+                problems.append((table, key, stored.get(key), actual.get(key)))
+    return problems
+
+
+def _migrate_summary_tables(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("""CREATE TABLE IF NOT EXISTS customer_totals (
+                        name TEXT PRIMARY KEY NOT NULL,
+                        total_cents INTEGER NOT NULL,
+                        invoices INTEGER NOT NULL
+                   )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_customer_totals_total ON customer_totals(total_cents)")
+    cur.execute("""CREATE TABLE IF NOT EXISTS monthly_totals (
+                        month TEXT PRIMARY KEY NOT NULL,
+                        total_cents INTEGER NOT NULL,
+                        invoices INTEGER NOT NULL
+                   )""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_summary_ai
+                    AFTER INSERT ON timologia
+                    BEGIN {_summary_trigger_sql("", "NEW")} END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_summary_ad
+                    AFTER DELETE ON timologia
+                    BEGIN {_summary_trigger_sql("-", "OLD")} {_prune_sql("OLD", "name = IFNULL(OLD.name, '')")} END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_summary_au
+                    AFTER UPDATE OF name, amount, date ON timologia
+                    BEGIN {_summary_trigger_sql("-", "OLD")} {_summary_trigger_sql("", "NEW")}
+                          {_prune_sql("OLD", "name = IFNULL(OLD.name, '')")}
+                    END""")
+    conn.commit()
+    rebuild_summaries(conn)
+
+
+# Version 4: full-text index over id, name and the description items.
+# invoice_fts shares its rowid with timologia and triggers keep it in sync.
+# The description JSON array is flattened into one text column; values
+# that are not a JSON array are indexed as they are.
+# unicode61 folds case (Greek included) and strips Latin accents; Greek
+# accents (tonos, dialytika) are stripped before indexing, because the
+# tokenizer leaves them alone. The prefix indexes make "term*" queries
+# index lookups.
+FTS_BM25 = "bm25(invoice_fts, 10.0, 5.0, 1.0)"   # weights: id, name, items
+GREEK_ACCENTS = {
+    "ά": "α", "έ": "ε", "ή": "η", "ί": "ι", "ό": "ο", "ύ": "υ", "ώ": "ω",
+    "ϊ": "ι", "ϋ": "υ", "ΐ": "ι", "ΰ": "υ",
+    "Ά": "Α", "Έ": "Ε", "Ή": "Η", "Ί": "Ι", "Ό": "Ο", "Ύ": "Υ", "Ώ": "Ω",
+    "Ϊ": "Ι", "Ϋ": "Υ",
+}
+
+
+def strip_greek_accents_sql(expr):
+    for accented, plain in GREEK_ACCENTS.items():
+        expr = f"replace({expr}, '{accented}', '{plain}')"
+    return expr
+
+
+def description_array_sql(col):
+    # The description as a JSON array; a value that is not one becomes a one-item array
+    return f"CASE WHEN json_valid({col}) AND json_type({col}) = 'array' THEN {col} ELSE json_array({col}) END"
+
+
+def description_items_sql(col):
+    return f"(SELECT group_concat(value, ' ') FROM json_each({description_array_sql(col)}))"
+
+
+def _migrate_fts(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("""CREATE VIRTUAL TABLE IF NOT EXISTS invoice_fts USING fts5(
+                        id, name, items,
+                        tokenize = 'unicode61 remove_diacritics 2',
+                        prefix = '2 3'
+                   )""")
+    name = strip_greek_accents_sql("NEW.name")
+    items = strip_greek_accents_sql(description_items_sql("NEW.description"))
+    insert_new = f"""INSERT INTO invoice_fts (rowid, id, name, items)
+                     VALUES (NEW.rowid, NEW.id, {name}, {items});"""
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_fts_ai
+                    AFTER INSERT ON timologia
+                    BEGIN {insert_new} END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS timologia_fts_ad
+                   AFTER DELETE ON timologia
+                   BEGIN DELETE FROM invoice_fts WHERE rowid = OLD.rowid; END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_fts_au
+                    AFTER UPDATE OF id, name, description ON timologia
+                    BEGIN
+                        DELETE FROM invoice_fts WHERE rowid = OLD.rowid;
+                        {insert_new}
+                    END""")
+    conn.commit()
+    # Rows written since the triggers exist are already indexed
+    batched(conn, f"""INSERT INTO invoice_fts (rowid, id, name, items)
+                      SELECT rowid, id, {strip_greek_accents_sql("name")},
+                             {strip_greek_accents_sql(description_items_sql("description"))}
+                      FROM timologia t
+                      WHERE rowid > ? AND rowid <= ?
+                        AND NOT EXISTS (SELECT 1 FROM invoice_fts f WHERE f.rowid = t.rowid)""",
+            batch_size, progress)
+    cur.execute("INSERT INTO invoice_fts (invoice_fts) VALUES ('optimize')")
+    conn.commit()
+
+
+def fts_query(text, strip_accents=True):
+    # Turn what the user typed into an FTS5 query: every word must match
+    # as a prefix, e.g. "gra le" -> "gra"* AND "le"*. None if no words.
+    text = text or ""
+    if strip_accents:
+        text = "".join(GREEK_ACCENTS.get(ch, ch) for ch in text)
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " AND ".join('"' + w.replace('"', '""') + '"*' for w in words)
+
+
+SEARCH_SQL = f"""
+    SELECT t.rowid, t.id, t.name, t.description, t.amount, t.date, {FTS_BM25} AS score
+    FROM invoice_fts JOIN timologia t ON t.rowid = invoice_fts.rowid
+    WHERE invoice_fts MATCH ?
+    ORDER BY score
+    LIMIT ? OFFSET ?
+"""
+
+
+def search(conn, text, limit=-1, offset=0):
+    # Best matches first; [] when the text has nothing to search for
+    query = fts_query(text)
+    if query is None:
+        return []
+    return conn.execute(SEARCH_SQL, (query, limit, offset)).fetchall()
+
+
+def search_rowids(conn, text):
+    query = fts_query(text)
+    if query is None:
+        return []
+    return [r[0] for r in conn.execute(
+        f"SELECT rowid FROM invoice_fts WHERE invoice_fts MATCH ? ORDER BY {FTS_BM25}", (query,))]
+
+
+def search_count(conn, text):
+    query = fts_query(text)
+    if query is None:
+        return 0
+    return conn.execute("SELECT COUNT(*) FROM invoice_fts WHERE invoice_fts MATCH ?", (query,)).fetchone()[0]
+
+
+# Version 5: indexes for keyset pagination (dashboard /api/invoices).
+# Listing by date seeks on (date_iso, id), a customer's invoices by id
+# on (name, id), so any page starts with an index seek, not a scan.
+def _migrate_keyset_indexes(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_date_id ON timologia(date_iso, id)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_name_id ON timologia(name, id)")
+    conn.commit()
+
+
+# Version 6: invoice_items, one row per description item, so products
+# can be counted and summed in SQL. The JSON description column stays
+# what the front ends and the CSV files read and write; triggers keep
+# invoice_items in step with it. Editing a description keeps the lines
+# whose position and text did not change.
+# amount_cents is an optional per-line amount (Repository.set_item_amount);
+# share_cents is what the line counts for: its own amount, or an equal
+# part of what is left of the invoice amount. product_totals holds
+# revenue and lines per product like customer_totals, kept current by
+# triggers on invoice_items, so top products cost O(products).
+def invoice_items_select_sql(row, from_table=False):
+    # (invoice_id, position, description, share_cents) of the items of the
+    # timologia row NEW, or with from_table=True of every row of timologia
+    # (aliased as row); the amount is shared equally
+    source = f"timologia {row}, " if from_table else ""
+    cents = AMOUNT_CENTS_SQL.format(row + ".amount")
+    return f"""SELECT {row}.id, je.key, je.value,
+                      IFNULL(CAST(ROUND({cents} * 1.0 / COUNT(*) OVER (PARTITION BY {row}.id)) AS INTEGER), 0)
+               FROM {source}json_each({description_array_sql(row + ".description")}) AS je
+               WHERE je.type = 'text' AND je.value <> ''"""
+
+
+def _reshare_sql(invoice_id, cents):
+    # Recompute share_cents of the lines of one invoice
+    lines = f"FROM invoice_items x WHERE x.invoice_id = {invoice_id}"
+    return f"""UPDATE invoice_items SET share_cents = IFNULL(COALESCE(amount_cents, CAST(ROUND(
+                   ({cents} - (SELECT IFNULL(SUM(x.amount_cents), 0) {lines})) * 1.0
+                   / (SELECT COUNT(*) {lines} AND x.amount_cents IS NULL)) AS INTEGER)), 0)
+               WHERE invoice_id = {invoice_id};"""
+
+
+def _product_totals_sql(sign, row):
+    return f"""
+        INSERT INTO product_totals (product, total_cents, lines)
+        VALUES ({row}.description, {sign}{row}.share_cents, {sign}1)
+        ON CONFLICT(product) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                           lines = lines + excluded.lines;
+    """
+
+
+def _prune_products_sql(row):
+    return f"DELETE FROM product_totals WHERE product = {row}.description AND lines <= 0;"
+
+ITEMS_INSERT_SQL = "INSERT INTO invoice_items (invoice_id, position, description, share_cents)"
+
+
+def _create_product_totals_triggers(cur):
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_totals_ai
+                    AFTER INSERT ON invoice_items
+                    BEGIN {_product_totals_sql("", "NEW")} END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_totals_ad
+                    AFTER DELETE ON invoice_items
+                    BEGIN {_product_totals_sql("-", "OLD")} {_prune_products_sql("OLD")} END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_totals_au
+                    AFTER UPDATE OF description, share_cents ON invoice_items
+                    BEGIN
+                        {_product_totals_sql("-", "OLD")} {_product_totals_sql("", "NEW")}
+                        {_prune_products_sql("OLD")}
+                    END""")
+
+
+def _fill_product_totals(conn):
+    conn.execute("DELETE FROM product_totals")
+    conn.execute("""INSERT INTO product_totals (product, total_cents, lines)
+                    SELECT description, SUM(share_cents), COUNT(*) FROM invoice_items GROUP BY description""")
+
+
+def _migrate_invoice_items(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("""CREATE TABLE IF NOT EXISTS invoice_items (
+                        invoice_id TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        description TEXT NOT NULL,
+                        amount_cents INTEGER,
+                        share_cents INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (invoice_id, position)
+                   ) WITHOUT ROWID""")
+    cur.execute("""CREATE TABLE IF NOT EXISTS product_totals (
+                        product TEXT PRIMARY KEY NOT NULL,
+                        total_cents INTEGER NOT NULL,
+                        lines INTEGER NOT NULL
+                   )""")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_product_totals_total ON product_totals(total_cents)")
+    _create_product_totals_triggers(cur)
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_amount_au
+                    AFTER UPDATE OF amount_cents ON invoice_items
+                    BEGIN
+                        {_reshare_sql("NEW.invoice_id",
+                                      "(SELECT amount_cents FROM timologia WHERE id = NEW.invoice_id)")}
+                    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_items_ai
+                    AFTER INSERT ON timologia
+                    BEGIN
+                        DELETE FROM invoice_items WHERE invoice_id = NEW.id;
+                        {ITEMS_INSERT_SQL} {invoice_items_select_sql("NEW")};
+                    END""")
+    cur.execute("""CREATE TRIGGER IF NOT EXISTS timologia_items_ad
+                   AFTER DELETE ON timologia
+                   BEGIN DELETE FROM invoice_items WHERE invoice_id = OLD.id; END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_items_au
+                    AFTER UPDATE OF id, description, amount ON timologia
+                    BEGIN
+                        DELETE FROM invoice_items
+                        WHERE invoice_id = OLD.id
+                          AND (NEW.id IS NOT OLD.id OR NOT EXISTS (
+                                SELECT 1 FROM json_each({description_array_sql("NEW.description")}) AS je
+                                WHERE je.key = invoice_items.position AND je.type = 'text'
+                                  AND je.value = invoice_items.description));
+                        INSERT OR IGNORE INTO invoice_items (invoice_id, position, description, share_cents)
+                        {invoice_items_select_sql("NEW")};
+                        {_reshare_sql("NEW.id", AMOUNT_CENTS_SQL.format("NEW.amount"))}
+                    END""")
+    conn.commit()
+    # Rows written since the triggers exist already have their items
+    batched(conn, f"""INSERT OR IGNORE INTO invoice_items (invoice_id, position, description, share_cents)
+                      SELECT * FROM ({invoice_items_select_sql("t", from_table=True)}
+                                     AND t.rowid > ? AND t.rowid <= ?)""",
+            batch_size, progress)
+
+
+# Version 7: customers, one row per distinct name with an integer key.
+# timologia.customer_id points at it (triggers set it from the name, which
+# stays on the invoice as entered) and customer_totals is keyed by
+# customer_id, so per-customer sums group and join on integers instead of
+# hashing names. The migration merges exact duplicates;
+# normalize_customers() also merges names that differ only in case or
+# whitespace. Customers stay when their last invoice goes, so the keys
+# are stable.
+def _customer_id_sql(name):
+    return f"(SELECT id FROM customers WHERE name = IFNULL({name}, ''))"
+
+
+_ENSURE_CUSTOMER_SQL = "INSERT OR IGNORE INTO customers (name) VALUES (IFNULL({0}.name, ''));"
+
+
+def _customer_totals_trigger_sql(sign, row):
+    cents = f"IFNULL({AMOUNT_CENTS_SQL.format(row + '.amount')}, 0)"
+    return f"""
+        {_ENSURE_CUSTOMER_SQL.format(row)}
+        INSERT INTO customer_totals (customer_id, total_cents, invoices)
+        VALUES ({_customer_id_sql(row + ".name")}, {sign}{cents}, {sign}1)
+        ON CONFLICT(customer_id) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                               invoices = invoices + excluded.invoices;
+    """
+
+
+def _create_customer_summary_triggers(cur):
+    prune = _prune_sql("OLD", f"customer_id = {_customer_id_sql('OLD.name')}")
+    cur.execute(f"""CREATE TRIGGER timologia_summary_ai
+                    AFTER INSERT ON timologia
+                    BEGIN {_customer_totals_trigger_sql("", "NEW")} {_monthly_totals_trigger_sql("", "NEW")} END""")
+    cur.execute(f"""CREATE TRIGGER timologia_summary_ad
+                    AFTER DELETE ON timologia
+                    BEGIN
+                        {_customer_totals_trigger_sql("-", "OLD")} {_monthly_totals_trigger_sql("-", "OLD")}
+                        {prune}
+                    END""")
+    cur.execute(f"""CREATE TRIGGER timologia_summary_au
+                    AFTER UPDATE OF name, amount, date ON timologia
+                    BEGIN
+                        {_customer_totals_trigger_sql("-", "OLD")} {_monthly_totals_trigger_sql("-", "OLD")}
+                        {_customer_totals_trigger_sql("", "NEW")} {_monthly_totals_trigger_sql("", "NEW")}
+                        {prune}
+                    END""")
+
+
+def _fill_customers(conn):
+    conn.execute("INSERT OR IGNORE INTO customers (name) SELECT DISTINCT IFNULL(name, '') FROM timologia")
+
+
+def _fill_customer_totals(conn):
+    conn.execute("""INSERT INTO customer_totals (customer_id, total_cents, invoices)
+                    SELECT customer_id, IFNULL(SUM(amount_cents), 0), COUNT(*)
+                    FROM timologia GROUP BY customer_id""")
+
+
+def _migrate_customers(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("""CREATE TABLE IF NOT EXISTS customers (
+                        id INTEGER PRIMARY KEY,
+                        name TEXT NOT NULL UNIQUE
+                   )""")
+    if "customer_id" not in columns(cur):
+        cur.execute("ALTER TABLE timologia ADD COLUMN customer_id INTEGER")
+    set_customer = f"""{_ENSURE_CUSTOMER_SQL.format("NEW")}
+                       UPDATE timologia SET customer_id = {_customer_id_sql("NEW.name")}
+                       WHERE rowid = NEW.rowid;"""
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_customer_ai
+                    AFTER INSERT ON timologia
+                    BEGIN {set_customer} END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_customer_au
+                    AFTER UPDATE OF name ON timologia
+                    BEGIN {set_customer} END""")
+    conn.commit()
+    _fill_customers(conn)
+    conn.commit()
+    backfill(conn, f"customer_id = {_customer_id_sql('timologia.name')}", batch_size, progress)
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_customer ON timologia(customer_id, amount_cents)")
+    # customer_totals by customer_id, in one transaction with its triggers
+    with conn:
+        for trigger in ("timologia_summary_ai", "timologia_summary_ad", "timologia_summary_au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        cur.execute("DROP TABLE IF EXISTS customer_totals")
+        cur.execute("""CREATE TABLE customer_totals (
+                            customer_id INTEGER PRIMARY KEY,
+                            total_cents INTEGER NOT NULL,
+                            invoices INTEGER NOT NULL
+                       )""")
+        cur.execute("CREATE INDEX idx_customer_totals_total ON customer_totals(total_cents)")
+        _create_customer_summary_triggers(cur)
+        _fill_customer_totals(conn)
+
+
+def customer_key(name):
+    # Names that differ only in case or whitespace are the same customer
+    return " ".join((name or "").split()).casefold()
+
+
+def normalize_customers(conn, dry_run=False):
+    # Merge customers whose names differ only in case or whitespace into
+    # the spelling with the most invoices (whitespace tidied), rewriting
+    # the name on their invoices. Returns {kept name: [merged names]}.
+    counts = dict(conn.execute("SELECT customer_id, invoices FROM customer_totals"))
+    groups = {}
+    for cid, name in conn.execute("SELECT id, name FROM customers"):
+        groups.setdefault(customer_key(name), []).append((counts.get(cid, 0), name))
+    merges = {}
+    for spellings in groups.values():
+        spellings.sort(key=lambda s: (-s[0], s[1]))
+        keep = " ".join(spellings[0][1].split())
+        others = [name for _, name in spellings if name != keep]
+        if others:
+            merges[keep] = others
+    if not dry_run:
+        with conn:
+            for keep, others in merges.items():
+                conn.executemany("UPDATE timologia SET name = ? WHERE name = ?", [(keep, o) for o in others])
+                conn.executemany("DELETE FROM customers WHERE name = ?", [(o,) for o in others])
+    return merges
+
+
+# Version 8: covering index for the per-customer view of the dashboard
+# (/api/customers/{name}). Count, total, first/last date and the monthly
+# history of a customer are all read from (name, date_iso, amount_cents),
+# so a lookup only touches that customer's index entries, never the
+# table. It also serves every lookup (name, amount_cents) did.
+def _migrate_customer_history(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_timologia_name_date ON timologia(name, date_iso, amount_cents)")
+    cur.execute("DROP INDEX IF EXISTS idx_timologia_name_amount")
+    conn.commit()
+
+
+# Version 9: totals per month and customer (customer_monthly) and per
+# month and product (product_monthly), for the summary over a date window
+# (/api/summary?from=&to=). A window adds up the rollups of the whole
+# months inside it and only reads invoices for the days before and after
+# them, from the (date_iso, customer_id, amount_cents) index, which
+# replaces (date_iso, amount_cents). Each invoice line carries the month
+# of its invoice (invoice_items.month), set by triggers when the line is
+# written or the invoice date changes, so product_monthly is kept by
+# triggers on invoice_items like product_totals. Keys whose count drops
+# to 0 are deleted by key, not by scanning the table.
+def _month_sql(row):
+    return f"substr({iso_date_sql(row + '.date')}, 1, 7)"
+
+
+def _customer_monthly_sql(sign, row):
+    cents = f"IFNULL({AMOUNT_CENTS_SQL.format(row + '.amount')}, 0)"
+    month = _month_sql(row)
+    customer = _customer_id_sql(row + ".name")
+    sql = f"""
+        {_ENSURE_CUSTOMER_SQL.format(row)}
+        INSERT INTO customer_monthly (month, customer_id, total_cents, invoices)
+        SELECT m, {customer}, {sign}{cents}, {sign}1 FROM (SELECT {month} AS m) WHERE m IS NOT NULL
+        ON CONFLICT(month, customer_id) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                                      invoices = invoices + excluded.invoices;
+    """
+    if sign:
+        sql += f"""
+        DELETE FROM customer_monthly WHERE month = {month} AND customer_id = {customer} AND invoices <= 0;
+    """
+    return sql
+
+
+def _product_monthly_sql(sign, row):
+    sql = f"""
+        INSERT INTO product_monthly (month, product, total_cents, lines)
+        SELECT {row}.month, {row}.description, {sign}{row}.share_cents, {sign}1 WHERE {row}.month IS NOT NULL
+        ON CONFLICT(month, product) DO UPDATE SET total_cents = total_cents + excluded.total_cents,
+                                                  lines = lines + excluded.lines;
+    """
+    if sign:
+        sql += f"""
+        DELETE FROM product_monthly WHERE month = {row}.month AND product = {row}.description AND lines <= 0;
+    """
+    return sql
+
+
+_ITEMS_MONTH_SQL = f"""UPDATE invoice_items SET month = (
+                           SELECT {_month_sql("t")} FROM timologia t WHERE t.id = invoice_items.invoice_id)"""
+
+
+def _fill_monthly_rollups(conn):
+    conn.execute("DELETE FROM customer_monthly")
+    conn.execute("""INSERT INTO customer_monthly (month, customer_id, total_cents, invoices)
+                    SELECT substr(date_iso, 1, 7) AS m, customer_id, IFNULL(SUM(amount_cents), 0), COUNT(*)
+                    FROM timologia WHERE date_iso IS NOT NULL GROUP BY m, customer_id""")
+    conn.execute("DELETE FROM product_monthly")
+    conn.execute("""INSERT INTO product_monthly (month, product, total_cents, lines)
+                    SELECT month, description, SUM(share_cents), COUNT(*)
+                    FROM invoice_items WHERE month IS NOT NULL GROUP BY month, description""")
+
+
+def _migrate_summary_window(conn, batch_size, progress):
+    cur = conn.cursor()
+    cur.execute("""CREATE INDEX IF NOT EXISTS idx_timologia_date_customer
+                   ON timologia(date_iso, customer_id, amount_cents)""")
+    cur.execute("DROP INDEX IF EXISTS idx_timologia_date_iso")
+    if "month" not in columns(cur, "invoice_items"):
+        cur.execute("ALTER TABLE invoice_items ADD COLUMN month TEXT")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_month_ai
+                    AFTER INSERT ON invoice_items
+                    BEGIN
+                        {_ITEMS_MONTH_SQL} WHERE invoice_id = NEW.invoice_id AND position = NEW.position;
+                    END""")
+    cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_items_month_au
+                    AFTER UPDATE OF date ON timologia
+                    BEGIN
+                        UPDATE invoice_items SET month = {_month_sql("NEW")} WHERE invoice_id = NEW.id;
+                    END""")
+    conn.commit()
+    # Lines written since the triggers exist already have their month
+    batched(conn, f"""{_ITEMS_MONTH_SQL}
+                      WHERE invoice_id IN (SELECT id FROM timologia WHERE rowid > ? AND rowid <= ?)""",
+            batch_size, progress)
+    # The rollups, in one transaction with their triggers
+    with conn:
+        cur.execute("""CREATE TABLE IF NOT EXISTS customer_monthly (
+                            month TEXT NOT NULL,
+                            customer_id INTEGER NOT NULL,
+                            total_cents INTEGER NOT NULL,
+                            invoices INTEGER NOT NULL,
+                            PRIMARY KEY (month, customer_id)
+                       ) WITHOUT ROWID""")
+        cur.execute("""CREATE TABLE IF NOT EXISTS product_monthly (
+                            month TEXT NOT NULL,
+                            product TEXT NOT NULL,
+                            total_cents INTEGER NOT NULL,
+                            lines INTEGER NOT NULL,
+                            PRIMARY KEY (month, product)
+                       ) WITHOUT ROWID""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_monthly_ai
+                        AFTER INSERT ON timologia
+                        BEGIN {_customer_monthly_sql("", "NEW")} END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_monthly_ad
+                        AFTER DELETE ON timologia
+                        BEGIN {_customer_monthly_sql("-", "OLD")} END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS timologia_monthly_au
+                        AFTER UPDATE OF name, amount, date ON timologia
+                        BEGIN {_customer_monthly_sql("-", "OLD")} {_customer_monthly_sql("", "NEW")} END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_monthly_ai
+                        AFTER INSERT ON invoice_items
+                        BEGIN {_product_monthly_sql("", "NEW")} END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_monthly_ad
+                        AFTER DELETE ON invoice_items
+                        BEGIN {_product_monthly_sql("-", "OLD")} END""")
+        cur.execute(f"""CREATE TRIGGER IF NOT EXISTS invoice_items_monthly_au
+                        AFTER UPDATE OF description, share_cents, month ON invoice_items
+                        BEGIN {_product_monthly_sql("-", "OLD")} {_product_monthly_sql("", "NEW")} END""")
+        _fill_monthly_rollups(conn)
+
+
+# Version 10: the summary triggers delete a customer or month whose
+# count drops to 0 by its key, instead of scanning customer_totals and
+# monthly_totals on every delete and update.
+def _migrate_keyed_prune(conn, batch_size, progress):
+    with conn:
+        cur = conn.cursor()
+        for trigger in ("timologia_summary_ai", "timologia_summary_ad", "timologia_summary_au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        _create_customer_summary_triggers(cur)
+
+
+# Version 11: the same for product_totals, whose triggers scanned the
+# whole table on every invoice_items delete and update.
+def _migrate_keyed_product_prune(conn, batch_size, progress):
+    with conn:
+        cur = conn.cursor()
+        for trigger in ("invoice_items_totals_ad", "invoice_items_totals_au"):
+            cur.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        _create_product_totals_triggers(cur)
+
+
+MIGRATIONS = [
+    (1, _migrate_amount_cents),
+    (2, _migrate_date_iso),
+    (3, _migrate_summary_tables),
+    (4, _migrate_fts),
+    (5, _migrate_keyset_indexes),
+    (6, _migrate_invoice_items),
+    (7, _migrate_customers),
+    (8, _migrate_customer_history),
+    (9, _migrate_summary_window),
+    (10, _migrate_keyed_prune),
+    (11, _migrate_keyed_product_prune),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn, batch_size=BATCH_SIZE, progress=None):
+    # Bring the database up to SCHEMA_VERSION. Each step is idempotent,
+    # so an interrupted migration is simply run again on the next start.
+    create_table(conn.cursor())
+    conn.commit()
+    current = schema_version(conn)
+    for version, step in MIGRATIONS:
+        if version > current:
+            step(conn, batch_size, progress)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+    return schema_version(conn)
+
+
+# CSV export
+# Streams the table through csv.writer in fetchmany batches, so memory
+# stays bounded whatever the table size; csv.writer quotes the JSON
+# description arrays (which contain commas) properly. A path ending in
+# .gz (or compress=True) writes gzip.
+EXPORT_HEADER = ["ID", "Name", "Description", "Amount", "Date"]
+EXPORT_BUFFER = 1 << 20
+
+
+def export_csv(conn, path, batch_size=BATCH_SIZE, compress=None, progress=None, cancelled=None, cursor=None):
+    # progress(done, total) is called after every batch; cancelled() -> True
+    # stops the export with InterruptedError. cursor is an executed query
+    # over (id, name, description, amount, date), by default the whole
+    # table in rowid order. Returns the number of rows written. A cancelled
+    # or failed export removes its file, so no truncated CSV is left.
+    if compress is None:
+        compress = path.endswith(".gz")
+    total = conn.execute("SELECT COUNT(*) FROM timologia").fetchone()[0]
+    if compress:
+        file = gzip.open(path, "wt", encoding="utf-8", newline="", compresslevel=6)
+    else:
+        file = open(path, "w", encoding="utf-8", newline="", buffering=EXPORT_BUFFER)
+    done = 0
+    try:
+        with file:
+            writer = csv.writer(file)
+            writer.writerow(EXPORT_HEADER)
+            cur = cursor
+            if cur is None:
+                cur = conn.execute("SELECT id, name, description, amount, date FROM timologia ORDER BY rowid")
+            while True:
+                batch = cur.fetchmany(batch_size)
+                if not batch:
+                    break
+                writer.writerows(batch)
+                done += len(batch)
+                if progress:
+                    progress(done, total)
+                if cancelled and cancelled():
+                    raise InterruptedError("export cancelled")
+    except BaseException:
+        os.remove(path)
+        raise
+    return done
+
+
+# CSV import
+# Replaces the contents of timologia with a CSV file as a stream: rows are
+# parsed lazily, inserted with executemany in chunks and the whole load is
+# a single transaction, so a bad file (e.g. a duplicate ID) leaves the
+# old data untouched. While loading, synchronous is OFF and, unless the
+# database is in WAL mode, the rollback journal is kept in memory.
+# The per-row triggers are dropped for the load and the derived data
+# (typed columns, summaries, full-text index) is rebuilt once at the end,
+# inside the same transaction.
+IMPORT_CHUNK = 5000
+
+
+def _find_col(header_lower, *names):
+    for n in names:
+        if n in header_lower:
+            return header_lower.index(n)
+    return None
+
+
+def parse_description(raw):
+    # Description cell -> list of items. Accepts a JSON array (what the
+    # export writes) or items separated by '|', newlines or commas.
+    raw = raw.strip()
+    if raw == "":
+        return []
+    if raw.startswith("["):
+        try:
+            items = json.loads(raw)
+            if isinstance(items, list):
+                return [str(i) for i in items if i is not None and str(i).strip()]
+        except json.JSONDecodeError:
+            pass
+    if "|" in raw:
+        return [i.strip() for i in raw.split("|") if i.strip()]
+    if "\n" in raw:
+        return [i.strip() for i in raw.splitlines() if i.strip()]
+    if "," in raw and len(raw.split(",")) > 1:
+        return [i.strip() for i in raw.split(",") if i.strip()]
+    return [raw]
+
+
+def read_csv_rows(path, progress=None):
+    # Generator of (id, name, description_json, amount, date) tuples.
+    # The file is read as bytes so progress(bytes_read, file_size) can be
+    # reported while csv.reader pulls lines.
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        state = {"read": 0}
+
+        def lines():
+            first = True
+            for raw in f:
+                state["read"] += len(raw)
+                line = raw.decode("utf-8-sig" if first else "utf-8")
+                first = False
+                yield line
+
+        reader = csv.reader(lines())
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("CSV file is empty")
+        header_lower = [h.strip().lower() for h in header]
+        id_idx = _find_col(header_lower, "id", "issue number", "issue_number", "issue-number")
+        name_idx = _find_col(header_lower, "name")
+        desc_idx = _find_col(header_lower, "description", "descrip", "details")
+        amount_idx = _find_col(header_lower, "amount", "qty", "euro", "price")
+        date_idx = _find_col(header_lower, "date")
+        if id_idx is None or name_idx is None:
+            raise ValueError("CSV must contain at least 'ID' and 'Name' columns")
+
+        def cell(r, idx):
+            return r[idx].strip() if idx is not None and idx < len(r) else ""
+
+        for i, r in enumerate(reader):
+            if not r:
+                continue
+            desc = json.dumps(parse_description(cell(r, desc_idx)), ensure_ascii=False)
+            yield (cell(r, id_idx), cell(r, name_idx), desc, cell(r, amount_idx), cell(r, date_idx))
+            if progress and i % IMPORT_CHUNK == 0:
+                progress(state["read"], size)
+        if progress:
+            progress(size, size)
+
+
+def refresh_derived(conn):
+    # Recompute everything the timologia triggers normally maintain
+    _fill_customers(conn)
+    conn.execute(f"UPDATE timologia SET amount_cents = {AMOUNT_CENTS_SQL.format('amount')}, "
+                 f"date_iso = {iso_date_sql('date')}, customer_id = {_customer_id_sql('timologia.name')}")
+    _fill_summaries(conn)
+    conn.execute("DELETE FROM invoice_fts")
+    conn.execute(f"""INSERT INTO invoice_fts (rowid, id, name, items)
+                     SELECT rowid, id, {strip_greek_accents_sql("name")},
+                            {strip_greek_accents_sql(description_items_sql("description"))}
+                     FROM timologia""")
+    conn.execute("DELETE FROM invoice_items")
+    conn.execute(f"{ITEMS_INSERT_SQL} {invoice_items_select_sql('t', from_table=True)}")
+    conn.execute(_ITEMS_MONTH_SQL)
+    _fill_product_totals(conn)
+    _fill_monthly_rollups(conn)
+
+
+def import_csv(conn, path, chunk_size=IMPORT_CHUNK, progress=None, cancelled=None):
+    # Replace all invoices with the rows of the CSV file at path.
+    # progress(bytes_read, file_size); cancelled() -> True rolls back.
+    # Returns the number of rows imported.
+    migrate(conn)
+    journal = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    cache_size = conn.execute("PRAGMA cache_size").fetchone()[0]
+    conn.execute("PRAGMA synchronous = OFF")
+    if journal.lower() != "wal":
+        conn.execute("PRAGMA journal_mode = MEMORY")
+    conn.execute("PRAGMA cache_size = -131072")   # 128 MB for the load
+    rows = read_csv_rows(path, progress)
+    n = 0
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        triggers = conn.execute("SELECT name, sql FROM sqlite_master "
+                                "WHERE type = 'trigger' AND tbl_name IN ('timologia', 'invoice_items')").fetchall()
+        for name, _ in triggers:
+            conn.execute(f"DROP TRIGGER {name}")
+        conn.execute("DELETE FROM timologia")
+        insert_stmt = "INSERT INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, ?)"
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                break
+            conn.executemany(insert_stmt, chunk)
+            n += len(chunk)
+            if cancelled and cancelled():
+                raise InterruptedError("import cancelled")
+        # derived tables first: with the triggers back, the rebuild of
+        # invoice_items would update totals that it then recomputes
+        refresh_derived(conn)
+        for _, sql in triggers:
+            conn.execute(sql)
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        conn.execute(f"PRAGMA synchronous = {synchronous}")
+        if journal.lower() != "wal":
+            conn.execute(f"PRAGMA journal_mode = {journal}")
+        conn.execute(f"PRAGMA cache_size = {cache_size}")
+    return n
+
+
+# The CLI (timologia.py) used to keep its invoices in a file called
+# "timologia", in an ID/TITLE/Author/Qty table. import_legacy copies them
+# into timologia: ID -> id, Author -> name, TITLE -> one description
+# item, Qty -> amount, no date. Invoices whose ID exists are skipped.
+LEGACY_CLI_DB = "timologia"
+
+
+def import_legacy(conn, legacy_path=LEGACY_CLI_DB):
+    # Returns the number of invoices copied
+    migrate(conn)
+    src = sqlite3.connect(legacy_path)
+    try:
+        rows = src.execute("SELECT ID, TITLE, Author, Qty FROM timologia ORDER BY ID").fetchall()
+    finally:
+        src.close()
+    with conn:
+        cur = conn.executemany(
+            "INSERT OR IGNORE INTO timologia (id, name, description, amount, date) VALUES (?, ?, ?, ?, NULL)",
+            [(str(i), author, json.dumps([title] if title else [], ensure_ascii=False),
+              "" if qty is None else str(qty)) for i, title, author, qty in rows])
+    return cur.rowcount
+
+
+usage_message = """usage: python timologia_db.py COMMAND [database]
+  migrate   bring the database to the current schema version
+  rebuild   recompute the customer/monthly summary tables
+  check     compare the summary tables with the invoices
+  export    write all invoices to CSV: export [database] [output.csv | output.csv.gz]
+  import    replace all invoices with a CSV file: import [database] input.csv
+  legacy    copy the invoices of the old CLI file: legacy [database] [timologia]
+  customers list customer names that differ only in case or whitespace:
+            customers [database] [--merge] (--merge: merge each group into its most used spelling)
+"""
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if not args or args[0] not in ("migrate", "rebuild", "check", "export", "import", "legacy", "customers"):
+        print(usage_message)
+        sys.exit(1)
+    command = args[0]
+    path = args[1] if len(args) > 1 else DB_FILE
+    if command == "export":
+        # python timologia_db.py export [database] [output.csv[.gz]]
+        out = args[2] if len(args) > 2 else "timologia_export.csv"
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        n = export_csv(conn, out, progress=lambda done, total: print(f"  {done}/{total} rows", end="\r"))
+        conn.close()
+        print(f"\n{out}: {n} rows ({time.perf_counter() - t0:.2f}s)")
+        sys.exit(0)
+    if command == "import":
+        if len(args) < 3:
+            print(usage_message)
+            sys.exit(1)
+        conn = sqlite3.connect(path)
+        t0 = time.perf_counter()
+        n = import_csv(conn, args[2])
+        conn.close()
+        print(f"{path}: imported {n} rows from {args[2]} ({time.perf_counter() - t0:.2f}s)")
+        sys.exit(0)
+    if command == "legacy":
+        src = args[2] if len(args) > 2 else LEGACY_CLI_DB
+        conn = sqlite3.connect(path)
+        n = import_legacy(conn, src)
+        conn.close()
+        print(f"{path}: copied {n} invoices from {src}")
+        sys.exit(0)
+    conn = sqlite3.connect(path)
+    t0 = time.perf_counter()
+    version = migrate(conn, progress=lambda done, total: print(f"  {done}/{total} rows", end="\r"))
+    if command == "migrate":
+        print(f"\n{path}: schema version {version} ({time.perf_counter() - t0:.2f}s)")
+    elif command == "customers":
+        # python timologia_db.py customers [database] [--merge]
+        merge = "--merge" in args[2:]
+        merges = normalize_customers(conn, dry_run=not merge)
+        for keep, others in sorted(merges.items()):
+            print(f"{keep!r} <- {', '.join(repr(o) for o in others)}")
+        print(f"{path}: {len(merges)} customers {'merged' if merge else 'to merge (use --merge)'}")
+    elif command == "rebuild":
+        rebuild_summaries(conn)
+        print(f"{path}: summary tables rebuilt ({time.perf_counter() - t0:.2f}s)")
+    else:
+        problems = check_summaries(conn)
+        for table, key, stored, actual in problems:
+            print(f"{table}[{key!r}]: stored {stored}, actual {actual}")
+        print(f"{path}: {len(problems)} inconsistencies")
+        conn.close()
+        sys.exit(1 if problems else 0)
+    conn.close()
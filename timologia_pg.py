@@ -0,0 +1,469 @@
+# timologia_pg.py
+# PostgreSQL backend for the invoices, for when a single timologia.db on
+# a network drive is no longer enough. Selected by giving the front ends
+# a postgresql:// URL instead of a file, e.g.
+# TIMOLOGIA_DB=postgresql://shop@dbserver/timologia python timologia-gui.py
+# SQLite stays the default; this module is only imported for a URL and
+# needs psycopg 3 (pip install "psycopg[binary]" psycopg_pool).
+#
+# PgRepository has the interface of timologia_repo.Repository and runs
+# the same SQL where the dialects agree. PgConnection wraps a psycopg
+# connection in the part of the sqlite3 API the repository uses ("?"
+# placeholders, `with conn:` transactions, sqlite3.IntegrityError for a
+# duplicate ID), so the front ends do not know which backend they use.
+# psycopg prepares a statement on the server once it has been run a few
+# times on a connection, as sqlite3's statement cache does.
+#
+# The schema mirrors the SQLite one: a BEFORE trigger fills amount_cents,
+# date_iso and the full-text search vector, a rowid identity column keeps
+# insertion order for the GUI's table model, and a statement trigger
+# bumps timologia_version, the counterpart of PRAGMA data_version for the
+# dashboard's response cache. A row trigger keeps invoice_items in step
+# with the descriptions. Totals, top customers and top products are
+# GROUP BY queries on indexes instead of summary tables.
+# Whole-table reads (iter_all, CSV export) use
+# server-side cursors, so rows are fetched in batches; the CSV import
+# loads with COPY.
+import re
+import sqlite3
+
+import timologia_db
+import timologia_repo
+from timologia_repo import COLUMNS_SQL
+
+try:
+    import psycopg
+except ImportError:     # optional: only needed for a postgresql:// URL
+    psycopg = None
+
+try:
+    import psycopg_pool
+except ImportError:
+    psycopg_pool = None
+
+
+def require(module, package):
+    if module is None:
+        raise RuntimeError(f"A postgresql:// database needs the {package} package (pip install {package})")
+    return module
+
+
+class PgRow(tuple):
+    # Row by position or by column name, like sqlite3.Row
+    def __new__(cls, values, names):
+        row = super().__new__(cls, values)
+        row._names = names
+        return row
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._names.index(key)
+        return super().__getitem__(key)
+
+    def keys(self):
+        return list(self._names)
+
+
+def pg_row(cursor):
+    names = [c.name for c in cursor.description] if cursor.description else []
+    return lambda values: PgRow(values, names)
+
+
+def pg_sql(sql):
+    # "?" placeholders -> psycopg's "%s" (a literal % has to be doubled)
+    return sql.replace("%", "%%").replace("?", "%s")
+
+
+class PgConnection:
+    def __init__(self, raw):
+        self.raw = raw
+        self._transactions = []
+
+    def _run(self, method, sql, params):
+        cur = self.raw.cursor()
+        try:
+            getattr(cur, method)(pg_sql(sql), params)
+        except psycopg.errors.UniqueViolation as e:
+            raise sqlite3.IntegrityError(str(e)) from e
+        return cur
+
+    def execute(self, sql, params=()):
+        return self._run("execute", sql, tuple(params))
+
+    def executemany(self, sql, seq_of_params):
+        return self._run("executemany", sql, list(seq_of_params))
+
+    def server_cursor(self, name, batch_size=timologia_db.BATCH_SIZE):
+        # A named (server-side) cursor: rows stay on the server and are
+        # fetched batch_size at a time. Must be used inside a transaction.
+        cur = self.raw.cursor(name=name)
+        cur.itersize = batch_size
+        return cur
+
+    def transaction(self):
+        return self.raw.transaction()
+
+    # Connections run in autocommit mode, `with conn:` is a transaction
+    def __enter__(self):
+        tx = self.raw.transaction()
+        tx.__enter__()
+        self._transactions.append(tx)
+        return self
+
+    def __exit__(self, *exc):
+        return self._transactions.pop().__exit__(*exc)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.raw.close()
+
+
+def connect(url, readonly=False):
+    require(psycopg, "psycopg")
+    options = "-c default_transaction_read_only=on" if readonly else None
+    raw = psycopg.connect(url, autocommit=True, row_factory=pg_row, options=options)
+    return PgConnection(raw)
+
+
+def open_repository(url, readonly=False):
+    return PgRepository(connect(url, readonly=readonly))
+
+
+def create_pool(url, min_size=1, max_size=4, timeout=10.0, max_lifetime=300.0, readonly=True):
+    # psycopg_pool.ConnectionPool of autocommit connections with PgRow rows;
+    # connections are health-checked when handed out and recycled after
+    # max_lifetime seconds
+    require(psycopg, "psycopg")
+    require(psycopg_pool, "psycopg_pool")
+    kwargs = {"autocommit": True, "row_factory": pg_row}
+    if readonly:
+        kwargs["options"] = "-c default_transaction_read_only=on"
+    return psycopg_pool.ConnectionPool(
+        url, min_size=min_size, max_size=max_size, timeout=timeout, max_lifetime=max_lifetime,
+        kwargs=kwargs, check=psycopg_pool.ConnectionPool.check_connection, open=True)
+
+
+# Schema
+# Same columns as the SQLite table. amount_cents and date_iso follow
+# timologia_db.AMOUNT_CENTS_SQL and iso_date_sql (non-numeric amounts
+# count as 0, DD-MM-YY with the 69 century rule). The search vector
+# weights id, name and description items like the FTS5 bm25 weights and
+# strips Greek accents as the SQLite full-text index does.
+_ACCENTED = "".join(timologia_db.GREEK_ACCENTS)
+_PLAIN = "".join(timologia_db.GREEK_ACCENTS.values())
+
+SCHEMA_SQL = [
+    """CREATE TABLE IF NOT EXISTS timologia (
+        rowid BIGINT GENERATED ALWAYS AS IDENTITY UNIQUE,
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        description TEXT,
+        amount TEXT,
+        date TEXT,
+        amount_cents BIGINT,
+        date_iso TEXT,
+        search TSVECTOR
+    )""",
+    f"""CREATE OR REPLACE FUNCTION timologia_derive() RETURNS trigger AS $$
+    DECLARE
+        parts TEXT[];
+        d INT;
+        m INT;
+        y INT;
+        items TEXT;
+    BEGIN
+        NEW.amount_cents := CASE WHEN NEW.amount IS NOT NULL THEN
+            round(coalesce(substring(NEW.amount FROM '^\\s*([-+]?([0-9]+\\.?[0-9]*|\\.[0-9]+))')::NUMERIC, 0)
+                  * 100)::BIGINT END;
+        NEW.date_iso := NULL;
+        IF NEW.date ~ '^[0-9]{{1,2}}-[0-9]{{1,2}}-[0-9]{{1,4}}$' THEN
+            parts := string_to_array(NEW.date, '-');
+            d := parts[1]::INT;
+            m := parts[2]::INT;
+            y := parts[3]::INT;
+            IF m BETWEEN 1 AND 12 AND d BETWEEN 1 AND 31 THEN
+                y := CASE WHEN y >= 100 THEN y WHEN y >= 69 THEN 1900 + y ELSE 2000 + y END;
+                NEW.date_iso := lpad(y::TEXT, 4, '0') || '-' || lpad(m::TEXT, 2, '0') || '-' || lpad(d::TEXT, 2, '0');
+            END IF;
+        END IF;
+        BEGIN
+            SELECT string_agg(value, ' ') INTO items FROM jsonb_array_elements_text(NEW.description::JSONB);
+        EXCEPTION WHEN OTHERS THEN
+            items := NEW.description;
+        END;
+        NEW.search := setweight(to_tsvector('simple', translate(lower(coalesce(NEW.id, '')), '{_ACCENTED}', '{_PLAIN}')), 'A')
+                   || setweight(to_tsvector('simple', translate(lower(coalesce(NEW.name, '')), '{_ACCENTED}', '{_PLAIN}')), 'B')
+                   || setweight(to_tsvector('simple', translate(lower(coalesce(items, '')), '{_ACCENTED}', '{_PLAIN}')), 'D');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql""",
+    """CREATE TABLE IF NOT EXISTS invoice_items (
+        invoice_id TEXT NOT NULL,
+        position INT NOT NULL,
+        description TEXT NOT NULL,
+        amount_cents BIGINT,
+        share_cents BIGINT NOT NULL DEFAULT 0,
+        PRIMARY KEY (invoice_id, position)
+    )""",
+    "CREATE INDEX IF NOT EXISTS idx_invoice_items_description ON invoice_items(description, share_cents)",
+    """CREATE OR REPLACE FUNCTION timologia_reshare(invoice TEXT) RETURNS void AS $$
+        UPDATE invoice_items SET share_cents = COALESCE(amount_cents, round(
+            (COALESCE((SELECT amount_cents FROM timologia WHERE id = invoice), 0)
+             - (SELECT COALESCE(SUM(x.amount_cents), 0) FROM invoice_items x WHERE x.invoice_id = invoice))::NUMERIC
+            / NULLIF((SELECT COUNT(*) FROM invoice_items x
+                      WHERE x.invoice_id = invoice AND x.amount_cents IS NULL), 0))::BIGINT, 0)
+        WHERE invoice_id = invoice
+    $$ LANGUAGE sql""",
+    """CREATE OR REPLACE FUNCTION timologia_items() RETURNS trigger AS $$
+    DECLARE
+        items JSONB;
+    BEGIN
+        IF TG_OP = 'DELETE' THEN
+            DELETE FROM invoice_items WHERE invoice_id = OLD.id;
+            RETURN NULL;
+        END IF;
+        BEGIN
+            items := NEW.description::JSONB;
+        EXCEPTION WHEN OTHERS THEN
+            items := NULL;
+        END;
+        IF items IS NULL OR jsonb_typeof(items) <> 'array' THEN
+            items := jsonb_build_array(NEW.description);
+        END IF;
+        IF TG_OP = 'UPDATE' THEN
+            DELETE FROM invoice_items i
+            WHERE i.invoice_id = OLD.id
+              AND (NEW.id IS DISTINCT FROM OLD.id OR NOT EXISTS (
+                    SELECT 1 FROM jsonb_array_elements(items) WITH ORDINALITY AS e(value, n)
+                    WHERE e.n - 1 = i.position AND jsonb_typeof(e.value) = 'string'
+                      AND e.value #>> '{}' = i.description));
+        END IF;
+        INSERT INTO invoice_items (invoice_id, position, description)
+        SELECT NEW.id, e.n - 1, e.value #>> '{}'
+        FROM jsonb_array_elements(items) WITH ORDINALITY AS e(value, n)
+        WHERE jsonb_typeof(e.value) = 'string' AND e.value #>> '{}' <> ''
+        ON CONFLICT DO NOTHING;
+        PERFORM timologia_reshare(NEW.id);
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "CREATE SEQUENCE IF NOT EXISTS timologia_version",
+    """CREATE OR REPLACE FUNCTION timologia_bump_version() RETURNS trigger AS $$
+    BEGIN
+        PERFORM nextval('timologia_version');
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql""",
+    "DROP TRIGGER IF EXISTS timologia_derive ON timologia",
+    """CREATE TRIGGER timologia_derive BEFORE INSERT OR UPDATE ON timologia
+       FOR EACH ROW EXECUTE FUNCTION timologia_derive()""",
+    "DROP TRIGGER IF EXISTS timologia_items ON timologia",
+    """CREATE TRIGGER timologia_items AFTER INSERT OR DELETE OR UPDATE OF id, description, amount ON timologia
+       FOR EACH ROW EXECUTE FUNCTION timologia_items()""",
+    "DROP TRIGGER IF EXISTS timologia_version ON timologia",
+    """CREATE TRIGGER timologia_version AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON timologia
+       FOR EACH STATEMENT EXECUTE FUNCTION timologia_bump_version()""",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_amount_cents ON timologia(amount_cents)",
+    "DROP INDEX IF EXISTS idx_timologia_name_amount",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_name_date ON timologia(name, date_iso, amount_cents)",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_date_amount ON timologia(date_iso, amount_cents)",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_date_id ON timologia(date_iso, id)",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_name_id ON timologia(name, id)",
+    "CREATE INDEX IF NOT EXISTS idx_timologia_search ON timologia USING GIN (search)",
+]
+
+
+def create_schema(conn):
+    # Idempotent, in one transaction; the advisory lock keeps two front
+    # ends starting at the same time from racing on CREATE OR REPLACE
+    with conn.transaction():
+        conn.raw.execute("SELECT pg_advisory_xact_lock(hashtext('timologia_schema'))")
+        for sql in SCHEMA_SQL:
+            conn.raw.execute(sql)
+
+
+def ts_query(text):
+    # Every word as a prefix, all words required (like timologia_db.fts_query)
+    text = "".join(timologia_db.GREEK_ACCENTS.get(ch, ch) for ch in text.lower())
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    return " & ".join(f"'{w}':*" for w in words)
+
+
+SEARCH_SQL = f"""
+    SELECT rowid, {COLUMNS_SQL}, -ts_rank_cd(search, q) AS score
+    FROM timologia, to_tsquery('simple', ?) AS q
+    WHERE search @@ q
+    ORDER BY score, rowid
+    LIMIT ? OFFSET ?
+"""
+# The summary queries are computed from timologia (there are no
+# materialized totals); {where} is empty or the date window condition
+# WINDOW_WHERE. ORDER BY ... LIMIT n is a top-n heapsort on the server.
+WINDOW_WHERE = "WHERE date_iso >= ? AND date_iso <= ?"
+TOTAL_SQL = "SELECT COALESCE(SUM(amount_cents), 0)::BIGINT AS tot FROM timologia {where}"
+TOP_CUSTOMERS_SQL = """
+    SELECT COALESCE(name, '') AS name, COALESCE(SUM(amount_cents), 0)::BIGINT AS total_cents
+    FROM timologia {where} GROUP BY 1
+    ORDER BY total_cents DESC, 1 LIMIT ?
+"""
+MOST_EXPENSIVE_SQL = """
+    SELECT id, name, amount, date, description FROM timologia {where}
+    ORDER BY amount_cents DESC NULLS LAST LIMIT 1
+"""
+# Products from invoice_items with the (description, share_cents) index
+TOP_PRODUCTS_SQL = """
+    SELECT description AS product, COUNT(*) AS lines, SUM(share_cents)::BIGINT AS total_cents
+    FROM invoice_items GROUP BY description
+    ORDER BY total_cents DESC, product LIMIT ?
+"""
+WINDOW_TOP_PRODUCTS_SQL = """
+    SELECT i.description AS product, COUNT(*) AS lines, SUM(i.share_cents)::BIGINT AS total_cents
+    FROM timologia t JOIN invoice_items i ON i.invoice_id = t.id
+    WHERE t.date_iso >= ? AND t.date_iso <= ?
+    GROUP BY i.description
+    ORDER BY total_cents DESC, product LIMIT ?
+"""
+TOP_MONTHS_SQL = """
+    SELECT substr(date_iso, 1, 7) AS month, SUM(amount_cents)::BIGINT AS total_cents, COUNT(*) AS invoices
+    FROM timologia {where}
+    GROUP BY month HAVING substr(date_iso, 1, 7) IS NOT NULL
+    ORDER BY total_cents DESC, month LIMIT ?
+"""
+COMPLETION_NAMES_SQL = "SELECT name, COUNT(*) FROM timologia WHERE name <> '' GROUP BY name"
+COMPLETION_ITEMS_SQL = "SELECT description, COUNT(*) FROM invoice_items GROUP BY description"
+REVENUE_SQL = """
+    SELECT substr(date_iso, 1, ?) AS period, SUM(amount_cents)::BIGINT AS tot, COUNT(*) AS n
+    FROM timologia
+    WHERE date_iso >= ? AND date_iso <= ?
+    GROUP BY period ORDER BY period
+"""
+CUSTOMER_SQL = """
+    SELECT COUNT(*) AS n, SUM(amount_cents)::BIGINT AS tot, MIN(date_iso) AS first, MAX(date_iso) AS last
+    FROM timologia WHERE name = ?
+"""
+CUSTOMER_MONTHLY_SQL = """
+    SELECT substr(date_iso, 1, 7) AS month, SUM(amount_cents)::BIGINT AS tot, COUNT(*) AS n
+    FROM timologia
+    WHERE name = ? AND date_iso IS NOT NULL
+    GROUP BY month ORDER BY month
+"""
+
+
+class PgRepository(timologia_repo.Repository):
+    def migrate(self, **kw):
+        create_schema(self.conn)
+
+    def data_version(self):
+        return self.conn.execute("SELECT last_value FROM timologia_version").fetchone()[0]
+
+    def checkpoint(self, mode="PASSIVE"):
+        # The server checkpoints by itself
+        return (0, 0, 0)
+
+    def explain(self, sql, params=()):
+        return [r[0] for r in self.conn.execute("EXPLAIN " + sql, params).fetchall()]
+
+    def iter_all(self, batch_size=timologia_db.BATCH_SIZE):
+        with self.conn.transaction():
+            with self.conn.server_cursor("timologia_iter_all", batch_size) as cur:
+                cur.execute(f"SELECT {COLUMNS_SQL} FROM timologia ORDER BY rowid")
+                yield from cur
+
+    def search(self, text, limit=-1, offset=0):
+        query = ts_query(text)
+        if query is None:
+            return []
+        return self.conn.execute(SEARCH_SQL, (query, None if limit < 0 else limit, offset)).fetchall()
+
+    def search_rowids(self, text):
+        query = ts_query(text)
+        if query is None:
+            return []
+        return [r[0] for r in self.conn.execute(
+            "SELECT rowid FROM timologia, to_tsquery('simple', ?) AS q WHERE search @@ q "
+            "ORDER BY -ts_rank_cd(search, q), rowid", (query,))]
+
+    def search_count(self, text):
+        query = ts_query(text)
+        if query is None:
+            return 0
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM timologia WHERE search @@ to_tsquery('simple', ?)", (query,)).fetchone()[0]
+
+    def completion_counts(self):
+        names = self.conn.execute(COMPLETION_NAMES_SQL).fetchall()
+        items = self.conn.execute(COMPLETION_ITEMS_SQL).fetchall()
+        return names, items
+
+    def _summary_query(self, sql, date_from, date_to, args=()):
+        bounds = timologia_repo.window(date_from, date_to)
+        if bounds is None:
+            return self.conn.execute(sql.format(where=""), args)
+        return self.conn.execute(sql.format(where=WINDOW_WHERE), bounds + args)
+
+    def top_products(self, n, date_from=None, date_to=None):
+        bounds = timologia_repo.window(date_from, date_to)
+        if bounds is None:
+            return self.conn.execute(TOP_PRODUCTS_SQL, (n,)).fetchall()
+        return self.conn.execute(WINDOW_TOP_PRODUCTS_SQL, bounds + (n,)).fetchall()
+
+    def top_months(self, n, date_from=None, date_to=None):
+        return self._summary_query(TOP_MONTHS_SQL, date_from, date_to, (n,)).fetchall()
+
+    def total_cents(self, date_from=None, date_to=None):
+        return self._summary_query(TOTAL_SQL, date_from, date_to).fetchone()[0]
+
+    def top_customers(self, n, date_from=None, date_to=None):
+        return self._summary_query(TOP_CUSTOMERS_SQL, date_from, date_to, (n,)).fetchall()
+
+    def most_expensive(self, date_from=None, date_to=None):
+        return self._summary_query(MOST_EXPENSIVE_SQL, date_from, date_to).fetchone()
+
+    def revenue(self, period_len, date_from=None, date_to=None):
+        return self.conn.execute(
+            REVENUE_SQL, (period_len, date_from or "0000-00-00", date_to or "9999-99-99")).fetchall()
+
+    def customer(self, name):
+        return self.conn.execute(CUSTOMER_SQL, (name,)).fetchone()
+
+    def customer_monthly(self, name):
+        return self.conn.execute(CUSTOMER_MONTHLY_SQL, (name,)).fetchall()
+
+    def set_item_amount(self, invoice_id, position, amount_cents):
+        with self.conn:
+            found = self.conn.execute(
+                timologia_repo.SET_ITEM_AMOUNT_SQL, (amount_cents, invoice_id, position)).rowcount > 0
+            self.conn.execute("SELECT timologia_reshare(?)", (invoice_id,))
+        return found
+
+    def export_csv(self, path, batch_size=timologia_db.BATCH_SIZE, **kw):
+        with self.conn.transaction():
+            with self.conn.server_cursor("timologia_export", batch_size) as cur:
+                cur.execute(f"SELECT {COLUMNS_SQL} FROM timologia ORDER BY rowid")
+                return timologia_db.export_csv(self.conn, path, batch_size, cursor=cur, **kw)
+
+    def import_csv(self, path, chunk_size=timologia_db.IMPORT_CHUNK, progress=None, cancelled=None):
+        # Replaces all invoices in one transaction, streaming the rows to
+        # COPY; a duplicate ID or cancelled() -> True rolls back
+        rows = timologia_db.read_csv_rows(path, progress)
+        n = 0
+        try:
+            with self.conn:
+                self.conn.raw.execute("DELETE FROM timologia")
+                with self.conn.raw.cursor() as cur:
+                    with cur.copy(f"COPY timologia ({COLUMNS_SQL}) FROM STDIN") as copy:
+                        for row in rows:
+                            copy.write_row(row)
+                            n += 1
+                            if cancelled and n % chunk_size == 0 and cancelled():
+                                raise InterruptedError("import cancelled")
+        except psycopg.errors.UniqueViolation as e:
+            raise sqlite3.IntegrityError(str(e)) from e
+        return n
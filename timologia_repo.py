@@ -0,0 +1,549 @@
+# timologia_repo.py
+# Data access for the invoices, shared by the GUI (timologia-gui.py and
+# timologia-gui-windows.py), the CLI (timologia.py) and the dashboard
+# (dashboard_api.py). Every query the front ends run lives here, so
+# indexes, pooling and caching only have to be done once; the schema,
+# migrations and CSV import/export are in timologia_db.py.
+#
+# The SQL is fixed, parameterized text. sqlite3 keeps a cache of prepared
+# statements per connection (STATEMENT_CACHE entries, see connect()), so
+# each statement is compiled once per connection and then reused.
+# Single writes commit when they are done; add_many(), add_batch() and
+# delete_many() write a whole batch with executemany in one transaction
+# (one commit, so one sync to disk, however many invoices).
+#
+# The database is an SQLite file by default. open_repository() also takes
+# a postgresql:// URL, which gives a timologia_pg.PgRepository with the
+# same methods (see timologia_pg.py).
+import calendar
+import json
+import os
+import sqlite3
+from datetime import datetime
+from urllib.request import pathname2url
+
+import timologia_db
+
+STATEMENT_CACHE = 256
+# Seconds a statement waits for another connection's lock before failing
+# with "database is locked"
+BUSY_TIMEOUT = 10.0
+
+# The GUI writes while the dashboard (another process) reads the same
+# file. In WAL mode readers and the writer do not block each other: a
+# reader sees the last commit before its transaction started, and only
+# writers wait for each other (up to BUSY_TIMEOUT). journal_mode is kept
+# in the file, so every writable connection makes sure of it. With WAL,
+# synchronous=NORMAL only syncs at checkpoints, and journal_size_limit
+# truncates the -wal file after a checkpoint that leaves it larger.
+WAL_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA journal_size_limit = 67108864",   # 64 MB
+)
+COLUMNS = ("id", "name", "description", "amount", "date")
+COLUMNS_SQL = ", ".join(COLUMNS)
+
+
+def connect(path=timologia_db.DB_FILE, readonly=False, timeout=BUSY_TIMEOUT, check_same_thread=True):
+    # timeout is the busy timeout, in seconds
+    if readonly:
+        uri = "file:" + pathname2url(os.path.abspath(path)) + "?mode=ro"
+        return sqlite3.connect(uri, uri=True, timeout=timeout, check_same_thread=check_same_thread,
+                               cached_statements=STATEMENT_CACHE)
+    conn = sqlite3.connect(path, timeout=timeout, check_same_thread=check_same_thread,
+                           cached_statements=STATEMENT_CACHE)
+    if path != ":memory:":
+        for pragma in WAL_PRAGMAS:
+            conn.execute(pragma)
+    return conn
+
+
+def is_database_url(path):
+    return path.startswith(("postgresql://", "postgres://"))
+
+
+def open_repository(path=timologia_db.DB_FILE, migrate=True, **kw):
+    # A writable repository on an SQLite file or a postgresql:// URL,
+    # brought to the current schema unless migrate=False
+    if is_database_url(path):
+        import timologia_pg
+        repo = timologia_pg.open_repository(path)
+    else:
+        repo = Repository(connect(path, **kw))
+    if migrate:
+        repo.migrate()
+    return repo
+
+
+def iso_date(value):
+    # YYYY-MM-DD with zero padding ("2021-3-5" -> "2021-03-05"), as the
+    # bounds are compared as text with date_iso; ValueError if not a date
+    return datetime.strptime(value, "%Y-%m-%d").date().isoformat()
+
+
+def window(date_from=None, date_to=None):
+    # Bounds of a date window (YYYY-MM-DD, inclusive, None: open), or None
+    # if both are open. A window leaves out invoices without a valid date.
+    if date_from is None and date_to is None:
+        return None
+    return (iso_date(date_from) if date_from else "0000-00-00",
+            iso_date(date_to) if date_to else "9999-99-99")
+
+
+def _next_month(month, step):
+    y, m = divmod(int(month[:4]) * 12 + int(month[5:7]) - 1 + step, 12)
+    return f"{y:04d}-{m + 1:02d}"
+
+
+def window_parts(date_from=None, date_to=None):
+    # A date window split into the whole months inside it and the days
+    # before and after them: (first month, last month, first days, last
+    # days), each a pair of inclusive bounds; an empty range has its lower
+    # bound above the upper one. Without whole months all days are in
+    # first days.
+    lo, hi = window(date_from, date_to)
+    first = "0000-00" if not date_from else lo[:7] if lo[8:] == "01" else _next_month(lo, 1)
+    if not date_to:
+        last = "9999-99"
+    elif int(hi[8:]) == calendar.monthrange(int(hi[:4]), int(hi[5:7]))[1]:
+        last = hi[:7]
+    else:
+        last = _next_month(hi, -1)
+    if first > last:
+        return ("1", "0", (lo, hi), ("1", "0"))
+    # every date of month m sorts between m-00 and m-99
+    return (first, last, (lo, first + "-00"), (last + "-99", hi))
+
+
+def description_json(descriptions):
+    # List of description items -> the JSON array stored in the table
+    if isinstance(descriptions, str):
+        return descriptions
+    return json.dumps(list(descriptions or []))
+
+
+def invoice_error(invoice_id, amount, date):
+    # Why an invoice cannot be entered (the checks of the GUI and the
+    # CLI), or None
+    if not invoice_id:
+        return "Κενός αριθμός τιμολογίου."
+    try:
+        float(amount)
+    except (TypeError, ValueError):
+        return "Μη έγκυρο ποσό."
+    try:
+        datetime.strptime(date or "", "%d-%m-%y")
+    except ValueError:
+        return "Μη έγκυρη ημερομηνία (DD-MM-YY)."
+    return None
+
+
+def description_items(value):
+    # The items of a JSON description array, or the raw value if it is not one
+    if not value:
+        return []
+    try:
+        items = json.loads(value)
+    except json.JSONDecodeError:
+        return [value]
+    if not isinstance(items, list):
+        return [value]
+    return [item for item in items if isinstance(item, str) and item]
+
+
+GET_SQL = f"SELECT {COLUMNS_SQL} FROM timologia WHERE id = ?"
+OLD_ROW_SQL = "SELECT name, description FROM timologia WHERE id = ?"
+INSERT_SQL = f"INSERT INTO timologia ({COLUMNS_SQL}) VALUES (?, ?, ?, ?, ?)"
+UPDATE_SQL = "UPDATE timologia SET name = ?, description = ?, amount = ?, date = ? WHERE id = ?"
+DELETE_SQL = "DELETE FROM timologia WHERE id = ?"
+
+# Summary from the materialized customer_totals table (kept current by
+# triggers, see timologia_db.py), so totals and top customers cost
+# O(customers) rather than O(invoices); names come from customers by
+# integer key. The most expensive sale is a single seek on the
+# amount_cents index.
+TOTAL_SQL = "SELECT SUM(total_cents) AS tot FROM customer_totals"
+TOP_CUSTOMERS_SQL = """
+    SELECT c.name, ct.total_cents FROM customer_totals ct JOIN customers c ON c.id = ct.customer_id
+    ORDER BY ct.total_cents DESC LIMIT ?
+"""
+MOST_EXPENSIVE_SQL = """
+    SELECT id, name, amount, date, description FROM timologia
+    ORDER BY amount_cents DESC LIMIT 1
+"""
+
+# The same over a date window (see window()). The whole months inside the
+# window come from the monthly rollups (customer_monthly, monthly_totals,
+# product_monthly), the days before and after them (window_parts()) from
+# the invoices, through the (date_iso, customer_id, amount_cents) index:
+# {rollup} UNION ALL {days} UNION ALL {days}. Only the first n groups are
+# ranked: SQLite's sorter keeps the n largest of ORDER BY ... LIMIT n as
+# it goes rather than sorting every group. Ties are broken by name so a
+# page of n is stable.
+def _window_sql(rollup, days):
+    return f"{rollup} WHERE month >= ? AND month <= ? UNION ALL {days} UNION ALL {days}"
+
+
+_DAYS = "WHERE date_iso >= ? AND date_iso <= ?"
+WINDOW_TOTAL_SQL = f"""
+    SELECT SUM(total_cents) FROM ({_window_sql(
+        "SELECT total_cents FROM monthly_totals",
+        f"SELECT amount_cents FROM timologia {_DAYS}")})
+"""
+WINDOW_TOP_CUSTOMERS_SQL = f"""
+    SELECT c.name, w.total_cents FROM (
+        SELECT customer_id, SUM(total_cents) AS total_cents FROM ({_window_sql(
+            "SELECT customer_id, total_cents FROM customer_monthly",
+            f"SELECT customer_id, IFNULL(amount_cents, 0) FROM timologia {_DAYS}")})
+        GROUP BY customer_id
+    ) w JOIN customers c ON c.id = w.customer_id
+    ORDER BY w.total_cents DESC, c.name LIMIT ?
+"""
+_ITEMS_DAYS = f"""SELECT description, 1, share_cents FROM invoice_items
+                  WHERE invoice_id IN (SELECT id FROM timologia {_DAYS})"""
+WINDOW_TOP_PRODUCTS_SQL = f"""
+    SELECT product, SUM(lines) AS lines, SUM(total_cents) AS total_cents FROM ({_window_sql(
+        "SELECT product, lines, total_cents FROM product_monthly", _ITEMS_DAYS)})
+    GROUP BY product
+    ORDER BY total_cents DESC, product LIMIT ?
+"""
+WINDOW_TOP_MONTHS_SQL = f"""
+    SELECT month, SUM(total_cents) AS total_cents, SUM(invoices) AS invoices FROM ({_window_sql(
+        "SELECT month, total_cents, invoices FROM monthly_totals",
+        f"SELECT substr(date_iso, 1, 7), IFNULL(amount_cents, 0), 1 FROM timologia {_DAYS}")})
+    GROUP BY month
+    ORDER BY total_cents DESC, month LIMIT ?
+"""
+# The most expensive sale of a window: the largest amount_cents of the
+# window's entries of the covering index, then that one row
+WINDOW_MOST_EXPENSIVE_SQL = f"""
+    SELECT id, name, amount, date, description FROM timologia
+    WHERE rowid = (SELECT rowid FROM timologia INDEXED BY idx_timologia_date_customer {_DAYS}
+                   ORDER BY amount_cents DESC LIMIT 1)
+"""
+# Months by revenue, from monthly_totals
+TOP_MONTHS_SQL = "SELECT month, total_cents, invoices FROM monthly_totals ORDER BY total_cents DESC, month LIMIT ?"
+
+# Revenue per period (the first period_len characters of date_iso) from
+# the (date_iso, customer_id, amount_cents) index
+REVENUE_SQL = """
+    SELECT substr(date_iso, 1, ?) AS period, SUM(amount_cents) AS tot, COUNT(*) AS n
+    FROM timologia
+    WHERE date_iso >= ? AND date_iso <= ?
+    GROUP BY period ORDER BY period
+"""
+
+# One customer's invoices, from the covering (name, date_iso,
+# amount_cents) index: only that customer's index entries are read.
+# first/last and the monthly history skip invoices without a valid date.
+CUSTOMER_SQL = """
+    SELECT COUNT(*) AS n, SUM(amount_cents) AS tot, MIN(date_iso) AS first, MAX(date_iso) AS last
+    FROM timologia WHERE name = ?
+"""
+CUSTOMER_MONTHLY_SQL = """
+    SELECT substr(date_iso, 1, 7) AS month, SUM(amount_cents) AS tot, COUNT(*) AS n
+    FROM timologia
+    WHERE name = ? AND date_iso IS NOT NULL
+    GROUP BY month ORDER BY month
+"""
+
+# Keyset pagination: the sort keys of each sort order (see list_invoices)
+SORT_KEYS = {"id": ("id",), "date": ("date_iso", "id")}
+
+COMPLETION_NAMES_SQL = """
+    SELECT c.name, ct.invoices FROM customers c JOIN customer_totals ct ON ct.customer_id = c.id
+    WHERE c.name <> ''
+"""
+# Description items with the number of invoice lines using them, and
+# products by revenue, from the materialized product_totals table (see
+# timologia_db.py)
+COMPLETION_ITEMS_SQL = "SELECT product, lines FROM product_totals"
+TOP_PRODUCTS_SQL = """
+    SELECT product, lines, total_cents FROM product_totals
+    ORDER BY total_cents DESC LIMIT ?
+"""
+ITEMS_SQL = "SELECT position, description, amount_cents, share_cents FROM invoice_items WHERE invoice_id = ? ORDER BY position"
+SET_ITEM_AMOUNT_SQL = "UPDATE invoice_items SET amount_cents = ? WHERE invoice_id = ? AND position = ?"
+
+
+class Repository:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def close(self):
+        self.conn.close()
+
+    def migrate(self, **kw):
+        return timologia_db.migrate(self.conn, **kw)
+
+    def data_version(self):
+        # Changes whenever another connection commits
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def checkpoint(self, mode="PASSIVE"):
+        # Copy committed pages from the -wal file back into the database.
+        # SQLite does this by itself after commits (wal_autocheckpoint),
+        # but only PASSIVE: the -wal file is reused from the start only
+        # when no reader is using it, so with the dashboard reading all the
+        # time it keeps growing. RESTART waits (up to the busy timeout) for
+        # the current readers to finish so the next write starts the file
+        # over, and journal_size_limit then truncates it.
+        # Returns (busy, wal pages, pages checkpointed).
+        return tuple(self.conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone())
+
+    def explain(self, sql, params=()):
+        # EXPLAIN QUERY PLAN of a statement, one line per step, indented
+        # by depth
+        depth, lines = {0: -1}, []
+        for node, parent, _, detail in self.conn.execute("EXPLAIN QUERY PLAN " + sql, params).fetchall():
+            depth[node] = depth.get(parent, -1) + 1
+            lines.append("  " * depth[node] + detail)
+        return lines
+
+    # Reads
+
+    def get(self, invoice_id):
+        # (id, name, description, amount, date) or None
+        return self.conn.execute(GET_SQL, (invoice_id,)).fetchone()
+
+    def has_invoices(self):
+        return self.conn.execute("SELECT 1 FROM timologia LIMIT 1").fetchone() is not None
+
+    def existing_ids(self, invoice_ids, chunk=500):
+        # The ones of invoice_ids that are in the table
+        invoice_ids = list(invoice_ids)
+        found = []
+        for start in range(0, len(invoice_ids), chunk):
+            part = invoice_ids[start:start + chunk]
+            found += [r[0] for r in self.conn.execute(
+                f"SELECT id FROM timologia WHERE id IN ({','.join('?' * len(part))})", part)]
+        return found
+
+    def count(self, where="", params=()):
+        # where is an SQL condition on timologia, e.g. "name LIKE ?"
+        sql = "SELECT COUNT(*) FROM timologia"
+        if where:
+            sql += f" WHERE {where}"
+        return self.conn.execute(sql, tuple(params)).fetchone()[0]
+
+    def iter_all(self, batch_size=timologia_db.BATCH_SIZE):
+        # All invoices in insertion order, read batch_size rows at a time
+        cur = self.conn.execute(f"SELECT {COLUMNS_SQL} FROM timologia ORDER BY rowid")
+        while True:
+            batch = cur.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+
+    def page(self, after_rowid, limit=None, where="", params=(), last_rowid=None):
+        # (rowid, id, name, description, amount, date) rows after a rowid,
+        # or up to and including last_rowid, in rowid order
+        sql = f"SELECT rowid, {COLUMNS_SQL} FROM timologia WHERE rowid > ?"
+        args = (after_rowid,)
+        if last_rowid is not None:
+            sql += " AND rowid <= ?"
+            args += (last_rowid,)
+        if where:
+            sql += f" AND ({where})"
+        sql += " ORDER BY rowid"
+        args += tuple(params)
+        if limit is not None:
+            sql += " LIMIT ?"
+            args += (limit,)
+        return self.conn.execute(sql, args).fetchall()
+
+    def by_rowids(self, rowids):
+        # Rows as in page() for a list of rowids, in the order of the list;
+        # a row deleted in the meantime comes back as all None
+        if not rowids:
+            return []
+        marks = ",".join("?" * len(rowids))
+        found = {row[0]: row for row in self.conn.execute(
+            f"SELECT rowid, {COLUMNS_SQL} FROM timologia WHERE rowid IN ({marks})", tuple(rowids))}
+        empty = (None,) * (len(COLUMNS) + 1)
+        return [found.get(rowid, empty) for rowid in rowids]
+
+    def search(self, text, limit=-1, offset=0):
+        return timologia_db.search(self.conn, text, limit, offset)
+
+    def search_rowids(self, text):
+        return timologia_db.search_rowids(self.conn, text)
+
+    def search_count(self, text):
+        return timologia_db.search_count(self.conn, text)
+
+    def completion_counts(self):
+        # ([(name, invoices)], [(description item, occurrences)])
+        names = self.conn.execute(COMPLETION_NAMES_SQL).fetchall()
+        items = self.conn.execute(COMPLETION_ITEMS_SQL).fetchall()
+        return names, items
+
+    # The summary methods take an optional date window (see window()):
+    # without one they read the materialized totals.
+
+    def _window(self, sql, date_from, date_to, args=()):
+        first, last, days, more_days = window_parts(date_from, date_to)
+        return self.conn.execute(sql, (first, last) + days + more_days + args)
+
+    def total_cents(self, date_from=None, date_to=None):
+        if window(date_from, date_to) is None:
+            return self.conn.execute(TOTAL_SQL).fetchone()[0] or 0
+        return self._window(WINDOW_TOTAL_SQL, date_from, date_to).fetchone()[0] or 0
+
+    def top_customers(self, n, date_from=None, date_to=None):
+        # [(name, total_cents)], largest first
+        if window(date_from, date_to) is None:
+            return self.conn.execute(TOP_CUSTOMERS_SQL, (n,)).fetchall()
+        return self._window(WINDOW_TOP_CUSTOMERS_SQL, date_from, date_to, (n,)).fetchall()
+
+    def top_products(self, n, date_from=None, date_to=None):
+        # [(product, lines, total_cents)], largest first
+        if window(date_from, date_to) is None:
+            return self.conn.execute(TOP_PRODUCTS_SQL, (n,)).fetchall()
+        return self._window(WINDOW_TOP_PRODUCTS_SQL, date_from, date_to, (n,)).fetchall()
+
+    def top_months(self, n, date_from=None, date_to=None):
+        # [(YYYY-MM, total_cents, invoices)], largest first
+        if window(date_from, date_to) is None:
+            return self.conn.execute(TOP_MONTHS_SQL, (n,)).fetchall()
+        return self._window(WINDOW_TOP_MONTHS_SQL, date_from, date_to, (n,)).fetchall()
+
+    def items(self, invoice_id):
+        # [(position, description, amount_cents or None, share_cents)] of an invoice
+        return self.conn.execute(ITEMS_SQL, (invoice_id,)).fetchall()
+
+    def most_expensive(self, date_from=None, date_to=None):
+        # (id, name, amount, date, description) or None
+        bounds = window(date_from, date_to)
+        if bounds is None:
+            return self.conn.execute(MOST_EXPENSIVE_SQL).fetchone()
+        return self.conn.execute(WINDOW_MOST_EXPENSIVE_SQL, bounds).fetchone()
+
+    def revenue(self, period_len, date_from=None, date_to=None):
+        # [(period, total_cents, invoices)]; dates are YYYY-MM-DD, inclusive
+        return self.conn.execute(
+            REVENUE_SQL, (period_len, date_from or "0000-00-00", date_to or "9999-99-99")).fetchall()
+
+    def customer(self, name):
+        # (invoices, total_cents, first date, last date); 0 invoices if unknown
+        return self.conn.execute(CUSTOMER_SQL, (name,)).fetchone()
+
+    def customer_monthly(self, name):
+        # [(YYYY-MM, total_cents, invoices)] of one customer, oldest first
+        return self.conn.execute(CUSTOMER_MONTHLY_SQL, (name,)).fetchall()
+
+    def list_invoices(self, fields=COLUMNS, sort="id", customer=None, date_from=None, date_to=None,
+                      min_cents=None, max_cents=None, after=None, limit=100):
+        # Keyset pagination: the page continues after the sort key of the
+        # previous page's last row (after), so every page starts with an
+        # index seek, however deep. sort="date" only lists invoices with a
+        # valid date. Rows carry the fields plus the sort keys.
+        keys = SORT_KEYS[sort]
+        where, params = [], []
+        if customer is not None:
+            where.append("name = ?")
+            params.append(customer)
+        if date_from is not None:
+            where.append("date_iso >= ?")
+            params.append(date_from)
+        if date_to is not None:
+            where.append("date_iso <= ?")
+            params.append(date_to)
+        if sort == "date" and date_from is None:
+            where.append("date_iso IS NOT NULL")
+        if min_cents is not None:
+            where.append("amount_cents >= ?")
+            params.append(min_cents)
+        if max_cents is not None:
+            where.append("amount_cents <= ?")
+            params.append(max_cents)
+        if after is not None:
+            where.append(f"({', '.join(keys)}) > ({', '.join('?' * len(keys))})")
+            params.extend(after)
+        select = ", ".join(dict.fromkeys(tuple(fields) + keys))
+        sql = (f"SELECT {select} FROM timologia"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + f" ORDER BY {', '.join(keys)} LIMIT ?")
+        return self.conn.execute(sql, params + [limit]).fetchall()
+
+    # Writes
+
+    def add(self, invoice_id, name, descriptions, amount, date):
+        # Raises sqlite3.IntegrityError if the ID exists
+        with self.conn:
+            self.conn.execute(INSERT_SQL, (invoice_id, name, description_json(descriptions), amount, date))
+
+    def add_many(self, invoices):
+        # invoices: (id, name, descriptions, amount, date) tuples, written
+        # in one transaction; returns the number written
+        rows = [(i, n, description_json(d), a, dt) for i, n, d, a, dt in invoices]
+        with self.conn:
+            self.conn.executemany(INSERT_SQL, rows)
+        return len(rows)
+
+    def add_batch(self, invoices):
+        # invoices: (id, name, descriptions, amount, date) tuples, checked
+        # together and written with one executemany in one transaction.
+        # A bad row (see invoice_error, an ID twice in the batch or one
+        # already in the table) is left out instead of failing the batch.
+        # Returns (number written, {index of a bad row: error message}).
+        rows = [(i, n, description_json(d), a, dt) for i, n, d, a, dt in invoices]
+        while True:
+            errors, first = {}, {}
+            for k, (invoice_id, _, _, amount, date) in enumerate(rows):
+                error = invoice_error(invoice_id, amount, date)
+                if error is None and invoice_id in first:
+                    error = f"Ο αριθμός τιμολογίου {invoice_id} υπάρχει ήδη στη γραμμή {first[invoice_id] + 1}."
+                if error is None:
+                    first[invoice_id] = k
+                else:
+                    errors[k] = error
+            for invoice_id in self.existing_ids(first):
+                errors[first[invoice_id]] = f"Ο αριθμός τιμολογίου {invoice_id} υπάρχει ήδη."
+            good = [row for k, row in enumerate(rows) if k not in errors]
+            try:
+                with self.conn:
+                    self.conn.executemany(INSERT_SQL, good)
+            except sqlite3.IntegrityError:
+                # another connection may have added one of the IDs since
+                # the check; check again, unless that is not the reason
+                if not self.existing_ids(row[0] for row in good):
+                    raise
+                continue
+            return len(good), errors
+
+    def update(self, invoice_id, name, descriptions, amount, date):
+        # Returns the old (name, description), or None if the ID does not exist
+        with self.conn:
+            old = self.conn.execute(OLD_ROW_SQL, (invoice_id,)).fetchone()
+            if old is not None:
+                self.conn.execute(UPDATE_SQL, (name, description_json(descriptions), amount, date, invoice_id))
+        return old
+
+    def delete(self, invoice_id):
+        # Returns the old (name, description), or None if the ID does not exist
+        with self.conn:
+            old = self.conn.execute(OLD_ROW_SQL, (invoice_id,)).fetchone()
+            if old is not None:
+                self.conn.execute(DELETE_SQL, (invoice_id,))
+        return old
+
+    def set_item_amount(self, invoice_id, position, amount_cents):
+        # Per-line amount of a description item (None: share of the invoice
+        # amount); returns False if the invoice has no such line
+        with self.conn:
+            return self.conn.execute(SET_ITEM_AMOUNT_SQL, (amount_cents, invoice_id, position)).rowcount > 0
+
+    def delete_many(self, invoice_ids):
+        # One transaction; returns the number of invoices deleted
+        with self.conn:
+            # rowcount sums the rows deleted by each statement (not the
+            # rows the triggers touch)
+            return self.conn.executemany(DELETE_SQL, [(i,) for i in invoice_ids]).rowcount
+
+    def export_csv(self, path, **kw):
+        return timologia_db.export_csv(self.conn, path, **kw)
+
+    def import_csv(self, path, **kw):
+        return timologia_db.import_csv(self.conn, path, **kw)